@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks of the scraping pipeline
+
+Times page extraction, gulong normalization, competitor parsing and the
+merge over synthetic gulong catalogs (1k/10k/100k rows by default) and the
+saved gogulong and tiremanila listing pages of tests/fixtures/pages served
+from a local http server, reporting throughput and peak memory. Selenium code
+paths are timed with a driver stand-in rendering the served pages with lxml
+(or Chrome with --browser).
+
+Benchmarks are timed in rounds of one sample each, and the best sample of a
+benchmark is kept (other load on the machine only adds time). Each sample runs
+a benchmark long enough to be timed reliably. Times are also expressed
+relative to a calibration workload timed in every round. The relative times and peak memory are compared with the committed
+benchmark_baseline.json and the script exits with status 1 if a step is
+slower or uses more memory than allowed.
+
+Usage:
+    python benchmark.py                       # compare with baseline
+    python benchmark.py --save-baseline       # record baseline (commit it)
+    python benchmark.py --fixtures pages/     # other gogulong_*.html, tiremanila_*.html
+    python benchmark.py --browser             # also time selenium extraction in Chrome
+"""
+
+import os, io, re, gc, sys, json, time, random, asyncio, argparse, threading, tracemalloc
+import http.server, functools, contextlib, urllib.request
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import gulong_price_scraper_lica as scraper
+
+
+root = os.path.dirname(os.path.abspath(__file__))
+fixtures_dir = os.path.join(root, 'tests', 'fixtures', 'pages')
+baseline_file = os.path.join(root, 'benchmark_baseline.json')
+
+brands = ['BRIDGESTONE', 'BFGOODRICH', 'TOYO', 'YOKOHAMA', 'GOODYEAR', 'MICHELIN', 'DUNLOP', 'FALKEN']
+patterns = list(dict.fromkeys(scraper.change_name_dict.values())) + \
+    ['TURANZA T005', 'ECOPIA EP150', 'PROXES CF2', 'BLUEARTH ES32', 'ASSURANCE TRIPLEMAX', 'ENASAVE EC300+']
+widths = ['165', '175', '185', '195', '205', '215', '225', '235', '245', '265', '31X10.5', '33X12.50']
+aspect_ratios = [45.0, 50.0, 55.0, 60.0, 65.0, 70.0, 75.0, np.nan, 0.0, 10.5, 12.5]
+diameters = ['R13', 'R14', 'R15', 'R16', 'R17', 'R18', '15C', 'LT16']
+
+
+def synthetic_catalog(n, seed=0):
+    '''
+    Synthetic gulong.ph catalog with the columns of the redash query (renamed)
+    '''
+    rng = random.Random(seed)
+    return pd.DataFrame({'sku_name': ['SKU {}'.format(i) for i in range(n)],
+                         'name': [rng.choice(patterns) for _ in range(n)],
+                         'brand': [rng.choice(brands) for _ in range(n)],
+                         'width': [rng.choice(widths) for _ in range(n)],
+                         'aspect_ratio': [rng.choice(aspect_ratios) for _ in range(n)],
+                         'diameter': [rng.choice(diameters) for _ in range(n)],
+                         'sale_tag': [rng.choice([0, 1]) for _ in range(n)],
+                         'srp': [float(rng.randrange(2000, 15000, 10)) for _ in range(n)],
+                         'price_gulong': [float(rng.randrange(2000, 15000, 10)) for _ in range(n)],
+                         'vehicle_type': [rng.choice(['SUV', 'CAR', 'VAN']) for _ in range(n)]})
+
+
+class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    '''
+    Serves tiremanila_<page>.html for /?page=<page>, other paths as files
+    '''
+
+    def translate_path(self, path):
+        if '?page=' in path:
+            path = '/tiremanila_{}.html'.format(path.split('=')[-1])
+        return super().translate_path(path)
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(http.server.ThreadingHTTPServer):
+    # concurrent fetches overflowing the default backlog of 5 wait for tcp retransmits
+    request_queue_size = 64
+    daemon_threads = True
+
+
+def serve_fixtures(path):
+    '''
+    Serves fixture directory on a free local port
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+    base_url : string
+    '''
+    server = FixtureServer(('127.0.0.1', 0), functools.partial(FixtureHandler, directory=path))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+class FixtureDriver:
+    '''
+    Stand-in for a Chrome driver rendering served pages with lxml
+    '''
+
+    def __init__(self):
+        self.tree = None
+
+    def get(self, url):
+        with urllib.request.urlopen(url) as response:
+            self.tree = scraper.lxml.html.fromstring(response.read())
+
+    def find_elements(self, by, xpath):
+        return [SimpleNamespace(text=scraper.element_text(e)) for e in self.tree.xpath(xpath)]
+
+    def execute_script(self, script, *args):
+        if script == scraper.tiles_signature_js:
+            return '\n'.join(e.text_content().strip() for e in self.tree.xpath(args[0]))
+        if script == scraper.extract_tiles_js:
+            return scraper.parse_tiles(self.tree, args[0])
+        raise NotImplementedError(script)
+
+
+def reset_caches():
+    '''
+    Clears compiled name matchers (and their matched names) so every run of a
+    benchmark matches names from scratch
+    '''
+    scraper.compile_name_matcher.cache_clear()
+
+
+def calibration_workload():
+    '''
+    Fixed python and pandas workload whose time is the unit of relative times
+    '''
+    specs = pd.Series(['{}/{} R{} 91V'.format(w, a, d) for w in range(165, 285, 10)
+                       for a in range(40, 85, 5) for d in range(13, 21)] * 4)
+    def work():
+        specs.str.extract(r'(?P<width>\d{3})/(?P<aspect_ratio>\d{2}) R(?P<diameter>\d{2})')
+        sorted(re.sub(r'\s+', ' ', s.lower()) for s in specs)
+    return work
+
+
+def sampler(func, min_seconds=0.2):
+    '''
+    Runs func once and returns a function timing one sample of func
+
+    Each sample calls func as many times as needed to take min_seconds, so
+    fast benchmarks are not dominated by timer and scheduler noise.
+
+    Returns
+    -------
+    sample : function
+        returns seconds per call of a new sample
+    result
+        result of the first call
+    '''
+    reset_caches()
+    start = time.perf_counter()
+    result = func()
+    loops = max(1, int(np.ceil(min_seconds / max(time.perf_counter() - start, 1e-6))))
+    def sample():
+        # garbage collection is paused while timing, as in timeit
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(loops):
+                reset_caches()
+                func()
+            return (time.perf_counter() - start) / loops
+        finally:
+            gc.enable()
+    return sample, result
+
+
+def peak_memory(func):
+    '''
+    Peak traced memory of one call of func in MB (tracing slows allocations
+    down so it is off while timing)
+    '''
+    reset_caches()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def fixture_pages(path, site):
+    names = sorted((f for f in os.listdir(path) if f.startswith(site + '_') and f.endswith('.html')),
+                   key=lambda f: int(f[len(site) + 1:-len('.html')]))
+    pages = []
+    for name in names:
+        with open(os.path.join(path, name), encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def repeat_rows(df, n):
+    '''
+    First n rows of df repeated as needed
+    '''
+    reps = int(np.ceil(n / max(len(df), 1)))
+    return pd.concat([df] * reps, ignore_index=True).iloc[:n]
+
+
+def run_benchmarks(sizes, fixtures, repeat=7, browser=False):
+    '''
+    Runs all benchmarks
+
+    Every benchmark is run once first (results feed later benchmarks), then
+    timed in repeat rounds of one sample of each benchmark and of the
+    calibration workload. The best sample of each is therefore taken over the
+    whole run instead of a moment of more or less load on the machine.
+
+    Returns
+    -------
+    results : dictionary
+        benchmark name -> seconds, relative (seconds in units of the
+        calibration workload), peak_mb, items, items_per_s
+    '''
+    benchmarks = {}
+    def record(name, items, func):
+        sample, result = sampler(func)
+        benchmarks[name] = (items, func, sample)
+        return result
+
+    def size_benchmarks(n, tm_raw, gg_raw):
+        df_raw = synthetic_catalog(n)
+        record('normalize/fix_names/{}'.format(n), n, lambda: scraper.get_name_matcher().fix_series(df_raw['name']))
+        df_gulong = record('normalize/gulong_data/{}'.format(n), n,
+                           lambda: scraper.normalize_gulong_data(df_raw))
+        comp = df_gulong['name'].unique()
+        df_tm = repeat_rows(tm_raw, n)
+        df_gg = repeat_rows(gg_raw, n)
+        df_tiremanila = record('parse/tiremanila/{}'.format(n), n,
+                               lambda: scraper.parse_tiremanila(df_tm, comp)[0])
+        df_gogulong = record('parse/gogulong/{}'.format(n), n,
+                             lambda: scraper.parse_gogulong(df_gg, comp)[0])
+        record('merge/get_intersection/{}'.format(n), n,
+               lambda: scraper.get_intersection.__wrapped__(df_gulong, {'gogulong': df_gogulong,
+                                                                        'tiremanila': df_tiremanila}))
+
+    # page extraction (lxml twin of scrape_data / scrape_tiles)
+    tm_pages = fixture_pages(fixtures, 'tiremanila')
+    gg_pages = fixture_pages(fixtures, 'gogulong')
+    xpath_tm, xpath_gg = scraper.xpath_prod['tiremanila'], scraper.xpath_prod['gogulong']
+    # fetch and extract over local http server
+    server, base_url = serve_fixtures(fixtures)
+    gg_urls = ['{}/gogulong_{}.html'.format(base_url, n) for n in range(1, len(gg_pages) + 1)]
+    df_names = synthetic_catalog(100)
+    def fetch_gogulong():
+        html = asyncio.run(scraper.fetch_pages(gg_urls, concurrency=8))
+        return [scraper.tiles_to_lists(scraper.parse_tiles(scraper.lxml.html.fromstring(html[url]), xpath_gg),
+                                       [[], [], []])[0] for url in gg_urls]
+    def selenium_paths(name, driver):
+        # scrape_data per loaded page and the selenium tiremanila engine
+        def extract():
+            for url in gg_urls:
+                driver.get(url)
+                scraper.scrape_data(driver, [[], [], []], xpath_gg, site='gogulong')
+        record('extract/gogulong_{}'.format(name), len(gg_pages), extract)
+        record('fetch/tiremanila_{}'.format(name), len(tm_pages),
+               lambda: scraper.tiremanila_scraper.__wrapped__(driver, scraper.xpath_prod, df_names,
+                                                              engine='selenium', base_url=base_url))
+
+    results = {}
+    calibration = sampler(calibration_workload())[0]
+    # progress messages of the scraper are not part of the report
+    with contextlib.ExitStack() as stack:
+        stack.callback(server.shutdown)
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        tm_parsed = record('extract/tiremanila_pages', len(tm_pages),
+                           lambda: [scraper.parse_tiremanila_page(html, xpath_tm) for html in tm_pages])
+        gg_lists = record('extract/gogulong_pages', len(gg_pages),
+                          lambda: [scraper.tiles_to_lists(scraper.parse_tiles(scraper.lxml.html.fromstring(html),
+                                                                              xpath_gg), [[], [], []])[0]
+                                   for html in gg_pages])
+        record('fetch/tiremanila_http', len(tm_pages),
+               lambda: scraper.scrape_tiremanila_http(xpath_tm, base_url, concurrency=8))
+        record('fetch/gogulong_http', len(gg_pages), fetch_gogulong)
+        selenium_paths('selenium', FixtureDriver())
+        if browser:
+            selenium_paths('chrome', stack.enter_context(scraper.driver_pool.driver()))
+
+        tm_raw = pd.concat([scraper.tiremanila_page_frame(*p[:2]) for p in tm_parsed], ignore_index=True)
+        gg_raw = pd.concat([pd.DataFrame({'sku_name': l[0], 'price': l[1], 'specs': l[2]}, dtype=object)
+                            for l in gg_lists], ignore_index=True)
+        for n in sizes:
+            size_benchmarks(n, tm_raw, gg_raw)
+
+        samples = {name: [] for name in benchmarks}
+        units = []
+        for _ in range(repeat):
+            units.append(calibration())
+            for name, (_, _, sample) in benchmarks.items():
+                samples[name].append(sample())
+        peaks = {name: peak_memory(func) for name, (_, func, _) in benchmarks.items()}
+
+    print('{:<36} {:>10.4f} s'.format('calibration', min(units)))
+    for name, (items, _, _) in benchmarks.items():
+        seconds = min(samples[name])
+        results[name] = {'seconds': round(seconds, 4), 'relative': round(seconds / min(units), 3),
+                         'peak_mb': round(peaks[name], 2), 'items': items,
+                         'items_per_s': round(items / seconds, 1) if seconds else None}
+        print('{:<36} {:>10.4f} s {:>8.2f} x {:>12.1f} items/s {:>9.2f} MB'.format(
+            name, seconds, results[name]['relative'], results[name]['items_per_s'] or 0, peaks[name]))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Benchmarks slower or using more memory than baseline * (1 + tolerance)
+
+    Times are compared relative to the calibration workload timed during the
+    same run, so baselines carry over to faster or slower machines.
+
+    Returns
+    -------
+    regressions : list
+        messages of regressed benchmarks
+    '''
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        # ignore differences too small to measure reliably (10 ms, 2 MB)
+        unit = r['seconds'] / r['relative']
+        for key, label, floor in [('relative', 'time x calibration', 0.01 / unit), ('peak_mb', 'MB', 2.0)]:
+            if r[key] > max(b[key] * (1 + tolerance), b[key] + floor):
+                regressions.append('{} {}: {} vs baseline {}'.format(name, label, r[key], b[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the scraping pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='synthetic gulong catalog sizes')
+    parser.add_argument('--fixtures', default=fixtures_dir,
+                        help='directory of gogulong_<n>.html and tiremanila_<n>.html pages '
+                             '(default: tests/fixtures/pages)')
+    parser.add_argument('--repeat', type=int, default=7, help='rounds of timed samples, best sample of each benchmark is kept')
+    parser.add_argument('--browser', action='store_true', help='also time selenium extraction in Chrome')
+    parser.add_argument('--baseline', default=baseline_file, help='(default: benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown / memory growth over baseline (default: 0.5)')
+    parser.add_argument('--output', help='write results json to file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.fixtures, args.repeat, args.browser)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print('No baseline at {}, run with --save-baseline first'.format(args.baseline))
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print('REGRESSION ' + message)
+    if not regressions:
+        print('No regressions against {}'.format(args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
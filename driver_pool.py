@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+Pool of warm headless Chrome drivers
+
+Drivers are started on demand, kept alive between scrapes and health-checked
+before each use. A driver is restarted after a number of page loads or when
+its browser processes grow over a memory limit, and sessions which crashed
+are replaced transparently so one dead browser does not abort a long run.
+
+The lean profile (see lean_options and DriverPool blocked_urls) skips images,
+fonts and third-party scripts. Chrome's performance log is used to measure
+bytes transferred per page and to capture json responses fetched by the page.
+"""
+
+import json, time, queue, atexit, threading, warnings
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import psutil
+from selenium.webdriver import Chrome
+from selenium.common.exceptions import WebDriverException, InvalidSessionIdException, TimeoutException
+
+
+# webdriver error messages of a browser which is gone
+crash_messages = ['chrome not reachable', 'session deleted', 'disconnected',
+                  'tab crashed', 'no such window', 'invalid session id']
+
+
+# non-essential resources blocked in lean profile
+lean_blocked_urls = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+                     '*.woff', '*.woff2', '*.ttf', '*.otf', '*.mp4',
+                     '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                     '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+                     '*tiktok.com*', '*fonts.googleapis.com*', '*fonts.gstatic.com*']
+
+
+def lean_options(options):
+    '''
+    Sets lean page-load profile on Chrome options
+
+    Pages are returned once the DOM is ready (eager), images are disabled and
+    network events are logged to measure transferred bytes.
+
+    Returns
+    -------
+    options : selenium ChromeOptions
+    '''
+    options.page_load_strategy = 'eager'
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return options
+
+
+def block_urls(driver, patterns):
+    '''
+    Blocks requests matching url patterns (* wildcards) through CDP
+    '''
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+
+
+def log_messages(entries):
+    '''
+    CDP messages (method, params) of performance log entries
+    '''
+    return [json.loads(entry['message'])['message'] for entry in entries]
+
+
+def transferred_bytes(entries):
+    '''
+    Bytes received by finished requests of performance log entries
+    '''
+    return sum(m['params'].get('encodedDataLength', 0) for m in log_messages(entries)
+               if m['method'] == 'Network.loadingFinished')
+
+
+def json_responses(driver, entries):
+    '''
+    Bodies of finished json responses of XHR and fetch requests of the page
+
+    Parameters
+    ----------
+    driver : selenium
+        chrome driver with Network domain enabled before the page was loaded
+    entries : list
+        performance log entries
+
+    Returns
+    -------
+    responses : list
+        list of (url, body text)
+    '''
+    messages = log_messages(entries)
+    finished = {m['params']['requestId'] for m in messages if m['method'] == 'Network.loadingFinished'}
+    responses = []
+    for m in messages:
+        if m['method'] != 'Network.responseReceived' or m['params'].get('type') not in ['XHR', 'Fetch']:
+            continue
+        response = m['params']['response']
+        if m['params']['requestId'] in finished and 'json' in response.get('mimeType', ''):
+            try:
+                body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': m['params']['requestId']})
+            except WebDriverException:
+                continue
+            responses.append((response['url'], body['body']))
+    return responses
+
+
+def is_crash(e):
+    '''
+    True if webdriver exception means the browser session is lost
+    '''
+    if isinstance(e, InvalidSessionIdException):
+        return True
+    if isinstance(e, TimeoutException) or not isinstance(e, WebDriverException):
+        return False
+    return any(m in str(e).lower() for m in crash_messages)
+
+
+class PooledDriver:
+    '''
+    Chrome driver of a DriverPool, restarted when recycled or crashed
+
+    Attributes not defined here are those of the selenium driver.
+    '''
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.driver = pool.start_driver()
+        self.pages = 0
+        # performance log entries since current page load
+        self.log = []
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+    def rss_mb(self):
+        '''
+        Resident memory of chromedriver and its browser processes in MB
+        '''
+        try:
+            process = psutil.Process(self.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return 0
+        rss = 0
+        for p in processes:
+            try:
+                rss += p.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss / 2**20
+
+    def healthy(self):
+        '''
+        True if browser session responds
+        '''
+        try:
+            self.driver.execute_script('return 1')
+            return True
+        except WebDriverException:
+            return False
+
+    def restart(self, reason, cause=None):
+        '''
+        Replaces browser session with a new one, counted in pool metrics by
+        cause (default reason)
+        '''
+        print('Restarting Chrome driver ({})'.format(reason))
+        if self.pool.metrics is not None:
+            self.pool.metrics.count('driver_restarts_total', cause=cause or reason)
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        self.driver = self.pool.start_driver()
+        self.pages = 0
+        self.log = []
+
+    def recycle(self):
+        '''
+        Restarts driver if over page load or memory limits
+        '''
+        if self.pages >= self.pool.max_pages:
+            self.restart('{} page loads'.format(self.pages), 'page_loads')
+        elif self.pool.max_rss_mb and self.rss_mb() > self.pool.max_rss_mb:
+            self.restart('memory over {} MB'.format(self.pool.max_rss_mb), 'memory')
+
+    def get(self, url):
+        '''
+        Loads url, recycling the driver first if needed and retrying once on
+        a new session if the browser crashed
+        '''
+        self.recycle()
+        # requests finished after previous load returned
+        self.read_log()
+        self.log = []
+        start = time.perf_counter()
+        try:
+            self.driver.get(url)
+        except WebDriverException as e:
+            if not is_crash(e):
+                raise
+            warnings.warn('Chrome session lost while loading {}: {}'.format(url, e))
+            self.restart('crashed', 'crash')
+            start = time.perf_counter()
+            self.driver.get(url)
+        if self.pool.metrics is not None:
+            self.pool.metrics.observe('page_load_seconds', time.perf_counter() - start,
+                                      site=urlparse(url).hostname)
+        self.pages += 1
+        self.read_log()
+        if self.pool.measure_bytes:
+            # count page load
+            self.pool.add_bytes(0)
+
+    def read_log(self):
+        '''
+        Reads new performance log entries, counting their transferred bytes
+        '''
+        try:
+            entries = self.driver.get_log('performance')
+        except WebDriverException:
+            return
+        self.log.extend(entries)
+        if self.pool.measure_bytes:
+            self.pool.add_bytes(transferred_bytes(entries), page=False)
+
+    def performance_log(self):
+        '''
+        Performance log entries since current page was loaded
+        '''
+        self.read_log()
+        return list(self.log)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class DriverPool:
+    '''
+    Bounded pool of warm Chrome drivers
+
+    Parameters
+    ----------
+    options : selenium ChromeOptions
+        options of started drivers
+    size : int, optional
+        maximum number of drivers. The default is 1.
+    max_pages : int, optional
+        page loads after which a driver is restarted. The default is 200.
+    max_rss_mb : int, optional
+        memory of a driver's processes (MB) above which it is restarted,
+        0 to disable. The default is 1500.
+    factory : function, optional
+        returns a new selenium driver. The default starts Chrome with options.
+    blocked_urls : list, optional
+        url patterns blocked in every driver (see lean_blocked_urls). 
+        The default is None.
+    measure_bytes : bool, optional
+        count bytes transferred per page load (needs performance logging, see 
+        lean_options). The default is False.
+    metrics : Metrics, optional
+        If given, page load latencies and driver restarts are recorded. 
+        The default is None.
+    wait_timeout : float, optional
+        seconds waited for a free driver before acquire raises TimeoutError. 
+        The default is 600.
+    '''
+
+    def __init__(self, options, size=1, max_pages=200, max_rss_mb=1500, factory=None,
+                 blocked_urls=None, measure_bytes=False, metrics=None, wait_timeout=600):
+        self.factory = factory or (lambda: Chrome(options=options))
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.blocked_urls = blocked_urls
+        self.measure_bytes = measure_bytes
+        self.metrics = metrics
+        self.n_pages, self.n_bytes = 0, 0
+        # most recently used drivers are reused first
+        self.idle = queue.LifoQueue()
+        self.n_drivers = 0
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def start_driver(self):
+        '''
+        Starts a new selenium driver with blocked urls
+        '''
+        driver = self.factory()
+        if self.blocked_urls:
+            try:
+                block_urls(driver, self.blocked_urls)
+            except Exception:
+                driver.quit()
+                raise
+        return driver
+
+    def add_bytes(self, n_bytes, page=True):
+        with self.lock:
+            self.n_bytes += n_bytes
+            self.n_pages += page
+
+    def reset_stats(self):
+        '''
+        Resets counts of page loads and transferred bytes
+        '''
+        with self.lock:
+            self.n_pages, self.n_bytes = 0, 0
+
+    def stats(self):
+        '''
+        Page loads and transferred bytes since last reset
+
+        Returns
+        -------
+        dictionary
+            pages, bytes and kb_per_page
+        '''
+        with self.lock:
+            return {'pages': self.n_pages, 'bytes': self.n_bytes,
+                    'kb_per_page': round(self.n_bytes / self.n_pages / 1024, 1) if self.n_pages else None}
+
+    def grow(self, size):
+        '''
+        Raises maximum number of drivers to size (never lowered)
+        '''
+        with self.lock:
+            self.size = max(self.size, size)
+
+    def acquire(self):
+        '''
+        Borrows a healthy driver, started if none is idle and pool is not full
+
+        Waiting callers start a replacement as soon as the pool is below size 
+        (e.g. after a failed restart) and give up after wait_timeout seconds.
+        '''
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            with self.lock:
+                start = self.n_drivers < self.size
+                if start:
+                    self.n_drivers += 1
+            if start:
+                try:
+                    return PooledDriver(self)
+                except Exception:
+                    with self.lock:
+                        self.n_drivers -= 1
+                    raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('No Chrome driver free after {} s'.format(self.wait_timeout))
+            try:
+                # wake up now and then to check for a free slot
+                driver = self.idle.get(timeout=min(remaining, 1))
+                break
+            except queue.Empty:
+                continue
+        if not driver.healthy():
+            try:
+                driver.restart('failed health check', 'health_check')
+            except Exception:
+                with self.lock:
+                    self.n_drivers -= 1
+                raise
+        return driver
+
+    def release(self, driver):
+        '''
+        Returns borrowed driver to the pool
+        '''
+        self.idle.put(driver)
+
+    @contextmanager
+    def driver(self):
+        '''
+        Context manager borrowing a driver, always returned to the pool
+        '''
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        '''
+        Quits all idle drivers
+        '''
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            driver.quit()
+            with self.lock:
+                self.n_drivers -= 1
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Compressed exports of stored scrape runs
+
+Exports are written only when requested, straight from the price history:
+runs are read one at a time with only the selected columns and dates, and
+streamed into a gzip-compressed csv or a parquet file on disk instead of
+being encoded into one in-memory byte string.
+"""
+
+import os, gzip, time, uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import decategorize
+
+
+# file extension and mime type per export format
+export_formats = {'csv.gz': 'application/gzip',
+                  'parquet': 'application/octet-stream'}
+
+
+def conform_columns(df, columns):
+    '''
+    Dataframe with exactly the listed columns in order, missing columns blank
+    (runs stored before a column existed)
+    '''
+    missing = {c: pd.Series(None, index=df.index, dtype=object) for c in columns if c not in df.columns}
+    return df.assign(**missing)[list(columns)]
+
+
+def run_frames(store, source, columns=None, start=None, end=None, run_ts=None):
+    '''
+    Dataframes of completed runs of a source, read one run at a time
+
+    Parameters
+    ----------
+    store : PriceStore
+    source : string
+        'gulong', 'gogulong', 'tiremanila' or 'merged'
+    columns : list, optional
+        columns to read. The default is all columns.
+    start, end : date or string, optional
+        inclusive date range of runs. The default is all dates.
+    run_ts : datetime, optional
+        only the latest run of source up to run_ts (run_ts column is dropped).
+        The default exports all runs in the date range.
+
+    Yields
+    ------
+    dataframe
+        rows of one run
+    '''
+    df_runs = store.runs(source, start, end)
+    df_runs = df_runs[df_runs['run_ts'].isin(store.completed_runs())]
+    if run_ts is not None:
+        df_runs = df_runs[df_runs['run_ts'] <= run_ts].tail(1)
+    for n in range(len(df_runs)):
+        df = decategorize(store.read_runs(df_runs.iloc[[n]], columns))
+        if columns is not None:
+            df = conform_columns(df, list(columns) + ['run_ts'])
+        yield df.drop(columns='run_ts') if run_ts is not None else df
+
+
+def write_csv_gz(frames, path, chunksize=50000):
+    '''
+    Writes dataframes one after another to a gzip-compressed csv (no index)
+    with the columns of the first dataframe
+
+    Returns
+    -------
+    n_rows : int
+    '''
+    n_rows, columns = 0, None
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        for df in frames:
+            header = columns is None
+            if header:
+                columns = list(df.columns)
+            conform_columns(df, columns).to_csv(f, header=header, index=False, chunksize=chunksize)
+            n_rows += len(df)
+    return n_rows
+
+
+def write_parquet(frames, path):
+    '''
+    Writes dataframes one after another as row groups of a parquet file with
+    the columns of the first dataframe
+
+    Returns
+    -------
+    n_rows : int
+    '''
+    writer, n_rows = None, 0
+    try:
+        for df in frames:
+            if writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                # columns without values in the first run are text
+                schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                    for f in table.schema]).remove_metadata()
+                writer = pq.ParquetWriter(path, schema)
+            else:
+                table = pa.Table.from_pandas(conform_columns(df, schema.names), preserve_index=False)
+            writer.write_table(table.cast(schema))
+            n_rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def export_runs(store, source, fmt='csv.gz', columns=None, start=None, end=None, run_ts=None,
+                export_dir='scraper_data/exports', max_age=3600):
+    '''
+    Exports stored runs of a source to a file
+
+    Parameters
+    ----------
+    store : PriceStore
+    source : string
+        'gulong', 'gogulong', 'tiremanila' or 'merged'
+    fmt : string, optional
+        'csv.gz' or 'parquet'. The default is 'csv.gz'.
+    columns, start, end, run_ts : optional
+        selected columns, dates and run (see run_frames)
+    export_dir : string, optional
+        directory of export files. The default is 'scraper_data/exports'.
+    max_age : int, optional
+        seconds after which old export files are removed. The default is 3600.
+
+    Returns
+    -------
+    path : string
+        export file, None if no rows were exported
+    '''
+    if fmt not in export_formats:
+        raise ValueError('Unknown export format {}'.format(fmt))
+    os.makedirs(export_dir, exist_ok=True)
+    for f in os.listdir(export_dir):
+        try:
+            if time.time() - os.path.getmtime(os.path.join(export_dir, f)) > max_age:
+                os.remove(os.path.join(export_dir, f))
+        except FileNotFoundError:
+            pass
+    # unique per request, sessions may export at the same time
+    path = os.path.join(export_dir, '{}_{}_{}.{}'.format(source, time.strftime('%Y%m%d_%H%M%S'),
+                                                         uuid.uuid4().hex[:6], fmt))
+    frames = run_frames(store, source, columns, start, end, run_ts)
+    write = write_csv_gz if fmt == 'csv.gz' else write_parquet
+    if not write(frames, path + '.tmp'):
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        return None
+    os.replace(path + '.tmp', path)
+    return path
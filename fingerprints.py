@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Change-detection fingerprints for scraped units (spec searches, listing pages)
+
+Each unit keeps the hash of its last scraped records together with its parsed
+dataframe so unchanged results skip re-parsing and re-normalization.
+"""
+
+import os, json, pickle, hashlib, threading
+from datetime import datetime
+
+import pandas as pd
+
+
+def frame_fingerprint(df, salt=''):
+    '''
+    Content hash of a dataframe (row order sensitive)
+
+    Parameters
+    ----------
+    df : dataframe
+        scraped records
+    salt : string, optional
+        extra key mixed into the hash (e.g. catalog fingerprint). The default is ''.
+
+    Returns
+    -------
+    string
+        sha1 hex digest
+    '''
+    h = hashlib.sha1(salt.encode('utf-8'))
+    h.update(','.join(map(str, df.columns)).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+class FingerprintStore:
+    '''
+    Disk-backed fingerprints and parsed results per scraped unit
+
+    Safe to share between concurrently running scrapers.
+
+    Parameters
+    ----------
+    path : string
+        directory of fingerprints.json index and pickled parsed frames
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.join(path, 'frames'), exist_ok=True)
+        self.index_file = os.path.join(path, 'fingerprints.json')
+        self.lock = threading.RLock()
+        try:
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def frame_file(self, key):
+        return os.path.join(self.path, 'frames', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    def lookup(self, key, fingerprint):
+        '''
+        Parsed result of unit if its fingerprint is unchanged, else None
+        '''
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None or entry['hash'] != fingerprint:
+                return None
+            try:
+                with open(self.frame_file(key), 'rb') as f:
+                    result = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+            entry['checked'] = datetime.now().isoformat()
+            return result
+
+    def update(self, key, fingerprint, result):
+        '''
+        Stores fingerprint and parsed result of unit
+
+        Returns
+        -------
+        changed : bool
+            True if fingerprint differs from the stored one
+        '''
+        now = datetime.now().isoformat()
+        with self.lock:
+            entry = self.index.setdefault(key, {'hash': None, 'changed': now, 'n_changes': 0})
+            changed = entry['hash'] != fingerprint
+            if changed:
+                entry.update({'hash': fingerprint, 'changed': now,
+                              'n_changes': entry['n_changes'] + 1})
+            entry['checked'] = now
+            with open(self.frame_file(key), 'wb') as f:
+                pickle.dump(result, f)
+        return changed
+
+    def order(self, keys):
+        '''
+        Orders units so unseen and most recently changed units come first
+
+        Parameters
+        ----------
+        keys : list
+            unit keys
+
+        Returns
+        -------
+        list
+            reordered keys (ties keep input order)
+        '''
+        with self.lock:
+            return sorted(keys, key=lambda k: self.index[k]['changed'] if k in self.index else '9999',
+                          reverse=True)
+
+    def save(self):
+        '''
+        Writes fingerprint index to disk
+        '''
+        tmp_file = self.index_file + '.tmp'
+        with self.lock:
+            with open(tmp_file, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_file, self.index_file)
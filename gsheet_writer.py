@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Delta writes of dataframes to google sheets
+
+The values last written to each worksheet are kept as a local snapshot so a
+new write only sends the cells which changed, grouped into A1 ranges and sent
+in chunked batch_update calls. The worksheet is never cleared, so readers
+always see a complete table.
+"""
+
+import os, json, time, hashlib
+
+import gspread
+from gspread.utils import rowcol_to_a1, a1_to_rowcol
+
+
+def sheet_values(df):
+    '''
+    Header and rows of dataframe as list of lists of sheet values
+    '''
+    return [[str(c) for c in df.columns]] + df.values.tolist()
+
+
+def changed_ranges(old, new):
+    '''
+    A1 ranges of cells which differ between old and new values
+
+    Cells of old outside of new are blanked. Consecutive rows with the same
+    changed column span are merged into one range.
+
+    Parameters
+    ----------
+    old : list
+        list of rows previously written
+    new : list
+        list of rows to write
+
+    Returns
+    -------
+    ranges : list
+        batch_update data, dictionaries of range and values
+    '''
+    n_rows = max(len(old), len(new))
+    n_cols = max([len(row) for row in old + new] or [0])
+    def cell(values, i, j):
+        if i < len(values) and j < len(values[i]):
+            return values[i][j]
+        return ''
+    # contiguous changed column spans per row
+    spans = []
+    for i in range(n_rows):
+        changed = [j for j in range(n_cols) if str(cell(old, i, j)) != str(cell(new, i, j))]
+        row_spans, start = [], None
+        for k, j in enumerate(changed):
+            if start is None:
+                start = j
+            if k == len(changed) - 1 or changed[k + 1] != j + 1:
+                row_spans.append((start, j))
+                start = None
+        spans.append(row_spans)
+
+    ranges, blocks = [], {}
+    for i in range(n_rows + 1):
+        row_spans = spans[i] if i < n_rows else []
+        # close blocks whose span does not continue on this row
+        for span in [s for s in blocks if s not in row_spans]:
+            first = blocks.pop(span)
+            ranges.append({'range': '{}:{}'.format(rowcol_to_a1(first + 1, span[0] + 1),
+                                                  rowcol_to_a1(i, span[1] + 1)),
+                           'values': [[cell(new, r, j) for j in range(span[0], span[1] + 1)]
+                                      for r in range(first, i)]})
+        for span in row_spans:
+            blocks.setdefault(span, i)
+    return ranges
+
+
+def with_retry(func, retries=5, backoff=1.0):
+    '''
+    Calls func, retrying rate limit (429), server (5xx) and connection errors
+    with exponential backoff
+    '''
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except gspread.exceptions.APIError as e:
+            if attempt == retries or not (e.code == 429 or e.code >= 500):
+                raise
+            print('Google sheets API error {}, retrying'.format(e.code))
+        except OSError as e:
+            if attempt == retries:
+                raise
+            print('Google sheets connection error {}, retrying'.format(e))
+        time.sleep(backoff * 2**attempt)
+
+
+class SheetWriter:
+    '''
+    Writes dataframes to worksheets sending only changed cells
+
+    Parameters
+    ----------
+    spreadsheet : gspread Spreadsheet
+    snapshot_dir : string
+        directory of last written values per worksheet
+    max_cells : int, optional
+        maximum number of cells per batch_update call. The default is 20000.
+    retries : int, optional
+        retries of failed API calls. The default is 5.
+    backoff : float, optional
+        initial retry delay in seconds, doubled on every retry. The default is 1.
+    '''
+
+    def __init__(self, spreadsheet, snapshot_dir, max_cells=20000, retries=5, backoff=1.0):
+        self.spreadsheet = spreadsheet
+        self.snapshot_dir = snapshot_dir
+        self.max_cells = max_cells
+        self.retries = retries
+        self.backoff = backoff
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    def call(self, func):
+        return with_retry(func, self.retries, self.backoff)
+
+    def snapshot_file(self, title):
+        key = hashlib.sha1('{}/{}'.format(self.spreadsheet.id, title).encode('utf-8')).hexdigest()
+        return os.path.join(self.snapshot_dir, key + '.json')
+
+    def load_snapshot(self, title):
+        try:
+            with open(self.snapshot_file(title)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_snapshot(self, title, values):
+        path = self.snapshot_file(title)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(values, f, default=str)
+        os.replace(path + '.tmp', path)
+
+    def worksheet(self, title, rows, cols):
+        '''
+        Gets worksheet, created if missing and grown to at least rows x cols
+
+        Returns
+        -------
+        worksheet : gspread Worksheet
+        created : bool
+        '''
+        try:
+            worksheet = self.call(lambda: self.spreadsheet.worksheet(title))
+        except gspread.exceptions.WorksheetNotFound:
+            worksheet = self.call(lambda: self.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols))
+            return worksheet, True
+        if worksheet.row_count < rows or worksheet.col_count < cols:
+            self.call(lambda: worksheet.resize(rows=max(rows, worksheet.row_count),
+                                               cols=max(cols, worksheet.col_count)))
+        return worksheet, False
+
+    def write(self, title, df):
+        '''
+        Writes dataframe to worksheet, sending only cells changed since last write
+
+        Parameters
+        ----------
+        title : string
+            worksheet name
+        df : dataframe
+
+        Returns
+        -------
+        n_cells : int
+            number of cells sent
+        '''
+        new = sheet_values(df)
+        worksheet, created = self.worksheet(title, len(new) + 1, len(new[0]) + 1)
+        if created:
+            old = []
+        else:
+            old = self.load_snapshot(title)
+            if old is None:
+                # no snapshot of this worksheet, diff against its current contents
+                old = self.call(lambda: worksheet.get_all_values())
+
+        ranges = []
+        for r in changed_ranges(old, new):
+            # split ranges larger than a batch into row slices
+            (row, col), (_, last_col) = [a1_to_rowcol(a) for a in r['range'].split(':')]
+            step = max(1, self.max_cells // len(r['values'][0]))
+            for i in range(0, len(r['values']), step):
+                values = r['values'][i:i + step]
+                ranges.append({'range': '{}:{}'.format(rowcol_to_a1(row + i, col),
+                                                      rowcol_to_a1(row + i + len(values) - 1, last_col)),
+                               'values': values})
+        n_cells = sum(len(r['values']) * len(r['values'][0]) for r in ranges)
+        batch, batch_cells = [], 0
+        for r in ranges + [None]:
+            size = 0 if r is None else len(r['values']) * len(r['values'][0])
+            if batch and (r is None or batch_cells + size > self.max_cells):
+                self.call(lambda: worksheet.batch_update(batch))
+                batch, batch_cells = [], 0
+            if r is not None:
+                batch.append(r)
+                batch_cells += size
+        self.save_snapshot(title, new)
+        print('Updated {} cells in {} ranges of worksheet {}'.format(n_cells, len(ranges), title))
+        return n_cells
@@ -8,20 +8,35 @@ Created on Wed Aug  3 11:32:29 2022
 import pandas as pd
 import numpy as np
 from decimal import Decimal
-import re, time
-import datetime as dt
-from datetime import datetime 
+import os, re, json, time
+import asyncio
+from datetime import datetime, timedelta
 from pytz import timezone
 import gspread
+import aiohttp
+import lxml.html
 
 import streamlit as st
-from selenium.webdriver import Chrome
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from st_aggrid import GridOptionsBuilder, AgGrid
-from functools import reduce
+from fingerprints import frame_fingerprint
+from price_store import PriceStore
+from scrape_cache import DiskCache, hash_key
+from driver_pool import DriverPool, lean_options, lean_blocked_urls, json_responses
+from gsheet_writer import SheetWriter
+from waits import AdaptiveWaits
+from search_planner import SearchPlanner, canonical_spec, spec_priority
+from run_journal import RunJournal
+from metrics import Metrics, summary_frames
+from ingest import CachedCSV
+from schema import apply_schema, decategorize
+from table_pager import TablePager
+from exports import export_runs, export_formats
+from functools import lru_cache
+from collections import defaultdict
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import warnings
 
 # to run selenium in headless mode (no user interface/does not open browser)
@@ -33,17 +48,44 @@ options.add_argument("--disable-gpu")
 options.add_argument("--disable-features=NetworkService")
 options.add_argument("--window-size=1920x1080")
 options.add_argument("--disable-features=VizDisplayCompositor")
+# lean page loads: return once DOM is ready, no images, log transferred bytes
+lean_options(options)
 
 # set timezone
 phtime = timezone('Asia/Manila')
+
+# persistent cache of scraper results, time to live in seconds per source
+cache_dir = 'scraper_data/cache'
+cache_ttl = {'gulong': 3600,
+             'gogulong': 12*3600,
+             'tiremanila': 3*3600,
+             'merged': 24*3600}
+scrape_cache = DiskCache(cache_dir, cache_ttl, max_bytes=2**30)
+# metrics of the current scrape run (latencies, waits, items, restarts, stage durations),
+# exported as json and as Prometheus textfile after each run
+run_metrics = Metrics()
+metrics_file = 'scraper_data/metrics/metrics.json'
+metrics_prom_file = 'scraper_data/metrics/scraper.prom'
+# gulong.ph catalog (redash query 130): typed local copy, downloaded again only when 
+# the query result changed (query version probe, then ETag/Last-Modified)
+gulong_csv_url = 'http://app.redash.licagroup.ph/api/queries/130/results.csv?api_key=JFYeyFN7WwoJbUqf8eyS0388PFE7AiG1JWa6y9Zp'
+# aspect ratios are text, e.g. 'R1' (see fix_aspect_ratio)
+gulong_dtypes = {'model': str, 'pattern': str, 'make': str, 'section_width': str, 
+                 'aspect_ratio': str, 'rim_size': str, 'price': 'float64', 'srp': 'float64',
+                 'sale_tag': 'float64', 'is_model_active': 'float64', 'vehicle_type': str}
+gulong_source = CachedCSV(gulong_csv_url, 'scraper_data/redash/query_130', dtype=gulong_dtypes, 
+                          usecols=list(gulong_dtypes), row_filter=lambda df: df[df.is_model_active == 1],
+                          probe_url=gulong_csv_url.replace('/results.csv', ''))
+# page readiness waits with per-site timeouts learned from observed latencies
+waits_file = 'scraper_data/waits.json'
+page_waits = AdaptiveWaits(waits_file, metrics=run_metrics)
 #st.session_state.update(st.session_state)
 
 def get_num_items(driver, xpath):
     '''
     Used by gogulong_scraper
     
-    For future reference:
-        Test usage of driver.wait
+    Waits until the product count is rendered (see page_waits).
     
     Parameters
     ----------
@@ -61,19 +103,160 @@ def get_num_items(driver, xpath):
         total number of products available for scraping
     '''
     
-    try: 
-        elements_present = WebDriverWait(driver, 3) \
-                .until(EC.presence_of_element_located((By.XPATH, xpath)))
-        if elements_present:
-            total_items_text = driver.find_elements(By.XPATH, xpath)
-            total_items_list = [items.text for items in total_items_text]
-            total_items = [item for item in total_items_list[0].split(' ') 
-                           if item.isdigit()][0]
-    except:
+    def count_rendered(d):
+        elements = d.find_elements(By.XPATH, xpath)
+        digits = [item for item in elements[0].text.split(' ') if item.isdigit()] if elements else []
+        return digits[0] if digits else None
+    
+    total_items = page_waits.wait(driver, 'gogulong', 'count', count_rendered)
+    if total_items is None:
+        warnings.warn('Number of products not rendered in {:.1f} s'.format(page_waits.budget('gogulong', 'count')))
         total_items = 0
     return total_items
 
 
+# javascript returning titles of rendered product tiles, used to detect new pages
+tiles_signature_js = '''
+var r = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var titles = [];
+for (var i = 0; i < r.snapshotLength; i++) titles.push(r.snapshotItem(i).textContent.trim());
+return titles.join('\\n');
+'''
+
+def wait_for_tiles(driver, site, event, xpath_info, previous=None):
+    '''
+    Waits until product tiles are rendered and differ from previous tiles
+    
+    Parameters
+    ----------
+    driver : selenium
+        chrome driver
+    site : string
+        scraped site
+    event : string
+        waited event, e.g. 'page', 'next_page'
+    xpath_info : dictionary
+        Dictionary of tires, price, info html xpaths of website
+    previous : string, optional
+        tiles signature before a click (see tiles_signature_js). The default is None.
+    
+    Returns
+    -------
+    signature : string
+        tiles signature of rendered page, None on timeout
+    '''
+    def tiles_rendered(d):
+        signature = d.execute_script(tiles_signature_js, xpath_info['tires'])
+        return signature if (signature and signature != previous) else None
+    signature = page_waits.wait(driver, site, event, tiles_rendered)
+    if signature is None:
+        warnings.warn('{} tiles not rendered for {} in {:.1f} s'.format(site, event, page_waits.budget(site, event)))
+    return signature
+
+
+def wait_for_element(driver, site, event, xpath):
+    '''
+    Waits until an element is present
+    
+    Returns
+    -------
+    element : selenium WebElement
+        first matching element, None on timeout
+    '''
+    def present(d):
+        elements = d.find_elements(By.XPATH, xpath)
+        return elements[0] if elements else None
+    return page_waits.wait(driver, site, event, present)
+
+
+# javascript run in the browser to extract all product tiles of a page in one call
+# tile = largest ancestor of a price element that contains no other price element
+extract_tiles_js = '''
+var xpath = arguments[0];
+function nodes(path, context) {
+    var result = document.evaluate(path, context || document, null, 
+                                    XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var out = [];
+    for (var i = 0; i < result.snapshotLength; i++) { out.push(result.snapshotItem(i)); }
+    return out;
+}
+function text(node) { return node ? node.innerText.trim() : null; }
+function field(lines, key) {
+    for (var i = 0; i < lines.length; i++) {
+        if (lines[i] === key) { return i + 1 < lines.length ? lines[i+1] : null; }
+        if (lines[i].indexOf(key + ' ') === 0) { return lines[i].slice(key.length).trim(); }
+    }
+    return null;
+}
+return nodes(xpath.price).map(function(price) {
+    var tile = price;
+    while (tile.parentElement && nodes('.' + xpath.price, tile.parentElement).length === 1) {
+        tile = tile.parentElement;
+    }
+    var titles = nodes('.' + xpath.tires, tile);
+    var infos = nodes('.' + xpath.info, tile);
+    var record = {title: text(titles[0]), price: text(price), info: text(infos[infos.length-1]),
+                  index: null, style: null, qty: null};
+    if (xpath.table) {
+        var table = nodes('.' + xpath.table, tile)[0];
+        var lines = table ? table.innerText.split('\\n').map(function(l) { return l.trim(); })
+                                           .filter(function(l) { return l; }) : [];
+        record.index = field(lines, 'Index:');
+        record.style = field(lines, 'Style:');
+        record.qty = field(lines, 'Qty:');
+    }
+    return record;
+});
+'''
+
+def scrape_tiles(driver, xpath_info):
+    '''
+    Extracts all product tiles of current page in a single browser round trip
+    
+    Parameters
+    ----------
+    driver : selenium
+        chrome driver
+    xpath_info : dictionary
+        Dictionary of tires, price, info (and optional table) html xpaths of website
+    
+    Returns
+    -------
+    records : list
+        list of dictionaries with title, price, info, index, style, qty per tile
+        (price-less tiles are excluded)
+    '''
+    records = driver.execute_script(extract_tiles_js, xpath_info) or []
+    return [r for r in records if r['price']]
+
+
+def tiles_to_lists(records, data_list, info_list=None):
+    '''
+    Appends extracted tile records to lists of scraped info
+    
+    Parameters
+    ----------
+    records : list
+        list of tile dictionaries from scrape_tiles or parse_tiles
+    data_list : list
+        list of lists for scraped info (tires, price, info)
+    info_list : list, optional
+        list of list of index, style, qty information
+    
+    Returns
+    -------
+    data_list : list
+    info_list : list
+    '''
+    for r in records:
+        for l, key in zip(data_list, ['title', 'price', 'info']):
+            l.append(r[key] if r[key] is not None else '')
+        if info_list is not None:
+            for l, key in zip(info_list, ['index', 'style', 'qty']):
+                l.append(r[key] if r[key] is not None else str(np.NaN))
+    return data_list, info_list
+
+
 def scrape_data(driver, data_list, xpath_info, site ='gulong'):
     '''
 
@@ -87,6 +270,7 @@ def scrape_data(driver, data_list, xpath_info, site ='gulong'):
         Dictionary of tires, price, info html xpaths separated by website
     site : string, optional
         Which site is being scraped. The default is 'gulong'.
+        Tiles are matched per product so the same extraction is used for all sites.
 
     Returns
     -------
@@ -94,30 +278,10 @@ def scrape_data(driver, data_list, xpath_info, site ='gulong'):
         list of lists containing text of scraped info (tire, price, info)
 
     '''
-    tire_list_gulong, price_list_gulong, info_list_gulong = data_list
-    # tires
-    tires_gulong = driver.find_elements(By.XPATH, xpath_info['tires'])
-    # prices
-    price_gulong = driver.find_elements(By.XPATH, xpath_info['price'])
-    # specs
-    info_gulong = driver.find_elements(By.XPATH, xpath_info['info'])
-    # save scraped text
-    for i in range(len(price_gulong)):
-        try:
-            if price_gulong[i].text == '':
-                continue
-            else:
-                if site =='gulong':
-                    tire_list_gulong.append(tires_gulong[i*2].text)
-                    price_list_gulong.append(price_gulong[i].text)
-                    info_list_gulong.append(info_gulong[i*2+1].text)
-                else:
-                    tire_list_gulong.append(tires_gulong[i].text)
-                    price_list_gulong.append(price_gulong[i].text)
-                    info_list_gulong.append(info_gulong[i].text)
-        except:
-            break
-    return [tire_list_gulong, price_list_gulong, info_list_gulong]
+    with run_metrics.timer('extraction_seconds', site=site):
+        records = scrape_tiles(driver, xpath_info)
+    data_list, _ = tiles_to_lists(records, data_list)
+    return data_list
 
 
 #@st.experimental_memo
@@ -165,6 +329,191 @@ def fix_diameter(d):
         return d.split('R')[1].split('C')[0]
 
             
+# replacement should be all caps
+change_name_dict = {'TRANSIT.*ARZ.?6-X' : 'TRANSITO ARZ6-X',
+                    'TRANSIT.*ARZ.?6-A' : 'TRANSITO ARZ6-A',
+                    'TRANSIT.*ARZ.?6-M' : 'TRANSITO ARZ6-M',
+                    'OPA25': 'OPEN COUNTRY A25',
+                    'OPA28': 'OPEN COUNTRY A28',
+                    'OPA32': 'OPEN COUNTRY A32',
+                    'OPA33': 'OPEN COUNTRY A33',
+                    'OPAT\+': 'OPEN COUNTRY AT PLUS', 
+                    'OPAT2': 'OPEN COUNTRY AT 2',
+                    'OPMT2': 'OPEN COUNTRY MT 2',
+                    'OPAT OPMT': 'OPEN COUNTRY AT',
+                    'OPAT': 'OPEN COUNTRY AT',
+                    'OPMT': 'OPEN COUNTRY MT',
+                    'OPRT': 'OPEN COUNTRY RT',
+                    'OPUT': 'OPEN COUNTRY UT',
+                    'DC -80': 'DC-80',
+                    'DC -80+': 'DC-80+',
+                    'KM3': 'MUD-TERRAIN T/A KM3',
+                    'KO2': 'ALL-TERRAIN T/A KO2',
+                    'TRAIL-TERRAIN T/A' : 'TRAIL-TERRAIN',
+                    '265/70/R16 GEOLANDAR 112S': 'GEOLANDAR A/T G015',
+                    '265/65/R17 GEOLANDAR 112S' : 'GEOLANDAR A/T G015',
+                    '265/65/R17 GEOLANDAR 112H' : 'GEOLANDAR G902',
+                    'GEOLANDAR A/T 102S': 'GEOLANDAR A/T-S G012',
+                    'GEOLANDAR A/T': 'GEOLANDAR A/T G015',
+                    'ASSURACE MAXGUARD SUV': 'ASSURANCE MAXGUARD SUV',
+                    'EFFICIENTGRIP SUV': 'EFFICIENTGRIP SUV',
+                    'EFFICIENGRIP PERFORMANCE SUV':'EFFICIENTGRIP PERFORMANCE SUV',
+                    'WRANGLE DURATRAC': 'WRANGLER DURATRAC',
+                    'WRANGLE AT ADVENTURE': 'WRANGLER AT ADVENTURE',
+                    'WRANGLER AT ADVENTURE': 'WRANGLER AT ADVENTURE',
+                    'WRANGLER AT SILENT TRAC': 'WRANGLER AT SILENTTRAC',
+                    'ENASAVE  EC300+': 'ENSAVE EC300 PLUS',
+                    'SAHARA AT2' : 'SAHARA AT 2',
+                    'SAHARA MT2' : 'SAHARA MT 2',
+                    'WRANGLER AT SILENT TRAC': 'WRANGLER AT SILENTTRAC',
+                    'POTENZA RE003 ADREANALIN': 'POTENZA RE003 ADRENALIN',
+                    'POTENZA RE004': 'POTENZA RE004',
+                    'SPORT MAXX 050' : 'SPORT MAXX 050',
+                    'DUELER H/T 470': 'DUELER H/T 470',
+                    'DUELER H/T 687': 'DUELER H/T 687 RBT',
+                    'DUELER A/T 697': 'DUELER A/T 697',
+                    'DUELER A/T 693': 'DUELER A/T 693 RBT',
+                    'DUELER H/T 840' : 'DUELER H/T 840 RBT',
+                    'EVOLUTION MT': 'EVOLUTION M/T',
+                    'BLUEARTH AE61' : 'BLUEARTH XT AE61',
+                    'BLUEARTH ES32' : 'BLUEARTH ES ES32',
+                    'BLUEARTH AE51': 'BLUEARTH GT AE51',
+                    'COOPER STT PRO': 'STT PRO',
+                    'COOPER AT3 LT' : 'AT3 LT',
+                    'COOPER AT3 XLT' : 'AT3 XLT',
+                    'A/T3' : 'AT3',
+                    'ENERGY XM+' : 'ENERGY XM2+',
+                    'XM2+' : 'ENERGY XM2+',
+                    'AT3 XLT': 'AT3 XLT',
+                    'ADVANTAGE T/A DRIVE' : 'ADVANTAGE T/A DRIVE',
+                    'ADVANTAGE T/A SUV' : 'ADVANTAGE T/A SUV'
+                    }
+
+
+class NameMatcher:
+    '''
+    Precompiled product name matcher used by fix_names
+    
+    All change_name_dict keys are combined into a single regex of lookahead 
+    branches in dictionary order so the first matching key wins. The model 
+    names to compare with are combined the same way, longest names first, 
+    so the longest matching name is returned.
+    
+    Parameters
+    ----------
+    comp: list (optional)
+        optional list of model names to compare with
+    '''
+    
+    def __init__(self, comp=None):
+        self.rules = list(change_name_dict.items())
+        self.rule_regex, self.rule_groups = self.compile_branches([k for k, v in self.rules])
+        if comp is not None:
+            # longest names first, ties keep list order
+            self.comp = sorted([n for n in comp if isinstance(n, str)], key=lambda n: -len(n))
+            self.comp_regex, self.comp_groups = self.compile_branches(self.comp)
+        else:
+            self.comp = None
+        self.cache = {}
+    
+    @staticmethod
+    def compile_branches(patterns):
+        '''
+        Combines patterns into one regex which matches at position 0 if any 
+        pattern is found anywhere in the string. The branch of the first 
+        matching pattern is identified by an empty marker group.
+        
+        Returns
+        -------
+        regex : compiled regex or list of compiled regex (if patterns cannot be combined)
+        groups : dictionary
+            marker group index -> pattern index
+        '''
+        branches, groups, n_groups = [], {}, 0
+        try:
+            for i, p in enumerate(patterns):
+                n_groups += re.compile(p).groups + 1
+                groups[n_groups] = i
+                branches.append('(?=(?s:.*?)(?:{})())'.format(p))
+            return re.compile('|'.join(branches)), groups
+        except re.error:
+            # fallback to sequential search
+            return [re.compile(p) for p in patterns], None
+    
+    @staticmethod
+    def first_match(regex, groups, name):
+        '''
+        Index of first pattern found in name, None if no match
+        '''
+        if groups is None:
+            return next((i for i, r in enumerate(regex) if r.search(name)), None)
+        m = regex.match(name)
+        return groups[m.lastindex] if m else None
+    
+    def fix(self, sku_name):
+        '''
+        Fix product name to match competitor names (see fix_names)
+        '''
+        if sku_name in self.cache:
+            return self.cache[sku_name]
+        # uppercase and remove double spaces
+        raw_name = sku_name.replace('  ', ' ').upper().strip()
+        # specific cases
+        i = self.first_match(self.rule_regex, self.rule_groups, raw_name)
+        if i is not None:
+            name = self.rules[i][1]
+        # longest matching name from list
+        elif self.comp is not None:
+            i = self.first_match(self.comp_regex, self.comp_groups, raw_name)
+            name = self.comp[i] if i is not None else raw_name
+        else:
+            name = raw_name
+        self.cache[sku_name] = name
+        return name
+    
+    def fix_series(self, names):
+        '''
+        Fix a whole series of product names, each unique name is matched once
+        
+        Parameters
+        ----------
+        names: pandas Series
+            input SKU names
+        
+        Returns
+        -------
+        pandas Series
+            fixed names as UPPERCASE (NaN kept as NaN)
+        '''
+        codes, uniques = pd.factorize(names)
+        fixed = np.array([self.fix(n) for n in uniques] + [np.NaN], dtype=object)
+        return pd.Series(fixed[codes], index=names.index, name=names.name)
+
+
+@lru_cache(maxsize=8)
+def compile_name_matcher(comp=None):
+    '''
+    Cached NameMatcher per tuple of model names to compare with
+    '''
+    return NameMatcher(comp)
+
+
+def get_name_matcher(comp=None):
+    '''
+    Get precompiled NameMatcher for list of model names
+    
+    Parameters
+    ----------
+    comp: list (optional)
+        optional list of model names to compare with
+    
+    Returns
+    -------
+    NameMatcher
+    '''
+    return compile_name_matcher(tuple(comp) if comp is not None else None)
+
+
 def fix_names(sku_name, comp=None):
     '''
     Fix product names to match competitor names
@@ -181,96 +530,7 @@ def fix_names(sku_name, comp=None):
     name: str
         fixed names as UPPERCASE
     '''
-    
-    # replacement should be all caps
-    change_name_dict = {'TRANSIT.*ARZ.?6-X' : 'TRANSITO ARZ6-X',
-                        'TRANSIT.*ARZ.?6-A' : 'TRANSITO ARZ6-A',
-                        'TRANSIT.*ARZ.?6-M' : 'TRANSITO ARZ6-M',
-                        'OPA25': 'OPEN COUNTRY A25',
-                        'OPA28': 'OPEN COUNTRY A28',
-                        'OPA32': 'OPEN COUNTRY A32',
-                        'OPA33': 'OPEN COUNTRY A33',
-                        'OPAT\+': 'OPEN COUNTRY AT PLUS', 
-                        'OPAT2': 'OPEN COUNTRY AT 2',
-                        'OPMT2': 'OPEN COUNTRY MT 2',
-                        'OPAT OPMT': 'OPEN COUNTRY AT',
-                        'OPAT': 'OPEN COUNTRY AT',
-                        'OPMT': 'OPEN COUNTRY MT',
-                        'OPRT': 'OPEN COUNTRY RT',
-                        'OPUT': 'OPEN COUNTRY UT',
-                        'DC -80': 'DC-80',
-                        'DC -80+': 'DC-80+',
-                        'KM3': 'MUD-TERRAIN T/A KM3',
-                        'KO2': 'ALL-TERRAIN T/A KO2',
-                        'TRAIL-TERRAIN T/A' : 'TRAIL-TERRAIN',
-                        '265/70/R16 GEOLANDAR 112S': 'GEOLANDAR A/T G015',
-                        '265/65/R17 GEOLANDAR 112S' : 'GEOLANDAR A/T G015',
-                        '265/65/R17 GEOLANDAR 112H' : 'GEOLANDAR G902',
-                        'GEOLANDAR A/T 102S': 'GEOLANDAR A/T-S G012',
-                        'GEOLANDAR A/T': 'GEOLANDAR A/T G015',
-                        'ASSURACE MAXGUARD SUV': 'ASSURANCE MAXGUARD SUV',
-                        'EFFICIENTGRIP SUV': 'EFFICIENTGRIP SUV',
-                        'EFFICIENGRIP PERFORMANCE SUV':'EFFICIENTGRIP PERFORMANCE SUV',
-                        'WRANGLE DURATRAC': 'WRANGLER DURATRAC',
-                        'WRANGLE AT ADVENTURE': 'WRANGLER AT ADVENTURE',
-                        'WRANGLER AT ADVENTURE': 'WRANGLER AT ADVENTURE',
-                        'WRANGLER AT SILENT TRAC': 'WRANGLER AT SILENTTRAC',
-                        'ENASAVE  EC300+': 'ENSAVE EC300 PLUS',
-                        'SAHARA AT2' : 'SAHARA AT 2',
-                        'SAHARA MT2' : 'SAHARA MT 2',
-                        'WRANGLER AT SILENT TRAC': 'WRANGLER AT SILENTTRAC',
-                        'POTENZA RE003 ADREANALIN': 'POTENZA RE003 ADRENALIN',
-                        'POTENZA RE004': 'POTENZA RE004',
-                        'SPORT MAXX 050' : 'SPORT MAXX 050',
-                        'DUELER H/T 470': 'DUELER H/T 470',
-                        'DUELER H/T 687': 'DUELER H/T 687 RBT',
-                        'DUELER A/T 697': 'DUELER A/T 697',
-                        'DUELER A/T 693': 'DUELER A/T 693 RBT',
-                        'DUELER H/T 840' : 'DUELER H/T 840 RBT',
-                        'EVOLUTION MT': 'EVOLUTION M/T',
-                        'BLUEARTH AE61' : 'BLUEARTH XT AE61',
-                        'BLUEARTH ES32' : 'BLUEARTH ES ES32',
-                        'BLUEARTH AE51': 'BLUEARTH GT AE51',
-                        'COOPER STT PRO': 'STT PRO',
-                        'COOPER AT3 LT' : 'AT3 LT',
-                        'COOPER AT3 XLT' : 'AT3 XLT',
-                        'A/T3' : 'AT3',
-                        'ENERGY XM+' : 'ENERGY XM2+',
-                        'XM2+' : 'ENERGY XM2+',
-                        'AT3 XLT': 'AT3 XLT',
-                        'ADVANTAGE T/A DRIVE' : 'ADVANTAGE T/A DRIVE',
-                        'ADVANTAGE T/A SUV' : 'ADVANTAGE T/A SUV'
-                        }
-    
-    # uppercase and remove double spaces
-    raw_name = re.sub('  ', ' ', sku_name).upper().strip()
-    # specific cases
-    for key in change_name_dict.keys():
-        if re.search(key, raw_name):
-            return change_name_dict[key]
-        else:
-            continue
-    
-    # if match list provided
-    
-    if comp is not None:
-        # check if any name from list matches anything in sku name
-        match_list = [n for n in comp if re.search(n, raw_name)]
-        # exact match from list
-        if len(match_list) == 1:
-            return match_list[0]
-        # multiple matches (i.e. contains name but with extensions)
-        elif len(match_list) > 1:
-            long_match = ''
-            for m in match_list:
-                if len(m) > len(long_match):
-                    long_match = m
-            return long_match
-        # no match
-        else:
-            return raw_name
-    else:
-        return raw_name
+    return get_name_matcher(comp).fix(sku_name)
     
 
 def remove_exponent(num):
@@ -328,246 +588,963 @@ def raw_specs(x):
     else:
         return '/'.join([str(x['width']), str(x['aspect_ratio']), str(x['diameter'])])
 
-@st.experimental_memo(suppress_st_warning=True)
-def get_gulong_data():
+def map_unique(series, func):
+    '''
+    Applies func once per unique string value of series (lookup table)
+    
+    Parameters
+    ----------
+    series : pandas Series
+    func : function
+        function of the string form of a value
+    
+    Returns
+    -------
+    pandas Series
+        func output aligned with series
+    '''
+    codes, uniques = pd.factorize(series.astype(str))
+    table = np.array([func(u) for u in uniques], dtype=object)
+    return pd.Series(table[codes], index=series.index, dtype=object)
+
+def raw_specs_columns(width, aspect_ratio, diameter):
+    '''
+    Vectorized raw_specs over width, aspect_ratio, diameter columns
+    '''
+    w, ar, d = width.astype(str), aspect_ratio.astype(str), diameter.astype(str)
+    no_ar = (ar == 'nan') | (aspect_ratio == 0)
+    return (w + '/' + d + 'C').where(no_ar, w + '/' + ar + '/' + d)
+
+def fix_width_column(width):
+    '''
+    Vectorized width fix (remove X section of width)
+    '''
+    return width.astype(str).str.split('X').str[0]
+
+def fix_diameter_column(diameter):
+    '''
+    Vectorized fix_diameter
+    '''
+    split_r = diameter.astype(str).str.split('R')
+    d = split_r.str[1].where(split_r.str.len() > 1, split_r.str[0])
+    return d.str.split('C').str[0]
+
+def combine_specs_columns(width, aspect_ratio, diameter):
+    '''
+    Vectorized combine_specs over fixed width, aspect_ratio, diameter columns
+    '''
+    def fix_ar(a):
+        try:
+            return str(float(a)) if '.' in a else a
+        except ValueError:
+            return None
+    ar = map_unique(aspect_ratio, fix_ar)
+    # rows with unparsable aspect ratio are null
+    return (width.astype(str) + '/' + ar + '/' + diameter.astype(str)).where(ar.notna())
+
+def normalize_gulong_data(df):
+    '''
+    Column-wise specs and name normalization of gulong.ph data
+    
+    Parameters
+    ----------
+    df : dataframe
+        Gulong.ph product info with renamed columns
+    
+    Returns
+    -------
+    df : dataframe
+        with raw_specs, fixed width, aspect_ratio, diameter, name and correct_specs
+    '''
+    df = df.copy()
+    df['raw_specs'] = raw_specs_columns(df['width'], df['aspect_ratio'], df['diameter'])
+    df.loc[df['sale_tag']==0, 'price_gulong'] = df.loc[df['sale_tag']==0, 'srp']
+    df['width'] = fix_width_column(df['width'])
+    # fix_aspect_ratio only depends on string form of the value
+    df['aspect_ratio'] = map_unique(df['aspect_ratio'], fix_aspect_ratio)
+    df['diameter'] = fix_diameter_column(df['diameter'])
+    df['correct_specs'] = combine_specs_columns(df['width'], df['aspect_ratio'], df['diameter'])
+    df['name'] = get_name_matcher().fix_series(df['name'])
+    return df
+
+@scrape_cache.cached('gulong', key=lambda a: 'redash_query_130')
+def get_gulong_data(_history=None):
     '''
     Get gulong.ph data from backend
     
+    Parameters
+    ----------
+    _history : PriceStore, optional
+        If given, result is appended to price history. The default is None.
+    
     Returns
     -------
     df : dataframe
         Gulong.ph product info dataframe
     '''
-    df = pd.read_csv('http://app.redash.licagroup.ph/api/queries/130/results.csv?api_key=JFYeyFN7WwoJbUqf8eyS0388PFE7AiG1JWa6y9Zp')
-    df = df[df.is_model_active==1].rename(columns={'model': 'sku_name',
-                                                   'pattern' : 'name',
-                                                   'make' : 'brand',
-                                                   'section_width':'width', 
-                                                   'rim_size':'diameter', 
-                                                   'price' : 'price_gulong'}).reset_index()
+    # active models only, columns and dtypes of gulong_dtypes
+    with run_metrics.stage('fetch_gulong'):
+        df = gulong_source.read()
+    df = df.rename(columns={'model': 'sku_name',
+                            'pattern' : 'name',
+                            'make' : 'brand',
+                            'section_width':'width', 
+                            'rim_size':'diameter', 
+                            'price' : 'price_gulong'}).reset_index()
     
-    df.loc[:, 'raw_specs'] = df.apply(lambda x: raw_specs(x), axis=1)
-    df.loc[df['sale_tag']==0, 'price_gulong'] = df.loc[df['sale_tag']==0, 'srp']
-    df.loc[:, 'width'] = df.apply(lambda x: str(x['width']).split('X')[0], axis=1)
-    df.loc[:, 'aspect_ratio'] = df.apply(lambda x: fix_aspect_ratio(x['aspect_ratio']), axis=1)    
-    df.loc[:, 'diameter'] = df.apply(lambda x: fix_diameter(x['diameter']), axis=1)
-    df.loc[:, 'correct_specs'] = df.apply(lambda x: combine_specs(x), axis=1)
-    df.loc[:, 'name'] = df.apply(lambda x: fix_names(x['name']), axis=1)
+    with run_metrics.stage('normalize_gulong'):
+        df = normalize_gulong_data(df)
     df = df[df.name !='-']
-    return df[['sku_name', 'raw_specs', 'price_gulong', 'name', 'brand', 'width', 'aspect_ratio', 'diameter', 'vehicle_type', 'correct_specs']]
+    df = df[['sku_name', 'raw_specs', 'price_gulong', 'name', 'brand', 'width', 'aspect_ratio', 'diameter', 'vehicle_type', 'correct_specs']]
+    df = apply_schema(df, 'gulong')
+    if _history is not None:
+        _history.append('gulong', df)
+    return df
 
-@st.experimental_memo(suppress_st_warning=True)
-def gogulong_scraper(_driver, xpath_prod, df_gulong):
+def parse_units(units, parse_func, columns, comp=None, fingerprints=None):
     '''
-    Gogulong price scraper
+    Parses scraped units (spec searches, pages) and combines them in order
+    
+    Units whose scraped records are unchanged since the last run reuse their
+    stored parsed result instead of being parsed and normalized again.
+    
+    Parameters
+    ----------
+    units : dictionary
+        raw scraped dataframe per unit key (url)
+    parse_func : function
+        parse_gogulong or parse_tiremanila
+    columns : list
+        raw scraped columns (used if there are no units)
+    comp: list (optional)
+        optional list of model names to compare with (see fix_names)
+    fingerprints : FingerprintStore, optional
+        store of fingerprints and parsed results per unit
+    
+    Returns
+    -------
+    df : dataframe
+        parsed dataframe of all units
+    df_rejects : dataframe
+        rows which could not be parsed
+    n_changed : int
+        number of units which were parsed
+    '''
+    # normalized names depend on the compared catalog
+    salt = frame_fingerprint(pd.DataFrame({'name': comp if comp is not None else []}, dtype=object))
+    parsed, rejects, n_changed = [], [], 0
+    if not units:
+        units = {'': pd.DataFrame(columns=columns, dtype=object)}
+    for key, df_raw in units.items():
+        fingerprint = frame_fingerprint(df_raw, salt)
+        result = fingerprints.lookup(key, fingerprint) if (fingerprints is not None and key) else None
+        if result is None:
+            result = parse_func(df_raw, comp)
+            if key:
+                n_changed += 1
+            if fingerprints is not None and key:
+                fingerprints.update(key, fingerprint, result)
+        parsed.append(result[0])
+        rejects.append(result[1])
+    if fingerprints is not None:
+        fingerprints.save()
+    return pd.concat(parsed, ignore_index=True), pd.concat(rejects, ignore_index=True), n_changed
+
+def gogulong_specs(df_gulong):
+    '''
+    Sorted unique canonical gulong specs viable for gogulong search (see 
+    search_planner.canonical_spec)
+    '''
+    specs = set(map(canonical_spec, df_gulong.loc[:, 'correct_specs'].dropna().unique())) - {None}
+    # filter out unnecessary specs
+    return [cs for cs in sorted(specs) if float(cs.split('/')[0]) > 27]
+
+def gogulong_search_url(spec):
+    '''
+    Build gogulong.ph search url from corrected specs (width/aspect_ratio/diameter)
+    '''
+    w, ar, d = spec.split('/')
+    return 'https://gogulong.ph/search-results?width='+ w +'&aspectRatio=' + ar + '&rimDiameter=' + d
+
+
+# gogulong specs text parts, alternatives are tried in order at each position
+gogulong_specs_regex = {'width': r'(?:(?P<w1>\d{3})/|(?P<w2>\d{2})[Xx]|(?P<w3>\d{3}) )',
+                        'aspect_ratio': r'(?:/(?P<a1>\d{2})|X(?P<a2>.{4})| (?P<a3>R))',
+                        'diameter': r'(?P<d>R.*\d{2})',
+                        'ply': r'(?P<ply>\d{1,2})PR'}
+
+def split_rejects(df, failed, raw_cols):
+    '''
+    Splits parsed dataframe into parsed rows and rejected rows
+    
+    Parameters
+    ----------
+    df : dataframe
+        parsed dataframe
+    failed : dataframe
+        True where parsing of a field failed (columns are field names)
+    raw_cols : list
+        raw scraped columns kept in rejects
+    
+    Returns
+    -------
+    df : dataframe
+        rows with all required columns
+    df_rejects : dataframe
+        raw columns of rejected rows with list of failed columns in 'error'
+    '''
+    mask = failed.any(axis=1)
+    df_rejects = df.loc[mask, raw_cols].copy()
+    df_rejects['error'] = failed[mask].apply(lambda x: ', '.join(x.index[x]), axis=1) if mask.any() else pd.Series(dtype=object)
+    return df[~mask], df_rejects
+
+def parse_gogulong(df_raw, comp=None):
+    '''
+    Parses scraped gogulong text columns in a single vectorized pass
+    
+    Parameters
+    ----------
+    df_raw : dataframe
+        scraped sku_name, price, specs text
+    comp: list (optional)
+        optional list of model names to compare with (see fix_names)
+    
+    Returns
+    -------
+    df_gogulong : dataframe
+        Dataframe containing parsed info
+    df_rejects : dataframe
+        Rows which could not be parsed
+    '''
+    df = df_raw.copy()
+    specs = df['specs'].astype(str)
+    width = specs.str.extract(gogulong_specs_regex['width'])
+    aspect_ratio = specs.str.extract(gogulong_specs_regex['aspect_ratio'])
+    df['name'] = get_name_matcher(comp).fix_series(df['sku_name'])
+    df['width'] = width['w1'].fillna(width['w2']).fillna(width['w3'])
+    df['aspect_ratio'] = aspect_ratio['a1'].fillna(aspect_ratio['a2']).fillna(aspect_ratio['a3'])
+    df['diameter'] = specs.str.extract(gogulong_specs_regex['diameter'])['d'].str.replace(' ', '', regex=False).str[1:3]
+    df['ply'] = specs.str.extract(gogulong_specs_regex['ply'])['ply'].fillna('0')
+    df['price_gogulong'] = pd.to_numeric(df['price'].astype(str).str.split(' ').str[1].str.replace(',', '', regex=False), errors='coerce').astype(float)
+    df['correct_specs'] = combine_specs_columns(df['width'], df['aspect_ratio'], df['diameter'])
+    failed = df[['width', 'aspect_ratio', 'diameter', 'price_gogulong', 'correct_specs']].isna()
+    df, df_rejects = split_rejects(df, failed, ['sku_name', 'price', 'specs'])
+    return df.drop(columns=['price', 'specs']), df_rejects
+
+def find_items(payload):
+    '''
+    Largest list of json objects in a json payload (the listed products)
+    '''
+    items, stack = [], [payload]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, dict):
+            stack.extend(x.values())
+        elif isinstance(x, list):
+            objects = [i for i in x if isinstance(i, dict)]
+            if len(objects) > len(items):
+                items = objects
+            stack.extend(x)
+    return items
+
+def flatten_item(item, prefix=''):
+    '''
+    Flattens nested json object, nested keys are joined with '_'
+    '''
+    flat = {}
+    for k, v in item.items():
+        if isinstance(v, dict):
+            flat.update(flatten_item(v, prefix + k + '_'))
+        else:
+            flat[prefix + k] = v
+    return flat
+
+def items_to_lists(items, templates):
+    '''
+    Formats product json objects as scraped tire, price and info text
+    
+    Parameters
+    ----------
+    items : list
+        product json objects
+    templates : dictionary
+        str.format templates of tires, price, info text over flattened item 
+        keys (missing keys are blank)
+    
+    Returns
+    -------
+    data_list : list
+        list of lists containing text of products (tire, price, info)
+    '''
+    data_list = [[], [], []]
+    for item in items:
+        flat = defaultdict(str, flatten_item(item))
+        for n, key in enumerate(['tires', 'price', 'info']):
+            data_list[n].append(' '.join(templates[key].format_map(flat).split()))
+    return data_list
+
+def gogulong_products(data_list):
+    '''
+    Set of (sku_name, price_gogulong, correct_specs) of parsed gogulong text
+    '''
+    df, _ = parse_gogulong(pd.DataFrame(dict(zip(['sku_name', 'price', 'specs'], data_list)), dtype=object))
+    return set(zip(df['sku_name'], df['price_gogulong'], df['correct_specs']))
+
+def capture_gogulong_results(driver, spec, xpath_info, num_items, templates=None):
+    '''
+    Takes products of a loaded spec search from the json responses the search 
+    page fetched (read from chrome's performance log) instead of paginating 
+    the rendered results
+    
+    Captured products are used only if they are as many as the product count 
+    and include the rendered products, otherwise rendered results are scraped.
+    
+    Parameters
+    ----------
+    driver : PooledDriver
+        Chrome driver of driver_pool with Network domain enabled before load
+    spec : string
+        corrected specs (width/aspect_ratio/diameter)
+    xpath_info : dictionary
+        Dictionary of tires, price, info html xpaths of gogulong
+    num_items : int
+        rendered number of products
+    templates : dictionary, optional
+        text templates of products (see items_to_lists). The default is 
+        gogulong_capture_templates.
+    
+    Returns
+    -------
+    data_list : list
+        list of lists containing text of products (tire, price, info), None 
+        if captured products do not match the rendered results
+    '''
+    templates = templates or gogulong_capture_templates
+    def captured(d):
+        items = []
+        for url, body in json_responses(d, d.performance_log()):
+            try:
+                found = find_items(json.loads(body))
+            except ValueError:
+                continue
+            items = found if len(found) > len(items) else items
+        return items if len(items) == num_items else None
+    items = page_waits.wait(driver, 'gogulong', 'capture', captured)
+    if items is None:
+        warnings.warn('No search response of specs {} with {} products captured'.format(spec, num_items))
+        return None
+    data_list = items_to_lists(items, templates)
+    # first products rendered by the page are checked against captured text
+    wait_for_tiles(driver, 'gogulong', 'page', xpath_info)
+    rendered, _ = tiles_to_lists(scrape_tiles(driver, xpath_info), [[], [], []])
+    rendered = gogulong_products([[' '.join(t.split()) for t in l] for l in rendered])
+    if not rendered or not rendered <= gogulong_products(data_list):
+        warnings.warn('Captured products of specs {} do not match rendered products, check '
+                      'gogulong_capture_templates against item keys {}'.format(spec, sorted(flatten_item(items[0]))))
+        return None
+    print ('Specs: {} | {} products captured'.format(spec, len(items)))
+    return data_list
+
+def scrape_gogulong_spec(driver, spec, xpath_info, capture=False):
+    '''
+    Scrape all products listed for a single spec search in gogulong.ph
     
     Parameters
     ----------
     driver : selenium
         Chrome driver
+    spec : string
+        corrected specs (width/aspect_ratio/diameter)
+    xpath_info : dictionary
+        Dictionary of tires, price, info html xpaths of gogulong
+    capture : bool, optional
+        True to take products from the captured search json responses (see 
+        capture_gogulong_results) instead of clicking through the result 
+        pages. The default is False.
+    
+    Returns
+    -------
+    data_list : list
+        list of lists containing text of scraped info (tire, price, info)
+    err_message : int
+        number of empty search result messages found (0 if products found)
+    '''
+    tire_list, price_list, info_list = [], [], []
+    empty_xpath = '//div[@class="searchResultEmptyMessage"]'
+    count_xpath = '//div[@class="subtitle-2 font-weight-medium px-1 pb-2 grey--text col-md-7 col-12"]//span'
+    if capture:
+        # response bodies are only kept for requests made while Network is enabled
+        driver.execute_cdp_cmd('Network.enable', {})
+    # open web page
+    driver.get(gogulong_search_url(spec))
+    
+    # wait for either the empty result message or the product count
+    rendered = page_waits.wait(driver, 'gogulong', 'search', 
+                               lambda d: d.find_elements(By.XPATH, empty_xpath + ' | ' + count_xpath))
+    if rendered is None:
+        warnings.warn('Search results of specs {} not rendered'.format(spec))
+        return [tire_list, price_list, info_list], -1
+    
+    # check if error message for page
+    err_message = len(driver.find_elements(By.XPATH, empty_xpath))
+    if err_message != 0:
+        return [tire_list, price_list, info_list], err_message
+    
+    # check number of items
+    num_items = get_num_items(driver, count_xpath)
+    if capture:
+        data_list = capture_gogulong_results(driver, spec, xpath_info, int(num_items))
+        if data_list is not None:
+            return data_list, err_message
+    # page format changes depending on the number of products included
+    if int(num_items) >= 5:
+        # Show all button
+        parent_button_xpath = '//div[@class="subtitle-1 accent--text font-weight-bold pb-2 text-center text-decoration-underline col col-12"]'
+        child_button_xpath = '//span[@class="v-btn__content"]'
+        see_all_button = wait_for_element(driver, 'gogulong', 'see_all', parent_button_xpath + child_button_xpath)
+        signature = driver.execute_script(tiles_signature_js, xpath_info['tires'])
+        if see_all_button is not None:
+            driver.execute_script("arguments[0].click();", see_all_button)
+            signature = wait_for_tiles(driver, 'gogulong', 'see_all_tiles', xpath_info, signature)
+        
+        # iterate on pages
+        num_pages = int(np.ceil(int(num_items)/12))
+        for page in range(num_pages):
+            tire_list, price_list, info_list = scrape_data(driver, [tire_list, price_list, info_list], xpath_info, site='gogulong')
+            # go to next page if available
+            if page < (num_pages-1):
+                page_button = wait_for_element(driver, 'gogulong', 'page_button', 
+                                               '//li//button[@aria-label="Goto Page {}"]'.format(page+2))
+                if page_button is None:
+                    warnings.warn('Page {} of specs {} not found'.format(page+2, spec))
+                    break
+                driver.execute_script("arguments[0].click();", page_button)
+                # wait until tiles of next page replaced current tiles
+                signature = wait_for_tiles(driver, 'gogulong', 'next_page', xpath_info, signature)
+    else:
+        wait_for_tiles(driver, 'gogulong', 'page', xpath_info)
+        tire_list, price_list, info_list = scrape_data(driver, [tire_list, price_list, info_list], xpath_info, site='gogulong')
+    return [tire_list, price_list, info_list], err_message
+
+
+def scrape_gogulong_specs(pool, specs, xpath_info, n_workers=1, capture=False):
+    '''
+    Distributes spec searches over a pool of drivers
+    
+    Each worker thread borrows a free driver for a single spec and returns it
+    when done so faster workers pick up the remaining specs.
+    
+    Parameters
+    ----------
+    pool : DriverPool
+        pool of Chrome drivers
+    specs : list
+        list of corrected specs to search
+    xpath_info : dictionary
+        Dictionary of tires, price, info html xpaths of gogulong
+    n_workers : int, optional
+        number of specs scraped in parallel. The default is 1.
+    capture : bool, optional
+        True to take products from captured search json responses (see 
+        scrape_gogulong_spec). The default is False.
+    
+    Yields
+    ------
+    spec : string
+        searched specs
+    data_list : list
+        list of lists containing text of scraped info (tire, price, info)
+    err_message : int
+        number of empty search result messages found, -1 if scraping failed
+    '''
+    def scrape_spec(spec):
+        try:
+            with pool.driver() as driver:
+                return (spec,) + tuple(scrape_gogulong_spec(driver, spec, xpath_info, capture))
+        except Exception as e:
+            warnings.warn('Error encountered in scraping specs {}: {}'.format(spec, e))
+            return spec, [[], [], []], -1
+    
+    with ThreadPoolExecutor(max_workers=max(n_workers, 1)) as executor:
+        futures = [executor.submit(scrape_spec, spec) for spec in specs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+@scrape_cache.cached('gogulong', key=lambda a: hash_key(gogulong_specs(a['df_gulong']),
+                                                      a['df_gulong'].name.unique().tolist(),
+                                                      a['xpath_prod']['gogulong']))
+def gogulong_scraper(_pool, xpath_prod, df_gulong, n_workers=1, engine='selenium', _fingerprints=None, 
+                     _history=None, _journal=None):
+    '''
+    Gogulong price scraper
+    
+    Parameters
+    ----------
+    _pool : DriverPool
+        Pool of Chrome drivers. If None, driver_pool is used.
     xpath_prod : dictionary
         Dictionary of tires, price, info html xpaths separated by website
     df_gulong: dataframe
         Dataframe of scraped data from gulong
-    save : bool, optional
-        True if save result to csv. The default is True.
+    n_workers : int, optional
+        Number of specs searched in parallel, each with a driver borrowed from
+        _pool (workers wait when all drivers of the pool are busy). 
+        The default is 1.
+    engine : string, optional
+        'selenium' to click through rendered result pages or 'capture' to take 
+        products from the search json responses of the page (rendered pages 
+        are scraped when those do not match). The default is 'selenium'.
+    _fingerprints : FingerprintStore, optional
+        If given, most recently changed specs are scraped first and unchanged
+        spec results are not parsed again. The default is None.
+    _history : PriceStore, optional
+        If given, result is appended to price history. The default is None.
+    _journal : RunJournal, optional
+        If given, each searched spec is journaled and specs already in the 
+        journal are not searched again. The default is None.
 
     Returns
     -------
     df_gogulong : dataframe
         Dataframe containing scraped info
+    specs_err_dict : dictionary
+        Number of empty search result messages per specs
     '''
     
     print ('Starting scraping for GoGulong.ph')
-    tire_list, price_list, info_list = [], [], []
     mybar2 = st.progress(0)
     specs_err_dict = {}
-    # filter out unnecessary specs
-    correct_specs = [cs for cs in np.sort(df_gulong.loc[:, 'correct_specs'].unique()) if float(cs.split('/')[0]) > 27]
+    correct_specs = gogulong_specs(df_gulong)
+    # scrape most volatile specs first
+    search_order = correct_specs
+    if _fingerprints is not None:
+        spec_urls = {gogulong_search_url(cs): cs for cs in correct_specs}
+        search_order = [spec_urls[url] for url in _fingerprints.order(list(spec_urls))]
+    # most valuable specs first (volatile first among equals), skip specs known to be empty
+    search_order, skipped = search_planner.plan(search_order, spec_priority(df_gulong, gogulong_priority))
+    print ('{} specs to search, {} known empty specs skipped'.format(len(search_order), len(skipped)))
+    
+    # specs completed before an interrupted run
+    spec_data = {}
+    if _journal is not None:
+        for spec, entry in _journal.read('gogulong')[1].items():
+            spec_data[spec], specs_err_dict[spec] = entry['data_list'], entry['err']
+    n_done = len(spec_data)
+    search_order = [spec for spec in search_order if spec not in spec_data]
+    
     # iterate over all viable specs
-    for n, spec in enumerate(correct_specs):
-        
-        # obtain specs
-        w, ar, d = spec.split('/')
-        print ('Specs: ', spec)
-        
-        # open web page
-        url_page = 'https://gogulong.ph/search-results?width='+ w +'&aspectRatio=' + ar + '&rimDiameter=' + d
-        driver.get(url_page)
-        
-        # check if error message for page
-        err_message = len(driver.find_elements(By.XPATH, '//div[@class="searchResultEmptyMessage"]'))
+    results = scrape_gogulong_specs(_pool or driver_pool, search_order, xpath_prod['gogulong'], n_workers,
+                                    capture=engine == 'capture')
+    for n, (spec, data_list, err_message) in enumerate(results):
         specs_err_dict[spec] = err_message
-        print ('Error message: {}'.format(err_message))
-       
-        if err_message == 0:
-            driver.implicitly_wait(2)
-            # check number of items
-            num_items = get_num_items(driver, '//div[@class="subtitle-2 font-weight-medium px-1 pb-2 grey--text col-md-7 col-12"]//span')
-            # page format changes depending on the number of products included
-            print ('{} items on this page: '.format(num_items))
-            if int(num_items) >= 5:
-                # Show all button
-                parent_button_xpath = '//div[@class="subtitle-1 accent--text font-weight-bold pb-2 text-center text-decoration-underline col col-12"]'
-                child_button_xpath = '//span[@class="v-btn__content"]'
-                see_all_button = driver.find_element(By.XPATH, parent_button_xpath + child_button_xpath)
-                driver.execute_script("arguments[0].click();", see_all_button)
-    
-                # iterate on pages
-                for page in range(int(np.ceil(int(num_items)/12))):
-                    print("Getting info from Page: {}".format(page+1))
-                    tire_list, price_list, info_list = scrape_data(driver, [tire_list, price_list, info_list], xpath_prod['gogulong'], site='gogulong')
-                    # go to next page if available
-                    if page < (int(np.ceil(int(num_items)/12))-1):
-                            page_button = driver.find_element(By.XPATH, '//li//button[@aria-label="Goto Page {}"]'.format(page+2))
-                            driver.execute_script("arguments[0].click();", page_button)
-    
-            else:
-                tire_list, price_list, info_list = scrape_data(driver, [tire_list, price_list, info_list], xpath_prod['gogulong'], site='gogulong')
-            # update progress bar
-        else:
-            continue
-        mybar2.progress(round((n+1)/df_gulong.loc[:,'correct_specs'].nunique(), 2))
-        print ('Collected total {} tire items'.format(len(tire_list)))
+        spec_data[spec] = data_list
+        if _journal is not None and err_message != -1:
+            _journal.record('gogulong', spec, {'data_list': data_list, 'err': err_message})
+        run_metrics.count('units_total', source='gogulong', 
+                          status='failed' if err_message == -1 else ('empty' if err_message else 'ok'))
+        run_metrics.count('items_scraped_total', len(data_list[0]), source='gogulong')
+        # update progress bar
+        mybar2.progress(round((n+1+n_done)/max(len(search_order)+n_done, 1), 2))
     
     # remove progress bar
     mybar2.empty()
+    print ('Collected total {} tire items'.format(sum(len(d[0]) for d in spec_data.values())))
+    search_planner.update(specs_err_dict)
     
-    # construct dataframe
-    # if error, return basic dataframe
-    try:
-        df_gogulong = pd.DataFrame({'sku_name': tire_list, 'price': price_list, 'specs': info_list})
-        df_gogulong.loc[:, 'name'] = df_gogulong.apply(lambda x: fix_names(x.sku_name, comp = df_gulong.name.unique()), axis=1)
-        df_gogulong.loc[:,'width'] = df_gogulong.loc[:,'specs'].apply(lambda x: re.search("(\d{3}/)|(\d{2}[Xx])|(\d{3} )", x)[0][:-1])
-        df_gogulong.loc[:,'aspect_ratio'] = df_gogulong.loc[:, 'specs'].apply(lambda x: re.search("(/\d{2})|(X.{4})|( R)", x)[0][1:])
-        df_gogulong.loc[:,'diameter'] = df_gogulong.loc[:, 'specs'].apply(lambda x: re.search('R.*\d{2}', x)[0].replace(' ', '')[1:3])
-        df_gogulong.loc[:,'ply'] = df_gogulong.loc[:,'specs'].apply(lambda x: re.search('(\d{1}PR)|(\d{2}PR)', x)[0][:-2] if re.search('(\d{1}PR)|(\d{2}PR)', x) else '0')
-        df_gogulong.loc[:,'price_gogulong'] = df_gogulong.loc[:,'price'].apply(lambda x: float((x.split(' ')[1]).replace(',', '')))
-        df_gogulong.loc[:,'correct_specs'] = df_gogulong.apply(lambda x: combine_specs(x), axis=1)
-        df_gogulong.drop(columns=['price','specs'], inplace=True)
-    except:
-        df_gogulong = pd.DataFrame({'name': tire_list, 'price': price_list, 'specs': info_list})
-        warnings.warn('Error encounted in Gogulong dataframe processing.')
+    # construct dataframe in spec order regardless of completion order
+    # rows which cannot be parsed are kept in df_gogulong.attrs['rejects']
+    units = {gogulong_search_url(spec): pd.DataFrame({'sku_name': spec_data[spec][0], 
+                                                      'price': spec_data[spec][1], 
+                                                      'specs': spec_data[spec][2]}, dtype=object)
+             for spec in correct_specs if spec_data.get(spec) and spec_data[spec][0]}
+    with run_metrics.stage('parse_gogulong'):
+        df_gogulong, df_rejects, n_changed = parse_units(units, parse_gogulong, ['sku_name', 'price', 'specs'],
+                                                         df_gulong.name.unique(), _fingerprints)
+    print ('{} of {} specs with results changed'.format(n_changed, len(units)))
+    df_gogulong = apply_schema(df_gogulong, 'gogulong')
+    if len(df_rejects):
+        warnings.warn('{} Gogulong rows could not be parsed.'.format(len(df_rejects)))
+    df_gogulong.attrs['rejects'] = df_rejects
+    if _history is not None:
+        _history.append('gogulong', df_gogulong)
     return df_gogulong, specs_err_dict
 
-def get_tire_info(row):
+# tiremanila text parts: info badges, specs and tag prefix of sku names
+tiremanila_regex = {'info': r'^(?P<p0>[^\n]*)(?:\n(?P<p1>[^\n]*))?(?:\n(?P<p2>[^\n]*))?$',
+                    'specs': r'^(?P<p0>[^R]*)R(?P<diameter>[^R]*)',
+                    'slash': r'^(?P<width>[^/]*)/(?P<aspect_ratio>[^/]*)',
+                    'x': r'^(?P<width>[^X]*)X(?P<aspect_ratio>[^X]*)',
+                    'tag': r'^[^ ]*\([^ ]*(?: |$)'}
+# brand spellings normalized before splitting brand and model
+brand_dict = {r'BFG\s': 'BFGOODRICH',
+              'DOUBLE COIN' : 'DOUBLECOIN'}
+
+def parse_tiremanila(df_raw, comp=None):
+    '''
+    Parses scraped tiremanila text columns in a single vectorized pass
+    
+    Parameters
+    ----------
+    df_raw : dataframe
+        scraped sku_name, price, info, qty_tiremanila text
+    comp: list (optional)
+        optional list of model names to compare with (see fix_names)
+    
+    Returns
+    -------
+    df_tiremanila : dataframe
+        Dataframe containing parsed info
+    df_rejects : dataframe
+        Rows which could not be parsed
     '''
-    Helper function to extract tire information 
-    terrain, on_stock, year
-    Used by tiremanila_scraper
+    df = df_raw[df_raw.sku_name != ''].copy()
+    # terrain, on_stock, year
+    info = df['info'].astype(str).str.extract(tiremanila_regex['info'])
+    n_info = info.notna().sum(axis=1)
+    in_stock = info.isin(['On Stock', 'Pre-Order'])
+    df['terrain'] = info['p0'].where(n_info > 1)
+    df['on_stock'] = np.select([n_info == 3, n_info == 2, n_info == 1],
+                               [info['p1'], info['p1'].where(in_stock['p1']), info['p0'].where(in_stock['p0'])],
+                               default=np.NaN)
+    df['year'] = np.select([n_info == 3, n_info == 2], 
+                           [info['p2'], info['p1'].where(~in_stock['p1'])], default=np.NaN)
+    df['price_tiremanila'] = pd.to_numeric(df['price'].astype(str).str[1:].str.replace(',', '', regex=False), 
+                                           errors='coerce').astype(float).round(2)
+    # width, aspect_ratio, diameter
+    sku_name = df['sku_name'].astype(str)
+    df['raw_specs'] = sku_name.str.split(' ').str[0]
+    specs = df['raw_specs'].str.extract(tiremanila_regex['specs'])
+    slash = specs['p0'].str.extract(tiremanila_regex['slash'])
+    x = specs['p0'].str.extract(tiremanila_regex['x'])
+    has_slash = specs['p0'].str.contains('/', regex=False, na=False)
+    has_x = specs['p0'].str.contains('X', regex=False, na=False)
+    df['width'] = slash['width'].where(has_slash, x['width'].where(has_x, specs['p0']))
+    df['aspect_ratio'] = slash['aspect_ratio'].where(has_slash, x['aspect_ratio'].where(has_x, specs['p0'].where(specs['p0'].isna(), 'R')))
+    df['diameter'] = specs['diameter']
+    # brand, model
+    model = sku_name.str.upper().str.split(' ', n=1).str[1].str.replace(tiremanila_regex['tag'], '', regex=True)
+    for key in brand_dict.keys():
+        model = model.str.replace(key, brand_dict[key], regex=True)
+    model = model.str.split(' ', n=1)
+    df['brand'] = model.str[0]
+    df['model'] = model.str[1].fillna('').str.strip().where(model.notna())
+    df['name'] = get_name_matcher(comp).fix_series(df['model'])
+    df['correct_specs'] = combine_specs_columns(df['width'], df['aspect_ratio'], df['diameter'])
+    failed = pd.concat([info['p0'].isna().rename('info'),
+                        df[['price_tiremanila', 'width', 'aspect_ratio', 'diameter', 'brand', 'correct_specs']].isna()], axis=1)
+    df, df_rejects = split_rejects(df, failed, ['sku_name', 'price', 'info', 'qty_tiremanila'])
+    return df[['sku_name', 'name', 'model', 'brand', 'price_tiremanila', 'qty_tiremanila', 'year', 'raw_specs', 'correct_specs']], df_rejects
+
+def element_text(element, lines=False):
     '''
+    Helper function to get visible text of lxml element similar to selenium .text
     
-    info = row.split('\n')
-    if len(info) == 3:
-        terrain = info[0]
-        on_stock = info[1]
-        year = info[2]
-    elif len(info) == 2:
-        terrain = info[0]
-        if info[1] in ['On Stock', 'Pre-Order']:            
-            on_stock = info[1]
-            year = float(np.NaN)
-        else:
-            on_stock = float(np.NaN)
-            year = info[1]
-    elif len(info) == 1:
-        terrain = float(np.NaN)
-        year = float(np.NaN)
-        if info[0] in ['On Stock', 'Pre-Order']:
-            on_stock = info[0]
-        else:
-            on_stock = float(np.NaN)
-    return terrain, on_stock, year
+    Parameters
+    ----------
+    element : lxml.html.HtmlElement
+    lines : bool, optional
+        True if each text node is returned on a separate line (badges, tables). 
+        The default is False.
+    
+    Returns
+    -------
+    string
+        text of element
+    '''
+    if lines:
+        return '\n'.join(t.strip() for t in element.itertext() if t.strip())
+    else:
+        return ' '.join(element.text_content().split())
 
 
-def get_specs(raw_specs):
+def parse_tiles(tree, xpath_info):
     '''
-    Helper function to extract dimensions from raw specs of tiremanila products
+    Extracts all product tiles of a parsed page (lxml version of scrape_tiles)
+    
+    Parameters
+    ----------
+    tree : lxml.html.HtmlElement
+        parsed page
+    xpath_info : dictionary
+        Dictionary of tires, price, info (and optional table) html xpaths of website
+    
+    Returns
+    -------
+    records : list
+        list of dictionaries with title, price, info, index, style, qty per tile
+        (price-less tiles are excluded)
     '''
+    def field(lines, key):
+        for i, line in enumerate(lines):
+            if line == key:
+                return lines[i+1] if i+1 < len(lines) else None
+            if line.startswith(key + ' '):
+                return line[len(key):].strip()
+        return None
     
-    diam_slice = raw_specs.split('R')
-    diameter = diam_slice[1]
-    if '/' in diam_slice[0]:
-        temp = diam_slice[0].split('/')
-        return temp[0], temp[1], diameter
-    elif 'X' in diam_slice[0]:
-        temp = diam_slice[0].split('X')
-        return temp[0], temp[1], diameter
-    else:
-        return diam_slice[0], 'R', diameter
+    records = []
+    for price in tree.xpath(xpath_info['price']):
+        # largest ancestor containing only this price
+        tile = price
+        parent = tile.getparent()
+        while parent is not None and len(parent.xpath('.' + xpath_info['price'])) == 1:
+            tile, parent = parent, parent.getparent()
+        titles = tile.xpath('.' + xpath_info['tires'])
+        infos = tile.xpath('.' + xpath_info['info'])
+        record = {'title': element_text(titles[0]) if titles else None,
+                  'price': element_text(price),
+                  'info': element_text(infos[-1], lines=True) if infos else None,
+                  'index': None, 'style': None, 'qty': None}
+        if xpath_info.get('table'):
+            tables = tile.xpath('.' + xpath_info['table'])
+            lines = element_text(tables[0], lines=True).split('\n') if tables else []
+            for key in ['index', 'style', 'qty']:
+                record[key] = field(lines, key.capitalize() + ':')
+        if record['price']:
+            records.append(record)
+    return records
 
-def get_brand_model(sku_name):
+
+def parse_tiremanila_page(html, xpath_info):
     '''
-    Helper function to extract brand and model from tiremanila products
+    Parses a tiremanila listing page with lxml (used by http engine)
     
     Parameters
     ----------
-    sku_name: str
-        sku_name row from dataframe
-        
+    html : string
+        page html source
+    xpath_info : dictionary
+        Dictionary of tires, price, info, table html xpaths of tiremanila
+    
     Returns
     -------
-    brand: string
-        
-    model: string
+    data_list : list
+        list of lists containing text of scraped info (tire, price, info)
+    info_list : list
+        list of list of index, style, qty information
+    pages : list
+        page numbers found in pagination links
     '''
-    sku_minus_specs = sku_name.upper().split(' ')[1:]
-    if '(' in sku_minus_specs[0]:
-        sku_minus_specs = sku_minus_specs[1:]
+    tree = lxml.html.fromstring(html)
+    data_list, info_list = tiles_to_lists(parse_tiles(tree, xpath_info), [[], [], []], [[], [], []])
+    pages = [int(p) for p in (element_text(a) for a in tree.xpath('//a[@tabindex="0"]')) if p.isnumeric()]
+    return data_list, info_list, pages
+
+
+async def fetch_pages(urls, concurrency=8, retries=3, timeout=30, callback=None):
+    '''
+    Fetches html of urls concurrently over a pooled aiohttp session
     
-    brand_dict = {'BFG\s': 'BFGOODRICH',
-                  'DOUBLE COIN' : 'DOUBLECOIN'}
+    Parameters
+    ----------
+    urls : list
+        list of page urls
+    concurrency : int, optional
+        Maximum number of simultaneous requests. The default is 8.
+    retries : int, optional
+        Number of attempts per url. The default is 3.
+    timeout : int, optional
+        Total timeout per request in seconds. The default is 30.
+    callback : function, optional
+        Called with (url, html) as each page completes
     
-    sku_minus_specs = ' '.join(sku_minus_specs)
-    for key in brand_dict.keys():
-        if re.search(key, sku_minus_specs):
-            sku_minus_specs = re.sub(key, brand_dict[key], sku_minus_specs)
-        else:
-            continue
+    Returns
+    -------
+    html_dict : dictionary
+        html text per url (None if all attempts failed)
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    headers = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0 Safari/537.36'}
     
-    sku_minus_specs = sku_minus_specs.split(' ')
-    brand = sku_minus_specs[0]
-    model = ' '.join(sku_minus_specs[1:]).strip()
-    return brand, model
+    async with aiohttp.ClientSession(connector=connector, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def fetch(url):
+            async with semaphore:
+                site = urlparse(url).hostname
+                for attempt in range(retries):
+                    start = time.perf_counter()
+                    try:
+                        async with session.get(url) as response:
+                            response.raise_for_status()
+                            text = await response.text()
+                        run_metrics.observe('fetch_seconds', time.perf_counter() - start, site=site)
+                        return url, text
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        run_metrics.count('fetch_errors_total', site=site)
+                        warnings.warn('Attempt {} failed for {}: {}'.format(attempt+1, url, e))
+                        await asyncio.sleep(2**attempt)
+                return url, None
+        
+        html_dict = {}
+        for task in asyncio.as_completed([fetch(url) for url in urls]):
+            url, html = await task
+            html_dict[url] = html
+            if callback is not None:
+                callback(url, html)
+    return html_dict
+
 
-def scrape_info(driver, info_list):
+def tiremanila_page_frame(data_list, info_list):
+    '''
+    Raw tiremanila dataframe of one page from scraped text lists
+    '''
+    tire_list, price_list, info_list_ = data_list
+    return pd.DataFrame({'sku_name': tire_list, 'price': price_list, 'info': info_list_,
+                         'qty_tiremanila': info_list[2][:len(tire_list)]}, dtype=object)
+
+
+def tiremanila_journal(journal):
+    '''
+    Pages journaled by an interrupted tiremanila run of either engine
+    
+    Returns
+    -------
+    done : dictionary
+        page url -> dictionary of data_list, info_list and last_page (last 
+        page number of the listing, None if unknown)
     '''
-    Appends tire info
+    if journal is None:
+        return {}
+    # entries of older journal formats are scraped again
+    return {url: entry for url, entry in journal.read('tiremanila')[1].items() 
+            if isinstance(entry, dict) and {'data_list', 'info_list', 'last_page'} <= entry.keys()}
+
 
+def process_tiremanila(pages, df_gulong, fingerprints=None, history=None):
+    '''
+    Constructs tiremanila dataframe from raw page dataframes
+    
     Parameters
     ----------
-    driver : selenium driver
-    info_list : list
-        list of list of index, style, qty information
+    pages : dictionary
+        raw page dataframe per page url
+    df_gulong: dataframe
+        Dataframe of scraped data from gulong
+    fingerprints : FingerprintStore, optional
+        store of fingerprints and parsed results per page
+    history : PriceStore, optional
+        If given, result is appended to price history.
+    
+    Returns
+    -------
+    df_tiremanila : dataframe
+        Dataframe containing scraped info
+    '''
+    # rows which cannot be parsed are kept in df_tiremanila.attrs['rejects']
+    with run_metrics.stage('parse_tiremanila'):
+        df_tiremanila, df_rejects, n_changed = parse_units(pages, parse_tiremanila, 
+                                                           ['sku_name', 'price', 'info', 'qty_tiremanila'],
+                                                           df_gulong.name.unique(), fingerprints)
+    print ('{} of {} pages changed'.format(n_changed, len(pages)))
+    df_tiremanila = apply_schema(df_tiremanila, 'tiremanila')
+    if len(df_rejects):
+        warnings.warn('{} Tiremanila rows could not be parsed.'.format(len(df_rejects)))
+    df_tiremanila.attrs['rejects'] = df_rejects
+    if history is not None:
+        history.append('tiremanila', df_tiremanila)
+    return df_tiremanila
+
 
+def scrape_tiremanila_http(xpath_info, base_url='https://tiremanila.com', concurrency=8, fingerprints=None,
+                           journal=None):
+    '''
+    Scrapes all tiremanila listing pages without a browser
+    
+    Page 1 is fetched first to find the last page, the rest are fetched concurrently.
+    
+    Parameters
+    ----------
+    xpath_info : dictionary
+        Dictionary of tires, price, info html xpaths of tiremanila
+    base_url : string, optional
+        Tiremanila site url. The default is 'https://tiremanila.com'.
+    concurrency : int, optional
+        Maximum number of simultaneous requests. The default is 8.
+    fingerprints : FingerprintStore, optional
+        If given, most recently changed pages are requested first.
+    journal : RunJournal, optional
+        If given, each parsed page is journaled and pages already in the 
+        journal are not fetched again. The default is None.
+    
     Returns
     -------
-    info_list : list
-        list of list of index, style, qty information
+    pages : dictionary
+        raw page dataframe per page url in page order
     '''
-    # index_list, style_list, qty_list = info_list
-    info = driver.find_elements(By.XPATH, '//div[@class="sv-tile__table sv-no-border"]')
-    for j in info:
-        split_info = j.text.split('\n')
-        for index, i in enumerate(['Index:', 'Style:', 'Qty:']):
-            if i in split_info:
-                info_list[index].append(split_info[split_info.index(i)+1])
-            else:
-                info_list[index].append(str(np.NaN))
-    return info_list
-        
+    page_url = base_url.rstrip('/') + '/?page={}'
+    # pages completed before an interrupted run
+    parsed = {int(url.split('=')[-1]): entry for url, entry in tiremanila_journal(journal).items()}
+    def page_done(url, html):
+        page = int(url.split('=')[-1])
+        if html is not None:
+            with run_metrics.timer('extraction_seconds', site='tiremanila'):
+                data_list, info_list, pages = parse_tiremanila_page(html, xpath_info)
+            parsed[page] = {'data_list': data_list, 'info_list': info_list, 
+                            'last_page': max(pages) if pages else None}
+            if journal is not None:
+                journal.record('tiremanila', url, parsed[page])
+            run_metrics.count('units_total', source='tiremanila', status='ok')
+            run_metrics.count('items_scraped_total', len(data_list[0]), source='tiremanila')
+        else:
+            run_metrics.count('units_total', source='tiremanila', status='failed')
+            warnings.warn('Unable to fetch page {}'.format(page))
+        if page != 1:
+            mybar.progress(round(len(parsed)/last_page, 2))
+    
+    if 1 not in parsed:
+        url = page_url.format(1)
+        page_done(url, asyncio.run(fetch_pages([url], concurrency))[url])
+    last_page = (parsed[1]['last_page'] if 1 in parsed else None) or 102
+    # journaled pages past the last page of the listing are dropped
+    for page in [p for p in parsed if p > last_page]:
+        del parsed[page]
+    
+    mybar = st.progress(0)
+    urls = [page_url.format(p) for p in range(2, last_page+1) if p not in parsed]
+    if fingerprints is not None:
+        urls = fingerprints.order(urls)
+    asyncio.run(fetch_pages(urls, concurrency, callback=page_done))
+    mybar.empty()
+    
+    # combine in page order
+    return {page_url.format(page): tiremanila_page_frame(parsed[page]['data_list'], parsed[page]['info_list'])
+            for page in sorted(parsed)}
+
 
-@st.experimental_memo(suppress_st_warning=True)
-def tiremanila_scraper(_driver, xpath_prod, df_gulong):
+@scrape_cache.cached('tiremanila', key=lambda a: hash_key(a['df_gulong'].name.unique().tolist(),
+                                                          a['xpath_prod']['tiremanila'],
+                                                          a['engine'], a['base_url']))
+def tiremanila_scraper(_driver, xpath_prod, df_gulong, engine='selenium', 
+                       base_url='https://tiremanila.com', concurrency=8, _fingerprints=None,
+                       _history=None, _journal=None):
     '''
     TireManila price scraper
     
     Parameters
     ----------
     driver : selenium
-        Chrome driver
+        Chrome driver (not used by http engine)
     xpath_prod : dictionary
         Dictionary of tires, price, info html xpaths separated by website
+    df_gulong: dataframe
+        Dataframe of scraped data from gulong
+    engine : string, optional
+        'selenium' to browse pages with driver or 'http' to fetch pages 
+        concurrently and parse with lxml. The default is 'selenium'.
+    base_url : string, optional
+        Tiremanila site url. The default is 'https://tiremanila.com'.
+    concurrency : int, optional
+        Maximum number of simultaneous requests of http engine. The default is 8.
+    _fingerprints : FingerprintStore, optional
+        If given, most recently changed pages are scraped first and unchanged
+        pages are not parsed again. The default is None.
+    _history : PriceStore, optional
+        If given, result is appended to price history. The default is None.
+    _journal : RunJournal, optional
+        If given, each scraped page is journaled and pages already in the 
+        journal are not scraped again. The default is None.
 
     Returns
     -------
@@ -576,137 +1553,271 @@ def tiremanila_scraper(_driver, xpath_prod, df_gulong):
     '''
     
     print ('Starting scraping for Tiremanila')
-    url_page = 'https://tiremanila.com/?page=1'
-    driver.get(url_page)
-    driver.implicitly_wait(2)
-    pages = driver.find_elements(By.XPATH, '//a[@tabindex="0"]')
+    if engine == 'http':
+        pages = scrape_tiremanila_http(xpath_prod['tiremanila'], base_url, concurrency, _fingerprints, _journal)
+        return process_tiremanila(pages, df_gulong, _fingerprints, _history)
+    
+    url_page = base_url.rstrip('/') + '/?page=1'
+    _driver.get(url_page)
+    wait_for_element(_driver, 'tiremanila', 'pagination', '//a[@tabindex="0"]')
+    pages = _driver.find_elements(By.XPATH, '//a[@tabindex="0"]')
     
     try: 
         last_page = max([int(page.text) for page in pages if page.text.isnumeric()])
     except:
         last_page = 102
         
-    tire_list, price_list, info_list = list(), list(), list()
-    index_list, style_list, qty_list = list(), list(), list()
+    page_urls = [base_url.rstrip('/') + '/?page=' + str(page+1) for page in range(last_page)]
+    if _fingerprints is not None:
+        page_urls = _fingerprints.order(page_urls)
+    # pages completed before an interrupted run (pages past the last page are dropped)
+    done = {url: entry for url, entry in tiremanila_journal(_journal).items() 
+            if int(url.split('=')[-1]) <= last_page}
+    pages = {url: tiremanila_page_frame(entry['data_list'], entry['info_list']) for url, entry in done.items()}
     mybar = st.progress(0)
-    for page in range(last_page):
-        url_page = 'https://tiremanila.com/?page=' + str(page+1)
-        driver.get(url_page)
-        print("Getting info from Page: {}".format(page+1))
-        tire_list, price_list, info_list = scrape_data(driver, 
-                            [tire_list, price_list, info_list], xpath_prod['tiremanila'], 
-                            site='tiremanila')
-        index_list, style_list, qty_list = scrape_info(driver, [index_list, style_list, qty_list])
-        if len(tire_list) != len(qty_list):
-            warnings.warn('Information list lengths do not match at page {}'.format(page+1))
-        mybar.progress(round((page+1)/last_page, 2))
+    for n, url_page in enumerate([url for url in page_urls if url not in done]):
+        _driver.get(url_page)
+        wait_for_tiles(_driver, 'tiremanila', 'page', xpath_prod['tiremanila'])
+        # tire, price, info and index, style, qty from a single extraction
+        with run_metrics.timer('extraction_seconds', site='tiremanila'):
+            records = scrape_tiles(_driver, xpath_prod['tiremanila'])
+        data_list, info_list = tiles_to_lists(records, [[], [], []], [[], [], []])
+        if _journal is not None:
+            _journal.record('tiremanila', url_page, {'data_list': data_list, 'info_list': info_list,
+                                                     'last_page': last_page})
+        run_metrics.count('units_total', source='tiremanila', status='ok')
+        run_metrics.count('items_scraped_total', len(records), source='tiremanila')
+        pages[url_page] = tiremanila_page_frame(data_list, info_list)
+        mybar.progress(round((n+1+len(done))/last_page, 2))
     mybar.empty()
     
-    try:
-        df_tiremanila = pd.DataFrame({'sku_name': tire_list, 'price': price_list, 'info': info_list,
-                                      'qty_tiremanila': qty_list[:len(tire_list)]})
-        df_tiremanila = df_tiremanila[df_tiremanila.sku_name != '']
-        df_tiremanila['terrain'], df_tiremanila['on_stock'], df_tiremanila['year'] = zip(*df_tiremanila['info'].map(get_tire_info))
-        df_tiremanila.loc[:, 'price_tiremanila'] = df_tiremanila.apply(lambda x: round(float(''.join(x['price'][1:].split(','))), 2), axis=1)
-        df_tiremanila.loc[:, 'raw_specs'] = df_tiremanila.apply(lambda x: x['sku_name'].split(' ')[0], axis=1)
-        df_tiremanila['width'], df_tiremanila['aspect_ratio'], df_tiremanila['diameter'] = zip(*df_tiremanila.loc[:, 'raw_specs'].map(get_specs))
-        df_tiremanila['brand'], df_tiremanila['model'] = zip(*df_tiremanila.loc[:, 'sku_name'].map(get_brand_model))
-        df_tiremanila.loc[:,'name'] = df_tiremanila.apply(lambda x: fix_names(x['model'], comp = df_gulong.name.unique()), axis=1)
-        df_tiremanila.loc[:, 'correct_specs'] = df_tiremanila.apply(lambda x: combine_specs(x), axis=1)
-        df_tiremanila.drop(labels='info', axis=1, inplace=True)
-        return df_tiremanila[['sku_name', 'name', 'model', 'brand', 'price_tiremanila', 'qty_tiremanila', 'year', 'raw_specs', 'correct_specs']]
+    # combine in page order
+    pages = {url: pages[url] for url in sorted(pages, key=lambda url: int(url.split('=')[-1]))}
+    return process_tiremanila(pages, df_gulong, _fingerprints, _history)
+
     
-    except:
-        df_tiremanila = pd.DataFrame({'sku_name': tire_list, 'price': price_list, 'info': info_list,
-                                      'qty_tiremanila': qty_list[:len(tire_list)]})
-        return df_tiremanila
+# columns taken from each source when merging, shared columns are taken from
+# the first source (in merge order) having the product
+merge_columns = {'gulong': ['sku_name', 'brand', 'price_gulong', 'raw_specs'],
+                 'gogulong': ['price_gogulong'],
+                 'tiremanila': ['sku_name', 'brand', 'price_tiremanila', 'qty_tiremanila', 'year', 'raw_specs']}
+merged_columns = ['sku_name', 'raw_specs', 'price_gulong', 'price_gogulong', 'price_tiremanila', 
+                  'qty_tiremanila', 'year', 'brand', 'name']
+
+def encode_keys(frames, keys=['name', 'correct_specs']):
+    '''
+    Encodes join keys of all frames into shared integer product keys
+    
+    Keys are factorized once over all frames. Duplicated keys within a frame 
+    are told apart by their occurrence count (name_count) so the n-th duplicate 
+    of a product is joined with the n-th duplicate in other frames.
+    
+    Parameters
+    ----------
+    frames : list
+        dataframes with key columns
+    keys : list, optional
+        join key columns. The default is ['name', 'correct_specs'].
+    
+    Returns
+    -------
+    key_ids : list
+        int array of product key per row of each frame
+    df_keys : dataframe
+        key values and name_count of each product key, in order of first 
+        appearance (like an outer merge of the frames)
+    '''
+    lengths = [len(df) for df in frames]
+    frame_id = np.repeat(np.arange(len(frames)), lengths)
+    codes, uniques = [], []
+    for k in keys:
+        columns = [df[k] for df in frames]
+        if all(isinstance(c.dtype, pd.CategoricalDtype) for c in columns):
+            # categorical keys are factorized on their integer codes
+            values = pd.api.types.union_categoricals([c.values for c in columns], ignore_order=True)
+        else:
+            values = pd.concat(columns, ignore_index=True).values
+        # one factorization over all frames
+        c, u = pd.factorize(values, use_na_sentinel=False)
+        codes.append(c)
+        uniques.append(u)
+    df_codes = pd.DataFrame(dict(zip(keys, codes)))
+    name_count = df_codes.groupby([frame_id] + codes).cumcount().values
+    order = [keys[0], 'name_count'] + keys[1:]
+    df_codes['name_count'] = name_count
+    grouped = df_codes.groupby(order, sort=False)
+    key_ids = grouped.ngroup().values
+    df_keys = grouped.size().reset_index()[order]
+    for k, u in zip(keys, uniques):
+        df_keys[k] = pd.Series(u).take(df_keys[k].values).values
+    return np.split(key_ids, np.cumsum(lengths)[:-1]), df_keys
 
+def join_sources(frames, columns=None, base='gulong', keys=['name', 'correct_specs']):
+    '''
+    Joins any number of source frames on product keys in one pass
+    
+    Each frame is placed into the shared key space with a position indexer, 
+    so memory and time grow linearly with the number of sources.
+    
+    Parameters
+    ----------
+    frames : dictionary
+        source name -> dataframe, in merge order (base first)
+    columns : dictionary, optional
+        source name -> columns to take. The default is merge_columns.
+    base : string, optional
+        base source, products not in base are kept only if a competitor 
+        has them. The default is 'gulong'.
+    keys : list, optional
+        join key columns. The default is ['name', 'correct_specs'].
+    
+    Returns
+    -------
+    df_merged : dataframe
+        products of base with a competitor price (in base order), then products 
+        only found in competitors
+    '''
+    columns = columns or merge_columns
+    key_ids, df_keys = encode_keys(list(frames.values()), keys)
+    n_keys = len(df_keys)
+    present, data, taken = {}, {}, {}
+    for (source, df), ids in zip(frames.items(), key_ids):
+        # position of each product key in source frame (-1 if missing)
+        pos = np.full(n_keys, -1)
+        pos[ids] = np.arange(len(df))
+        present[source] = pos >= 0
+        for c in columns.get(source, []):
+            if c not in df.columns:
+                continue
+            values = pd.api.extensions.take(df[c].values, pos, allow_fill=True)
+            if c in data:
+                # shared column, keep value of earlier source having the product
+                values = np.where(taken[c], data[c], values)
+                taken[c] = taken[c] | present[source]
+            else:
+                taken[c] = present[source].copy()
+            data[c] = values
+    df_merged = pd.DataFrame(data)
+    for k in keys:
+        df_merged[k] = df_keys[k].values
     
+    in_base = present.get(base, np.zeros(n_keys, dtype=bool))
+    in_competitor = np.zeros(n_keys, dtype=bool)
+    for source in frames:
+        if source != base and 'price_{}'.format(source) in df_merged.columns:
+            in_competitor |= pd.notna(df_merged['price_{}'.format(source)]).values
+    return pd.concat([df_merged[in_base & in_competitor], df_merged[~in_base & in_competitor]])
 
-@st.experimental_memo
-def get_intersection(df_gulong, df_gogulong, df_tiremanila):
+@scrape_cache.cached('merged', key=lambda a: hash_key(a['df_gulong'], *[df for c in sorted(a['competitors'])
+                                                                         for df in [c, a['competitors'][c]]]))
+def get_intersection(df_gulong, competitors, _fingerprints=None, _history=None):
     '''
+    Merges gulong.ph products with competitor prices
+    
     Parameters
     ----------
     
     df_gulong : dataframe
         Scraped gulong.ph data
-    df_gogulong : dataframe
-        Scraped gogulong.ph data
-    save : bool
-        Save file to csv. The default is True.
-    
-    Returns
-    -------
-    '''
-    
-    # create helper column for duplicated keys
-    df_gulong['name_count'] = df_gulong.groupby(['name', 'correct_specs']).cumcount()
-    df_gogulong['name_count'] = df_gogulong.groupby(['name', 'correct_specs']).cumcount()
-    df_tiremanila['name_count'] = df_tiremanila.groupby(['name', 'correct_specs']).cumcount()
-    # select columns to show
-    gulong_cols = ['sku_name', 'name', 'name_count', 'brand', 'price_gulong', 'raw_specs', 'correct_specs']
-    gogulong_cols = ['name', 'name_count', 'price_gogulong', 'correct_specs']
-    tiremanila_cols = ['sku_name', 'name', 'name_count', 'brand', 'price_tiremanila', 'qty_tiremanila', 'year', 'raw_specs', 'correct_specs']
-    # merge
-    dfs = [df_gulong[gulong_cols], df_gogulong[gogulong_cols], df_tiremanila[tiremanila_cols]]
-    df_merged = reduce(lambda left,right: pd.merge(left, right, how='outer', on=['name', 'name_count', 'correct_specs']), dfs)
-    # base products on gulong.ph
-    df_merged_ = df_merged[(pd.notna(df_merged['price_gogulong']) | pd.notna(df_merged['price_tiremanila'])) & pd.notna(df_merged['sku_name_x'])]
-    df_merged_ = df_merged_[['sku_name_x', 'raw_specs_x', 'price_gulong', 
-                             'price_gogulong', 'price_tiremanila', 'qty_tiremanila', 'year', 'brand_x', 'name']]
-    df_merged_ = df_merged_.rename(columns={'sku_name_x':'sku_name',
-                                            'brand_x': 'brand',
-                                            'raw_specs_x': 'raw_specs'})
-    # products in tiremanila not in gulong
-    df_tm_only = df_merged[pd.isna(df_merged['price_gulong']) & pd.notna(df_merged['price_tiremanila'])]
-    df_tm_only_ = df_tm_only[['sku_name_y', 'raw_specs_y', 'price_gulong', 'price_gogulong', 'price_tiremanila',
-                              'qty_tiremanila', 'year', 'brand_y', 'name']]
-    df_tm_only_ = df_tm_only_.rename(columns={'sku_name_y':'sku_name',
-                                              'brand_y': 'brand',
-                                              'raw_specs_y':'raw_specs'})
-    # products in gogulong not in gulong
-    df_gg_only = df_merged[pd.isna(df_merged['price_gulong']) & pd.notna(df_merged['price_gogulong'])]
-    df_gg_only_ = df_gg_only[['sku_name_y', 'raw_specs_y', 'price_gulong', 'price_gogulong', 'price_tiremanila',
-                              'qty_tiremanila', 'year', 'brand_y', 'name']]
-    df_gg_only_ = df_gg_only_.rename(columns={'sku_name_y':'sku_name',
-                                              'brand_y': 'brand',
-                                              'raw_specs_y':'raw_specs'})
-    
-    # combine two datasets
-    df_ = pd.concat([df_merged_, df_tm_only_, df_gg_only_], axis=0)
+    competitors : dictionary
+        competitor name (e.g. 'gogulong', 'tiremanila') -> scraped dataframe, 
+        in merge order
+    _fingerprints : FingerprintStore, optional
+        If given, merged result is reused when all inputs are unchanged.
+    _history : PriceStore, optional
+        If given, result is appended to price history as 'merged'.
+    
+    Returns
+    -------
+    df_ : dataframe
+        merged_columns of gulong products with competitor prices and products
+        only found in competitors
+    '''
+    
+    frames = dict(gulong=df_gulong, **competitors)
+    if _fingerprints is not None:
+        fingerprint = '|'.join(frame_fingerprint(df, salt=source) for source, df in frames.items())
+        df_ = _fingerprints.lookup('intersection', fingerprint)
+        if df_ is not None:
+            print ('Inputs unchanged, using last merged data')
+            if _history is not None:
+                _history.append('merged', df_)
+            return df_
+    
+    df_merged = join_sources(frames, base='gulong')
+    df_ = apply_schema(df_merged[[c for c in merged_columns if c in df_merged.columns]], 'merged')
+    if _fingerprints is not None:
+        _fingerprints.update('intersection', fingerprint, df_)
+        _fingerprints.save()
+    if _history is not None:
+        _history.append('merged', df_)
     return df_
 
 
-def show_table(df):
-    # table settings
-
-    gb = GridOptionsBuilder.from_dataframe(df.sort_values(by='sku_name'))
-    gb.configure_default_column(min_column_width=4)
+def show_table(df, key='table', pager=None, page_size=100):
+    '''
+    Shows one sorted and filtered page of a table
+    
+    Sorting, filtering and paging are done server-side by a TablePager, only
+    the rows of the current page are sent to the grid.
+    
+    Parameters
+    ----------
+    df : dataframe
+        table to show
+    key : string, optional
+        unique key of the table widgets. The default is 'table'.
+    pager : TablePager, optional
+        pager of df shared between reruns (see table_pager). The default
+        creates one.
+    page_size : int, optional
+        rows per page. The default is 100.
+    '''
+    pager = pager or TablePager(df)
+    columns = list(pager.df.columns)
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    query = col1.text_input('Filter', key=key + '-filter')
+    sort = col2.selectbox('Sort by', columns, key=key + '-sort',
+                          index=columns.index('sku_name') if 'sku_name' in columns else 0)
+    ascending = col3.selectbox('Order', ['Ascending', 'Descending'], key=key + '-order') == 'Ascending'
+    page = col4.number_input('Page', min_value=1, value=1, step=1, key=key + '-page')
+    df_page, n_rows, n_pages = pager.page(page, page_size, sort, ascending, query)
+    
+    # table settings, sorted and filtered server-side
+    gb = GridOptionsBuilder.from_dataframe(df_page)
+    gb.configure_default_column(min_column_width=4, sortable=False)
     gridOptions = gb.build()
     
-    # selection settings
     AgGrid(
-        df.sort_values(by='sku_name'),
+        decategorize(df_page),
         gridOptions=gridOptions,
         data_return_mode='AS_INPUT', 
         update_mode='MODEL_CHANGED',
         autoSizeColumn = 'sku_name',
         fit_columns_on_grid_load=False,
-        enable_enterprise_modules=True,
+        enable_enterprise_modules=False,
         height=400, 
-        reload_data=False)
+        reload_data=True)
+    st.caption('Page {} of {} ({} rows)'.format(min(page, n_pages), n_pages, n_rows))
 
-@st.experimental_memo
-def write_to_gsheet(df):
+def write_to_gsheet(df, snapshot_dir=None):
     '''
     Creates new sheet in designated googlesheet and writes selected data from df
     
+    Only cells changed since the last write to the day's sheet are sent 
+    (see gsheet_writer.SheetWriter).
+    
     Parameters
     ----------
     df: dataframe
         dataframe to write to google sheet
+    snapshot_dir : string, optional
+        directory of last written values. The default is gsheet_dir.
     
+    Returns
+    -------
+    n_cells : int
+        number of cells sent
     '''
     credentials = {
       "type": "service_account",
@@ -726,27 +1837,62 @@ def write_to_gsheet(df):
     sh = gc.open_by_key(gsheet_key)
     
     new_sheet_name = datetime.strftime(phtime.localize(datetime.today()),"%B_%d")
-    r,c = df.shape
-    
-    try:
-        sh.add_worksheet(title=new_sheet_name,rows = r+1, cols = c+1)
-        worksheet = sh.worksheet(new_sheet_name)
-    except:
-        worksheet = sh.worksheet(new_sheet_name)
-        worksheet.clear()
-    worksheet.update([df.columns.tolist()]+df.values.tolist())
+    writer = SheetWriter(sh, snapshot_dir or gsheet_dir)
+    return writer.write(new_sheet_name, df)
 
-@st.experimental_memo
-def convert_csv(df):
-    # IMPORTANT: Cache the conversion to prevent recomputation on every rerun.
-    return df.to_csv().encode('utf-8')
+def download_section(history, source, label, run_ts, columns):
+    '''
+    Export options and download of a source, the file is only written when
+    requested (see exports.export_runs)
+    
+    Parameters
+    ----------
+    history : PriceStore
+    source : string
+        'gulong', 'gogulong', 'tiremanila' or 'merged'
+    label : string
+        download label
+    run_ts : datetime
+        shown run, exported unless a date range is selected
+    columns : list
+        columns available for export
+    '''
+    key = 'export-' + source
+    with st.expander(label):
+        fmt = st.radio('Format', list(export_formats), key=key + '-format')
+        selected = st.multiselect('Columns', columns, default=columns, key=key + '-columns')
+        latest_only = st.checkbox('Shown run only', value=True, key=key + '-latest')
+        start = end = None
+        if not latest_only:
+            dates = st.date_input('Run dates', value=(run_ts.date() - timedelta(days=7), run_ts.date()),
+                                  key=key + '-dates')
+            start, end = (dates[0], dates[-1]) if isinstance(dates, (list, tuple)) else (dates, dates)
+        if st.button('Prepare file', key=key + '-prepare'):
+            with st.spinner('Writing {} export'.format(fmt)):
+                st.session_state[key] = export_runs(history, source, fmt, selected or None, start, end,
+                                                    run_ts if latest_only else None, export_dir)
+            if st.session_state[key] is None:
+                st.warning('No rows to export.')
+        path = st.session_state.get(key)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                st.download_button(label, data=f, file_name=os.path.basename(path),
+                                   mime=export_formats[os.path.basename(path).split('.', 1)[1]], key=key + '-download')
 
 def last_update_date():
     return phtime.localize(datetime.today()).strftime('%Y-%m-%d')
 
-def update():
-    st.experimental_memo.clear()
-    st.experimental_rerun()
+def update(history, sources=None):
+    '''
+    Requests a scrape run from the scheduler daemon (see scrape_daemon.py)
+    
+    Parameters
+    ----------
+    history : PriceStore
+    sources : list, optional
+        sources to scrape again regardless of cached results
+    '''
+    history.request_run(sources)
 
 # dictionary of xpath for product info per website
 xpath_prod = {'gogulong': {
@@ -756,87 +1902,271 @@ xpath_prod = {'gogulong': {
               'tiremanila': {
                   'tires': '//h3[@class="sv-tile__title sv-text-reset sv-link-reset"]',
                   'price': '//p[@class="sv-tile__price sv-text-reset"]',
-                  'info': '//div[@class="sv-badge-list"]'}
+                  'info': '//div[@class="sv-badge-list"]',
+                  'table': '//div[@class="sv-tile__table sv-no-border"]'}
               }
 
+# number of headless Chrome drivers used by gogulong_scraper
+gogulong_workers = 4
+# tiremanila_scraper engine ('selenium' or 'http')
+tiremanila_engine = 'http'
+# gogulong_scraper engine ('selenium' or 'capture')
+gogulong_engine = 'selenium'
+# text of captured gogulong products formatted like the rendered tiles, over flattened
+# json keys of a product (nested keys joined with '_')
+gogulong_capture_templates = {'tires': '{brand_name} {name}',
+                              'price': '₱ {price}',
+                              'info': '{width}/{aspectRatio} R{rimDiameter} {loadIndex}{speedRating} {ply}'}
+# past gogulong search results, specs without products are searched again after 7 days
+search_plan_file = 'scraper_data/search_plan.json'
+search_planner = SearchPlanner(search_plan_file, reprobe_days=7)
+# gulong column of product value used to prioritize searches (None counts products)
+gogulong_priority = None
+# warm Chrome drivers shared by scrape runs, restarted after 200 page loads or above 1.5 GB
+# fonts, images and trackers are blocked and transferred bytes are measured
+# (grown by run_pipeline to the gogulong workers and selenium tiremanila driver of a run)
+driver_pool = DriverPool(options, size=gogulong_workers + 1, max_pages=200, max_rss_mb=1500,
+                         blocked_urls=lean_blocked_urls, measure_bytes=True, metrics=run_metrics)
+# directory of change-detection fingerprints of scraped specs and pages
+fingerprints_dir = 'scraper_data/fingerprints'
+# directory of price history of all scrape runs
+history_dir = 'scraper_data/history'
+gsheet_dir = 'scraper_data/gsheet'
+# compressed exports written on request from the app
+export_dir = 'scraper_data/exports'
+# journal of scraped specs and pages, resumed runs skip units journaled within the window
+journal_dir = 'scraper_data/journal'
+journal_window_hours = 12
+
+def run_sources(tasks, on_done=None):
+    '''
+    Runs independent source scrapers concurrently
+    
+    Parameters
+    ----------
+    tasks : dictionary
+        source name -> function without arguments returning the source result
+    on_done : function, optional
+        called with (source, result, duration) as soon as each source finishes
+    
+    Returns
+    -------
+    results : dictionary
+        source name -> result, in tasks order
+    '''
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(len(tasks), 1)) as executor:
+        start = time.time()
+        futures = {executor.submit(func): source for source, func in tasks.items()}
+        for future in as_completed(futures):
+            source = futures[future]
+            results[source] = future.result()
+            if on_done is not None:
+                on_done(source, results[source], round(time.time() - start, 1))
+    return {source: results[source] for source in tasks}
+
+def scrape_tiremanila_source(df_gulong, engine, fingerprints=None, history=None, journal=None):
+    '''
+    Runs tiremanila_scraper with a driver of driver_pool (none for http engine)
+    '''
+    if engine != 'selenium':
+        return tiremanila_scraper(None, xpath_prod, df_gulong, engine=engine,
+                                  _fingerprints=fingerprints, _history=history, _journal=journal)
+    with driver_pool.driver() as driver:
+        return tiremanila_scraper(driver, xpath_prod, df_gulong, engine=engine,
+                                  _fingerprints=fingerprints, _history=history, _journal=journal)
+
+def run_pipeline(history, fingerprints=None, n_workers=None, engine=None, refresh=None, resume=False,
+                 gg_engine=None):
+    '''
+    Runs full scrape of gulong.ph and competitors and stores results
+    
+    Used by the scheduler daemon (see scrape_daemon.py), the streamlit app only
+    reads the latest completed run. Competitor sites are scraped concurrently, 
+    each with its own drivers or http engine, so a run takes about as long as 
+    the slowest site.
+    
+    Parameters
+    ----------
+    history : PriceStore
+        price history store where results of the run are appended
+    fingerprints : FingerprintStore, optional
+        change-detection fingerprints of scraped specs and pages
+    n_workers : int, optional
+        Number of gogulong Chrome drivers, driver_pool is grown to hold them 
+        (and the driver of the selenium tiremanila engine). The default is 
+        gogulong_workers.
+    engine : string, optional
+        tiremanila_scraper engine. The default is tiremanila_engine.
+    refresh : list, optional
+        sources ('gulong', 'gogulong', 'tiremanila') scraped again even if 
+        cached results have not expired. The default is None.
+    resume : bool, optional
+        skip specs and pages journaled by an interrupted run started within
+        journal_window_hours. The default is False.
+    gg_engine : string, optional
+        gogulong_scraper engine. The default is gogulong_engine.
+    
+    Returns
+    -------
+    run_ts : datetime
+        timestamp of completed run
+    '''
+    for source in (refresh or []):
+        scrape_cache.clear(source)
+    n_workers = n_workers or gogulong_workers
+    engine = engine or tiremanila_engine
+    driver_pool.grow(n_workers + (1 if engine == 'selenium' else 0))
+    start = time.time()
+    run_ts = history.start_run(datetime.now(phtime).replace(tzinfo=None))
+    driver_pool.reset_stats()
+    run_metrics.reset()
+    journal = RunJournal(journal_dir, journal_window_hours)
+    for source in ['gogulong', 'tiremanila']:
+        journal.start(source, resume)
+    df_gulong = get_gulong_data(_history=history)
+    
+    # each source is parsed, normalized and stored in history by its scraper
+    tasks = {'gogulong': lambda: gogulong_scraper(driver_pool, xpath_prod, df_gulong, 
+                                                  n_workers=n_workers, engine=gg_engine or gogulong_engine,
+                                                  _fingerprints=fingerprints, _history=history, 
+                                                  _journal=journal),
+             'tiremanila': lambda: scrape_tiremanila_source(df_gulong, engine,
+                                                            fingerprints, history, journal)}
+    durations = {}
+    def source_done(source, result, duration):
+        durations[source] = duration
+        run_metrics.set('stage_seconds', duration, stage='scrape_' + source)
+        n_items = run_metrics.value('items_scraped_total', source=source)
+        run_metrics.set('items_per_second', round(n_items / duration, 2) if duration else 0, source=source)
+        print('{} finished in {} s'.format(source, duration))
+    results = run_sources(tasks, on_done=source_done)
+    print('Browser loaded {pages} pages, {kb_per_page} kB per page'.format(**driver_pool.stats()))
+    page_waits.save()
+    df_gogulong, err_dict = results.pop('gogulong')
+    competitors = dict(gogulong=df_gogulong, **results)
+    
+    with run_metrics.stage('merge'):
+        df_merged = get_intersection(df_gulong, competitors, _fingerprints=fingerprints, _history=history)
+    # write to gsheet
+    with run_metrics.stage('sheet_write'):
+        n_cells = write_to_gsheet(decategorize(df_merged).fillna(''))
+    run_metrics.count('sheet_cells_written_total', n_cells)
+    run_metrics.set('stage_seconds', round(time.time() - start, 1), stage='run')
+    for s in summary_frames(run_metrics.snapshot())['values'].query('metric == "stage_seconds"').itertuples():
+        print('{:<24} {} s'.format(s.labels.split('=')[-1], s.value))
+    
+    history.complete_run({'duration': round(time.time() - start, 1),
+                          'source_durations': durations,
+                          'browser': driver_pool.stats(),
+                          'waits': page_waits.stats(),
+                          'rows': dict({'gulong': len(df_gulong), 'merged': len(df_merged)},
+                                       **{source: len(df) for source, df in competitors.items()}),
+                          'specs_err_dict': err_dict,
+                          'metrics': run_metrics.export(metrics_file, metrics_prom_file)})
+    for source in tasks:
+        journal.finish(source)
+    return run_ts
+
+@st.experimental_memo
+def load_run(path, run_ts):
+    '''
+    Reads all dataframes of a completed run from price history
+    
+    Parameters
+    ----------
+    path : string
+        price history directory
+    run_ts : datetime
+        timestamp of completed run (also the cache key)
+    
+    Returns
+    -------
+    dfs : dictionary
+        dataframe per source
+    '''
+    history = PriceStore(path)
+    df_runs = history.runs()
+    dfs = {}
+    for source in ['gulong', 'gogulong', 'tiremanila', 'merged']:
+        # latest run of source up to run_ts
+        source_runs = df_runs[(df_runs['source'] == source) & (df_runs['run_ts'] <= run_ts)]
+        dfs[source] = history.read_runs(source_runs.tail(1)).drop(columns='run_ts')
+    return dfs
+
+@st.experimental_singleton
+def table_pagers():
+    '''
+    TablePagers of the latest shown run, shared by all sessions
+    '''
+    return {}
+
+def table_pager(path, run_ts, source):
+    '''
+    TablePager of a source table of a completed run, pagers of older runs are dropped
+    '''
+    pagers = table_pagers()
+    if pagers.get('run_ts') != run_ts:
+        pagers.clear()
+        pagers['run_ts'] = run_ts
+    if source not in pagers:
+        pagers[source] = TablePager(load_run(path, run_ts)[source])
+    return pagers[source]
+
 if __name__ == '__main__':
     st.title('Gulong.ph Competitor Product Scraper')
     st.markdown('''
                 This app collects product info from Gulong.ph and other competitor platforms.
                 ''')
     
-    while True:
-        
-        df_gulong = get_gulong_data()
-        show_table(df_gulong)
-        st.write('Found {} Gulong.ph products.'.format(len(df_gulong))) 
-        
-        # download gulong table
-        st.download_button(
-            label ="Download Gulong Data",
-            data = convert_csv(df_gulong),
-            file_name = "gulong_prices.csv",
-            key='download-gulong-csv'
-            )
-        
-        col1, col2 = st.columns(2)
-        driver = Chrome(options=options)
-        # #gogulong scraper
-        df_gogulong, err_dict = gogulong_scraper(driver, xpath_prod, df_gulong)
-        # merge/get intersection of product lists
-        df_tiremanila= tiremanila_scraper(driver, xpath_prod, df_gulong)
-        
-        with col1:
-            st.download_button(
-                label ="Download GoGulong data",
-                data = convert_csv(df_gogulong),
-                file_name = "gogulong_prices.csv",
-                key='download-gogulong-csv'
-                )
-        with col2:
-            st.download_button(
-                label ="Download TireManila data",
-                data = convert_csv(df_tiremanila),
-                file_name = "tiremanila_prices.csv",
-                key='download-tiremanila-csv'
-                )
-        
-        df_merged = get_intersection(df_gulong, df_gogulong, df_tiremanila)
-        #close driver
-        driver.quit()
-        
-        st.markdown('''
-                    This table shows products which are also found in competitor platforms.\n
-                    ''')
-        show_table(df_merged)
-        
-        st.write('Found {} common items.'.format(len(df_merged)))
-        
-        # download csv
-        st.download_button(label ="Download product comparison", 
-                           data = convert_csv(df_merged), 
-                           file_name = "gulong_prices_compare.csv", 
-                           key='download-merged-csv')
-    
-        # write to gsheet
-        write_to_gsheet(df_merged.fillna(''))
-        
-        # refresh every hour
-        time_now = phtime.localize(datetime.now())
-        time_update = st.time_input('Set hour to update',
-                                    value = dt.time(3,0, tzinfo=phtime))
-        
-        st.info(f'''Current hour: {((time_now.hour + 8) % 24)} \n 
-                Update hour: {time_update.hour}''')
-        
-        if ((time_now.hour+8) % 24) == time_update.hour:
-            update()
-        
-        if st.button('Manual update'):
-            update()
-        # update loop every hour
-        time.sleep(3600)
-        
-        
-        
-        
\ No newline at end of file
+    history = PriceStore(history_dir)
+    run_ts = history.latest_run()
+    refresh = st.multiselect('Sources to refresh', ['gulong', 'gogulong', 'tiremanila'], 
+                             default=['gulong', 'tiremanila'])
+    if st.button('Manual update'):
+        update(history, refresh)
+        st.info('Update requested. Results will show here once the scrape run completes.')
+    if run_ts is None:
+        st.warning('No completed scrape run yet. Start the scheduler with: python scrape_daemon.py')
+        st.stop()
+    
+    st.info('Last update: {} (Asia/Manila)'.format(run_ts.strftime('%Y-%m-%d %H:%M')))
+    run_info = history.run_info(run_ts)
+    if run_info.get('metrics'):
+        with st.expander('Run metrics'):
+            frames = summary_frames(run_info['metrics'])
+            values, latencies = frames['values'], frames['latencies']
+            cols = st.columns(len(run_info.get('source_durations', {})) + 1)
+            cols[0].metric('Run duration', '{:.0f} s'.format(run_info.get('duration', 0)))
+            for col, (source, duration) in zip(cols[1:], run_info.get('source_durations', {}).items()):
+                rate = values[(values.metric == 'items_per_second') & (values.labels == 'source=' + source)].value
+                col.metric(source, '{:.0f} s'.format(duration), 
+                           '{} items/s'.format(rate.iloc[0]) if len(rate) else None, delta_color='off')
+            st.write('Stage durations and counts')
+            st.dataframe(values)
+            st.write('Latencies (page loads, fetches, waits, extraction)')
+            st.dataframe(latencies)
+    dfs = load_run(history_dir, run_ts)
+    df_gulong, df_gogulong, df_tiremanila, df_merged = [dfs[s] for s in ['gulong', 'gogulong', 'tiremanila', 'merged']]
+    
+    show_table(df_gulong, 'gulong', table_pager(history_dir, run_ts, 'gulong'))
+    st.write('Found {} Gulong.ph products.'.format(len(df_gulong))) 
+    
+    # download gulong table
+    download_section(history, 'gulong', 'Download Gulong Data', run_ts, list(df_gulong.columns))
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        download_section(history, 'gogulong', 'Download GoGulong data', run_ts, list(df_gogulong.columns))
+    with col2:
+        download_section(history, 'tiremanila', 'Download TireManila data', run_ts, list(df_tiremanila.columns))
+    
+    st.markdown('''
+                This table shows products which are also found in competitor platforms.\n
+                ''')
+    show_table(df_merged, 'merged', table_pager(history_dir, run_ts, 'merged'))
+    
+    st.write('Found {} common items.'.format(len(df_merged)))
+    
+    # download comparison
+    download_section(history, 'merged', 'Download product comparison', run_ts, list(df_merged.columns))
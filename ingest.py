@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Cached, conditional and typed ingestion of remote csv results (Redash)
+
+A parsed local copy of the csv is kept with its validators. Before using it,
+the source is revalidated cheaply: a version probe (e.g. Redash's query
+json, whose latest_query_data_id changes when the query is refreshed) and/or
+a conditional request with If-None-Match / If-Modified-Since. Only when the
+result changed is the csv downloaded to disk and parsed with an explicit
+dtype schema and column selection, in chunks when it is large, keeping only
+rows of interest.
+"""
+
+import os, json, shutil, tempfile, warnings
+import urllib.request, urllib.error
+from datetime import datetime
+
+import pandas as pd
+
+from scrape_cache import hash_key
+
+
+class CachedCSV:
+    '''
+    Local typed copy of a remote csv, downloaded again only when it changed
+
+    Parameters
+    ----------
+    url : string
+        csv url
+    path : string
+        directory of the cached copy (data.parquet, meta.json)
+    dtype : dictionary, optional
+        column -> dtype used when parsing. The default infers dtypes.
+    usecols : list, optional
+        columns read from the csv. The default reads all.
+    row_filter : function, optional
+        function of a parsed dataframe (chunk) returning the rows to keep.
+        The default keeps all rows.
+    probe_url : string, optional
+        json url whose probe_key value identifies the csv version. The
+        default is None (conditional request only).
+    probe_key : string, optional
+        key of the version in the probe json. The default is 'latest_query_data_id'.
+    chunksize : int, optional
+        rows per parsed chunk for csv files over chunk_bytes. The default is 50000.
+    chunk_bytes : int, optional
+        size above which csv is parsed in chunks. The default is 32 MB.
+    timeout : float, optional
+        request timeout in seconds. The default is 60.
+    '''
+
+    def __init__(self, url, path, dtype=None, usecols=None, row_filter=None, probe_url=None,
+                 probe_key='latest_query_data_id', chunksize=50000, chunk_bytes=32*2**20, timeout=60):
+        self.url = url
+        self.path = path
+        self.dtype = dtype
+        self.usecols = usecols
+        self.row_filter = row_filter
+        self.probe_url = probe_url
+        self.probe_key = probe_key
+        self.chunksize = chunksize
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        # cached copy is only valid for the same schema
+        self.schema = hash_key(url, sorted((k, str(v)) for k, v in (dtype or {}).items()), usecols)
+        self.data_file = os.path.join(path, 'data.parquet')
+        self.meta_file = os.path.join(path, 'meta.json')
+
+    def meta(self):
+        '''
+        Validators of cached copy (empty if there is no valid copy)
+        '''
+        try:
+            with open(self.meta_file) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if meta.get('schema') != self.schema or not os.path.exists(self.data_file):
+            return {}
+        return meta
+
+    def probe(self):
+        '''
+        Current version of the source from probe_url, None if unavailable
+        '''
+        if self.probe_url is None:
+            return None
+        try:
+            with urllib.request.urlopen(self.probe_url, timeout=self.timeout) as response:
+                version = json.load(response).get(self.probe_key)
+        except (OSError, ValueError) as e:
+            warnings.warn('Version probe failed: {}'.format(e))
+            return None
+        return None if version is None else str(version)
+
+    def download(self, meta):
+        '''
+        Conditional request of the csv, written to a temporary file
+
+        Returns
+        -------
+        path : string
+            downloaded csv file, None if not modified since cached copy
+        headers : dictionary
+            response validators (etag, last_modified)
+        '''
+        request = urllib.request.Request(self.url)
+        if meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        if meta.get('last_modified'):
+            request.add_header('If-Modified-Since', meta['last_modified'])
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, {}
+            raise
+        with response:
+            fd, path = tempfile.mkstemp(suffix='.csv', dir=self.path)
+            with os.fdopen(fd, 'wb') as f:
+                # streamed to disk, not held in memory
+                shutil.copyfileobj(response, f, 2**20)
+            return path, {'etag': response.headers.get('ETag'),
+                          'last_modified': response.headers.get('Last-Modified')}
+
+    def parse(self, csv_path):
+        '''
+        Parses csv with dtype schema and usecols, in chunks if large
+        '''
+        kwargs = dict(dtype=self.dtype, usecols=self.usecols)
+        keep = self.row_filter or (lambda df: df)
+        if os.path.getsize(csv_path) <= self.chunk_bytes:
+            return keep(pd.read_csv(csv_path, **kwargs)).reset_index(drop=True)
+        with pd.read_csv(csv_path, chunksize=self.chunksize, **kwargs) as reader:
+            return pd.concat([keep(chunk) for chunk in reader], ignore_index=True)
+
+    def read(self):
+        '''
+        Current csv data, revalidated against the source
+
+        Falls back to the cached copy (with a warning) if the source cannot
+        be reached or the downloaded csv cannot be parsed.
+
+        Returns
+        -------
+        df : dataframe
+            parsed and filtered csv data
+        '''
+        os.makedirs(self.path, exist_ok=True)
+        meta = self.meta()
+        version = self.probe()
+        if meta and version is not None and version == meta.get('version'):
+            print('Cached {} is current (version {})'.format(self.url.split('?')[0], version))
+            return pd.read_parquet(self.data_file)
+        try:
+            csv_path, headers = self.download(meta)
+        except (OSError, urllib.error.URLError) as e:
+            if not meta:
+                raise
+            warnings.warn('Using cached copy from {}, download failed: {}'.format(meta['fetched'], e))
+            return pd.read_parquet(self.data_file)
+        if csv_path is None:
+            print('Cached {} not modified'.format(self.url.split('?')[0]))
+            if version is not None:
+                self.save_meta(dict(meta, version=version))
+            return pd.read_parquet(self.data_file)
+        try:
+            df = self.parse(csv_path)
+        except (ValueError, KeyError) as e:
+            if not meta:
+                raise
+            warnings.warn('Using cached copy from {}, csv could not be parsed: {}'.format(meta['fetched'], e))
+            return pd.read_parquet(self.data_file)
+        finally:
+            os.remove(csv_path)
+        df.to_parquet(self.data_file + '.tmp')
+        os.replace(self.data_file + '.tmp', self.data_file)
+        self.save_meta(dict(headers, version=version, schema=self.schema, rows=len(df),
+                            fetched=datetime.now().isoformat()))
+        return df
+
+    def save_meta(self, meta):
+        with open(self.meta_file + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.meta_file + '.tmp', self.meta_file)
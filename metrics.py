@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Structured metrics of scrape runs
+
+Counters, gauges and latency histograms with labels (site, event, source,
+stage) recorded across the pipeline: page load and fetch latencies, page
+waits, tile extraction, scraped items, driver restarts and stage durations.
+A run's metrics are exported as json (stored with the run in price history)
+and as a Prometheus textfile for node_exporter's textfile collector.
+"""
+
+import os, json, time, threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+# upper bounds (seconds) of latency histogram buckets
+default_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def format_labels(labels, extra=None):
+    '''
+    Prometheus label set, e.g. {site="gogulong.ph",le="0.5"}
+    '''
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join('{}="{}"'.format(k, escape(v)) for k, v in items) + '}'
+
+
+class Metrics:
+    '''
+    Thread-safe registry of counters, gauges and histograms of a run
+
+    Parameters
+    ----------
+    prefix : string, optional
+        prefix of exported metric names. The default is 'scraper_'.
+    buckets : list, optional
+        histogram bucket upper bounds. The default is default_buckets.
+    '''
+
+    def __init__(self, prefix='scraper_', buckets=None):
+        self.prefix = prefix
+        self.buckets = buckets or default_buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''
+        Clears all recorded metrics (start of a run)
+        '''
+        with self.lock:
+            self.counters, self.gauges, self.samples = {}, {}, {}
+
+    def count(self, name, value=1, **labels):
+        '''
+        Adds value to a counter
+        '''
+        with self.lock:
+            key = (name, label_key(labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        '''
+        Sets a gauge
+        '''
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def add(self, name, value, **labels):
+        '''
+        Adds value to a gauge
+        '''
+        with self.lock:
+            key = (name, label_key(labels))
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        '''
+        Records a latency in a histogram
+        '''
+        with self.lock:
+            self.samples.setdefault((name, label_key(labels)), []).append(seconds)
+
+    def value(self, name, **labels):
+        '''
+        Current value of a counter or gauge (0 if not recorded)
+        '''
+        key = (name, label_key(labels))
+        with self.lock:
+            return self.counters.get(key, self.gauges.get(key, 0))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        '''
+        Context manager observing the duration of its block in a histogram
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def stage(self, stage):
+        '''
+        Context manager adding the duration of its block to stage_seconds
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add('stage_seconds', round(time.perf_counter() - start, 3), stage=stage)
+
+    def snapshot(self):
+        '''
+        All metrics as a json serializable dictionary
+
+        Returns
+        -------
+        dictionary
+            'counters' and 'gauges': name -> list of labels and value,
+            'histograms': name -> list of labels, count, sum, p50, p95, max
+            and cumulative bucket counts
+        '''
+        with self.lock:
+            counters, gauges = dict(self.counters), dict(self.gauges)
+            samples = {k: list(v) for k, v in self.samples.items()}
+        snapshot = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        for kind, values in [('counters', counters), ('gauges', gauges)]:
+            for (name, labels), value in sorted(values.items()):
+                snapshot[kind].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), values in sorted(samples.items()):
+            values = np.array(values)
+            snapshot['histograms'].setdefault(name, []).append({
+                'labels': dict(labels),
+                'count': len(values),
+                'sum': round(float(values.sum()), 3),
+                'p50': round(float(np.quantile(values, 0.5)), 3),
+                'p95': round(float(np.quantile(values, 0.95)), 3),
+                'max': round(float(values.max()), 3),
+                'buckets': [[b, int((values <= b).sum())] for b in self.buckets]})
+        return snapshot
+
+    def prometheus(self, snapshot=None):
+        '''
+        Metrics in Prometheus text exposition format
+        '''
+        snapshot = snapshot or self.snapshot()
+        lines = []
+        for kind, type_ in [('counters', 'counter'), ('gauges', 'gauge')]:
+            for name, series in snapshot[kind].items():
+                lines.append('# TYPE {}{} {}'.format(self.prefix, name, type_))
+                for s in series:
+                    lines.append('{}{}{} {}'.format(self.prefix, name, format_labels(s['labels']), s['value']))
+        for name, series in snapshot['histograms'].items():
+            lines.append('# TYPE {}{} histogram'.format(self.prefix, name))
+            for s in series:
+                for bound, n in s['buckets'] + [['+Inf', s['count']]]:
+                    lines.append('{}{}_bucket{} {}'.format(self.prefix, name,
+                                                           format_labels(s['labels'], {'le': bound}), n))
+                lines.append('{}{}_sum{} {}'.format(self.prefix, name, format_labels(s['labels']), s['sum']))
+                lines.append('{}{}_count{} {}'.format(self.prefix, name, format_labels(s['labels']), s['count']))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, json_path=None, prom_path=None):
+        '''
+        Writes metrics to a json file and/or Prometheus textfile
+
+        Returns
+        -------
+        snapshot : dictionary
+            exported metrics (see snapshot)
+        '''
+        snapshot = self.snapshot()
+        for path, text in [(json_path, lambda: json.dumps(snapshot, indent=1)),
+                           (prom_path, lambda: self.prometheus(snapshot))]:
+            if path is None:
+                continue
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # textfile collector must not read a partly written file
+            with open(path + '.tmp', 'w') as f:
+                f.write(text())
+            os.replace(path + '.tmp', path)
+        return snapshot
+
+
+def summary_frames(snapshot):
+    '''
+    Tables of a metrics snapshot for display
+
+    Parameters
+    ----------
+    snapshot : dictionary
+        see Metrics.snapshot
+
+    Returns
+    -------
+    frames : dictionary
+        'values' (counters and gauges) and 'latencies' (histograms) dataframes
+    '''
+    def labels(s):
+        return ', '.join('{}={}'.format(k, v) for k, v in s['labels'].items())
+    values = [{'metric': name, 'labels': labels(s), 'value': s['value']}
+              for kind in ['gauges', 'counters'] for name, series in snapshot.get(kind, {}).items()
+              for s in series]
+    latencies = [{'metric': name, 'labels': labels(s), 'count': s['count'], 'total_s': s['sum'],
+                  'p50_s': s['p50'], 'p95_s': s['p95'], 'max_s': s['max']}
+                 for name, series in snapshot.get('histograms', {}).items() for s in series]
+    return {'values': pd.DataFrame(values, columns=['metric', 'labels', 'value']),
+            'latencies': pd.DataFrame(latencies, columns=['metric', 'labels', 'count', 'total_s',
+                                                          'p50_s', 'p95_s', 'max_s'])}
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Local price history of every scrape run
+
+Each run of a source is appended as one parquet file partitioned by source
+and date (hive style), e.g. history/source=gogulong/date=2022-08-03/20220803T110000.parquet,
+so history queries only open the partitions and columns they need.
+
+Completed runs are recorded in history/_runs so readers never see a run
+which is still being scraped.
+"""
+
+import os, json
+from datetime import datetime, date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+run_ts_format = '%Y%m%dT%H%M%S'
+
+
+class PriceStore:
+    '''
+    Partitioned parquet store of scraped dataframes per run and source
+
+    Parameters
+    ----------
+    path : string
+        root directory of the store
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.run_ts = None
+        self.runs_dir = os.path.join(path, '_runs')
+        os.makedirs(self.runs_dir, exist_ok=True)
+
+    def start_run(self, run_ts=None):
+        '''
+        Sets timestamp of current run used by append
+
+        Parameters
+        ----------
+        run_ts : datetime, optional
+            run timestamp. The default is now.
+
+        Returns
+        -------
+        run_ts : datetime
+        '''
+        self.run_ts = (run_ts or datetime.now()).replace(microsecond=0)
+        return self.run_ts
+
+    def complete_run(self, info=None, run_ts=None):
+        '''
+        Marks run as completed
+
+        Parameters
+        ----------
+        info : dictionary, optional
+            run details saved with the marker (e.g. duration, row counts)
+        run_ts : datetime, optional
+            run timestamp. The default is the current run.
+        '''
+        run_ts = run_ts or self.run_ts
+        marker = os.path.join(self.runs_dir, run_ts.strftime(run_ts_format) + '.json')
+        with open(marker + '.tmp', 'w') as f:
+            json.dump(dict(info or {}, run_ts=run_ts.isoformat()), f, default=str)
+        os.replace(marker + '.tmp', marker)
+
+    def completed_runs(self):
+        '''
+        Timestamps of completed runs, oldest first
+        '''
+        return sorted(datetime.strptime(f[:-len('.json')], run_ts_format)
+                      for f in os.listdir(self.runs_dir) if f.endswith('.json'))
+
+    def latest_run(self):
+        '''
+        Timestamp of latest completed run, None if there is none
+        '''
+        runs = self.completed_runs()
+        return runs[-1] if runs else None
+
+    def run_info(self, run_ts):
+        '''
+        Details saved with completed run marker
+        '''
+        with open(os.path.join(self.runs_dir, run_ts.strftime(run_ts_format) + '.json')) as f:
+            return json.load(f)
+
+    def request_run(self, sources=None):
+        '''
+        Requests a scrape run from the scheduler (see scrape_daemon)
+
+        Parameters
+        ----------
+        sources : list, optional
+            sources to scrape again regardless of cached results
+        '''
+        with open(os.path.join(self.runs_dir, 'requested'), 'w') as f:
+            json.dump({'requested': datetime.now().isoformat(), 'sources': list(sources or [])}, f)
+
+    def pop_run_request(self):
+        '''
+        Sources to refresh of requested run (None if no run requested), request is cleared
+        '''
+        path = os.path.join(self.runs_dir, 'requested')
+        try:
+            with open(path) as f:
+                request = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            request = {}
+        os.remove(path)
+        return request.get('sources', [])
+
+    def append(self, source, df, run_ts=None):
+        '''
+        Appends dataframe of a source run to the store
+
+        Parameters
+        ----------
+        source : string
+            'gulong', 'gogulong', 'tiremanila' or 'merged'
+        df : dataframe
+            scraped dataframe
+        run_ts : datetime, optional
+            run timestamp. The default is the current run (see start_run) or now.
+
+        Returns
+        -------
+        file_path : string
+            written parquet file
+        '''
+        run_ts = (run_ts or self.run_ts or datetime.now()).replace(microsecond=0)
+        df = df.reset_index(drop=True).copy()
+        df.attrs = {}
+        # object columns may mix numbers and text, store as text
+        for c in df.columns[df.dtypes == object]:
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+        df['run_ts'] = pd.Timestamp(run_ts)
+        partition = os.path.join(self.path, 'source={}'.format(source),
+                                 'date={}'.format(run_ts.date().isoformat()))
+        os.makedirs(partition, exist_ok=True)
+        file_path = os.path.join(partition, run_ts.strftime(run_ts_format) + '.parquet')
+        tmp_path = file_path + '.tmp'
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, file_path)
+        return file_path
+
+    def runs(self, source=None, start=None, end=None):
+        '''
+        Lists stored runs
+
+        Parameters
+        ----------
+        source : string, optional
+            only runs of this source. The default is all sources.
+        start, end : date or string, optional
+            inclusive date range of runs. The default is all dates.
+
+        Returns
+        -------
+        df_runs : dataframe
+            source, date, run_ts and path of each run, ordered by run_ts
+        '''
+        start = pd.Timestamp(start).date() if start is not None else date.min
+        end = pd.Timestamp(end).date() if end is not None else date.max
+        sources = [source] if source is not None else \
+            [d.split('=', 1)[1] for d in os.listdir(self.path) if d.startswith('source=')]
+        rows = []
+        for s in sources:
+            source_dir = os.path.join(self.path, 'source={}'.format(s))
+            if not os.path.isdir(source_dir):
+                continue
+            for d in os.listdir(source_dir):
+                # partition pruning by directory name
+                run_date = date.fromisoformat(d.split('=', 1)[1])
+                if not (start <= run_date <= end):
+                    continue
+                for f in os.listdir(os.path.join(source_dir, d)):
+                    if f.endswith('.parquet'):
+                        rows.append({'source': s, 'date': run_date,
+                                     'run_ts': datetime.strptime(f[:-len('.parquet')], run_ts_format),
+                                     'path': os.path.join(source_dir, d, f)})
+        df_runs = pd.DataFrame(rows, columns=['source', 'date', 'run_ts', 'path'])
+        return df_runs.sort_values('run_ts').reset_index(drop=True)
+
+    def read_runs(self, df_runs, columns=None, filters=None):
+        '''
+        Reads selected columns and rows of listed runs
+
+        Parameters
+        ----------
+        df_runs : dataframe
+            runs from PriceStore.runs
+        columns : list, optional
+            columns to read (run_ts is always included). The default is all columns.
+        filters : dictionary, optional
+            column -> list of values to keep
+
+        Returns
+        -------
+        dataframe
+        '''
+        tables = []
+        for path in df_runs['path']:
+            schema = pq.read_schema(path)
+            cols = None if columns is None else \
+                [c for c in list(columns) + ['run_ts'] if c in schema.names]
+            row_filters = [(c, 'in', list(v)) for c, v in (filters or {}).items() if c in schema.names]
+            if filters and len(row_filters) < len(filters):
+                # run does not have a filtered column
+                continue
+            tables.append(pq.read_table(path, columns=cols, filters=row_filters or None).to_pandas())
+        if not tables:
+            return pd.DataFrame(columns=list(columns) + ['run_ts'] if columns is not None else ['run_ts'])
+        return pd.concat(tables, ignore_index=True)
+
+    def latest(self, source, columns=None, completed=True):
+        '''
+        Dataframe of latest stored run of source (empty if none)
+
+        Parameters
+        ----------
+        source : string
+            'gulong', 'gogulong', 'tiremanila' or 'merged'
+        columns : list, optional
+            columns to read. The default is all columns.
+        completed : bool, optional
+            only consider completed runs. The default is True.
+        '''
+        df_runs = self.runs(source)
+        if completed:
+            df_runs = df_runs[df_runs['run_ts'].isin(self.completed_runs())]
+        return self.read_runs(df_runs.tail(1), columns)
+
+    def history(self, source, start=None, end=None, sku_name=None, correct_specs=None, columns=None):
+        '''
+        Price history of a source over a date range
+
+        Parameters
+        ----------
+        source : string
+            'gulong', 'gogulong', 'tiremanila' or 'merged'
+        start, end : date or string, optional
+            inclusive date range. The default is all dates.
+        sku_name : list, optional
+            only these SKUs
+        correct_specs : list, optional
+            only these specs
+        columns : list, optional
+            columns to read. The default is all columns.
+
+        Returns
+        -------
+        dataframe
+            rows of all matching runs with run_ts column
+        '''
+        filters = {}
+        if sku_name is not None:
+            filters['sku_name'] = sku_name
+        if correct_specs is not None:
+            filters['correct_specs'] = correct_specs
+        return self.read_runs(self.runs(source, start, end), columns, filters)
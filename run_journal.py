@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only journal of scraped units (spec searches, listing pages)
+
+Every completed unit of a source is appended as one json line as soon as it
+is scraped, so a run which crashed can be resumed by skipping the units
+already in the journal instead of crawling everything again. Journals older
+than the run window are discarded.
+"""
+
+import os, json, threading
+from datetime import datetime, timedelta
+
+
+class RunJournal:
+    '''
+    Journals of completed units per source
+
+    Parameters
+    ----------
+    path : string
+        directory of <source>.jsonl journals
+    window_hours : float, optional
+        journals started longer ago are not resumed. The default is 12.
+    '''
+
+    def __init__(self, path, window_hours=12):
+        self.path = path
+        self.window = timedelta(hours=window_hours)
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def journal_file(self, source):
+        return os.path.join(self.path, '{}.jsonl'.format(source))
+
+    def read(self, source):
+        '''
+        Start time and completed units of a source journal
+
+        Returns
+        -------
+        started : datetime
+            None if there is no journal
+        units : dictionary
+            unit -> journaled data, in completion order
+        '''
+        started, units = None, {}
+        try:
+            with open(self.journal_file(source)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # partly written last line of a crashed run
+                        break
+                    if 'started' in entry:
+                        started = datetime.fromisoformat(entry['started'])
+                    else:
+                        units[entry['unit']] = entry['data']
+        except FileNotFoundError:
+            pass
+        return started, units
+
+    def start(self, source, resume=False, now=None):
+        '''
+        Starts journal of a source run
+
+        Parameters
+        ----------
+        source : string
+            'gogulong' or 'tiremanila'
+        resume : bool, optional
+            keep units of a journal started within the run window, else the
+            journal is started over. The default is False.
+        now : datetime, optional
+            The default is now.
+
+        Returns
+        -------
+        units : dictionary
+            unit -> data of units completed before (empty if not resumed)
+        '''
+        now = now or datetime.now()
+        started, units = self.read(source)
+        if resume and started is not None and now - started <= self.window:
+            print('Resuming {} run started {} with {} completed units'.format(source, started, len(units)))
+            # rewrite valid lines only so a partly written line is not kept
+            self.write(source, started, units)
+            return units
+        self.write(source, now, {})
+        return {}
+
+    def write(self, source, started, units):
+        path = self.journal_file(source)
+        with self.lock:
+            with open(path + '.tmp', 'w') as f:
+                f.write(json.dumps({'started': started.isoformat()}) + '\n')
+                for unit, data in units.items():
+                    f.write(json.dumps({'unit': unit, 'data': data}) + '\n')
+            os.replace(path + '.tmp', path)
+
+    def record(self, source, unit, data):
+        '''
+        Appends a completed unit and its scraped data (json serializable)
+        '''
+        line = json.dumps({'unit': unit, 'data': data}, default=str) + '\n'
+        with self.lock:
+            with open(self.journal_file(source), 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def finish(self, source):
+        '''
+        Removes journal of a completed source run
+        '''
+        try:
+            os.remove(self.journal_file(source))
+        except FileNotFoundError:
+            pass
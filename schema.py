@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Typed schema of scraped dataframes
+
+Brand, name, spec and other low-cardinality text columns are stored as
+categoricals, which are much smaller than python strings and make groupby,
+factorize and merges work on integer codes. Frames are cast right after they
+are parsed, and validated at the same time.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+# column -> dtype per source, columns not listed are kept as they are
+# prices stay float64 so written values are not rounded to float32
+schemas = {'gulong': {'sku_name': object, 'raw_specs': 'category', 'price_gulong': 'float64',
+                      'name': 'category', 'brand': 'category', 'width': 'category',
+                      'aspect_ratio': 'category', 'diameter': 'category',
+                      'vehicle_type': 'category', 'correct_specs': 'category'},
+           'gogulong': {'sku_name': 'category', 'name': 'category', 'width': 'category',
+                        'aspect_ratio': 'category', 'diameter': 'category', 'ply': 'category',
+                        'price_gogulong': 'float64', 'correct_specs': 'category'},
+           'tiremanila': {'sku_name': object, 'name': 'category', 'model': 'category',
+                          'brand': 'category', 'price_tiremanila': 'float64',
+                          'qty_tiremanila': 'category', 'year': 'category',
+                          'raw_specs': 'category', 'correct_specs': 'category'},
+           'merged': {'sku_name': object, 'raw_specs': 'category', 'price_gulong': 'float64',
+                      'price_gogulong': 'float64', 'price_tiremanila': 'float64',
+                      'qty_tiremanila': 'category', 'year': 'category', 'brand': 'category',
+                      'name': 'category'}}
+
+# columns every frame of a source must have
+required_columns = {'gulong': ['sku_name', 'name', 'correct_specs', 'price_gulong'],
+                    'gogulong': ['sku_name', 'name', 'correct_specs', 'price_gogulong'],
+                    'tiremanila': ['sku_name', 'name', 'correct_specs', 'price_tiremanila'],
+                    'merged': ['sku_name', 'name']}
+
+
+def validate(df, source):
+    '''
+    Problems of a source dataframe
+
+    Missing required columns raise ValueError, invalid values are returned.
+
+    Parameters
+    ----------
+    df : dataframe
+    source : string
+        'gulong', 'gogulong', 'tiremanila' or 'merged'
+
+    Returns
+    -------
+    problems : list
+        descriptions of invalid values
+    '''
+    missing = [c for c in required_columns[source] if c not in df.columns]
+    if missing:
+        raise ValueError('{} data is missing columns {}'.format(source, missing))
+    problems = []
+    for c in df.columns:
+        if not c.startswith('price_'):
+            continue
+        price = pd.to_numeric(df[c], errors='coerce')
+        n_bad = int((df[c].notna() & price.isna()).sum() + (price <= 0).sum() + np.isinf(price).sum())
+        if n_bad:
+            problems.append('{} invalid {} values'.format(n_bad, c))
+    if 'correct_specs' in df.columns:
+        specs = df['correct_specs'].dropna().astype(str)
+        n_bad = int((~specs.str.fullmatch(r'[^/]+/[^/]+/[^/]+')).sum())
+        if n_bad:
+            problems.append('{} malformed correct_specs'.format(n_bad))
+    return problems
+
+
+def apply_schema(df, source):
+    '''
+    Validates and casts a source dataframe to its schema
+
+    Invalid values are reported with a warning and kept.
+
+    Parameters
+    ----------
+    df : dataframe
+    source : string
+        'gulong', 'gogulong', 'tiremanila' or 'merged'
+
+    Returns
+    -------
+    df : dataframe
+        copy with schema dtypes (attrs kept)
+    '''
+    for problem in validate(df, source):
+        warnings.warn('{} data: {}'.format(source, problem))
+    dtypes = {}
+    df = df.copy()
+    for c, dtype in schemas[source].items():
+        if c not in df.columns or df[c].dtype == dtype:
+            continue
+        if dtype == 'category' or dtype is object:
+            # categories and text columns hold text only (like price history)
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+        elif dtype == 'float64':
+            df[c] = pd.to_numeric(df[c], errors='coerce')
+        dtypes[c] = dtype
+    return df.astype(dtypes)
+
+
+def decategorize(df):
+    '''
+    Copy of dataframe with categorical columns as plain object columns
+    (e.g. before filling blanks for writers)
+    '''
+    categorical = df.columns[[isinstance(t, pd.CategoricalDtype) for t in df.dtypes]]
+    return df.astype({c: object for c in categorical})
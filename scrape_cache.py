@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of scraper results with per-source TTLs
+
+Results are pickled under <path>/<source>/<key>.<created>.pkl so a source can
+be refreshed (cleared) without touching the others, and warm results survive
+restarts. The least recently used entries are evicted when the cache grows
+over its size limit.
+"""
+
+import os, time, pickle, hashlib, inspect, functools
+
+import pandas as pd
+
+
+def hash_key(*parts):
+    '''
+    Cheap content hash of key parts (strings, lists, dataframes, series)
+
+    Returns
+    -------
+    string
+        sha1 hex digest
+    '''
+    h = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+        elif isinstance(part, (list, tuple)):
+            h.update('\n'.join(map(str, part)).encode('utf-8'))
+        else:
+            h.update(str(part).encode('utf-8'))
+        h.update(b'|')
+    return h.hexdigest()
+
+
+class DiskCache:
+    '''
+    Disk-backed TTL cache of function results per source
+
+    Parameters
+    ----------
+    path : string
+        cache directory
+    ttl : dictionary
+        time to live in seconds per source
+    max_bytes : int, optional
+        size limit of cache directory. The default is 1 GB.
+    '''
+
+    def __init__(self, path, ttl, max_bytes=2**30):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def entries(self, source=None):
+        '''
+        Cache entry files (source, key, created, path)
+        '''
+        sources = [source] if source is not None else \
+            (os.listdir(self.path) if os.path.isdir(self.path) else [])
+        for s in sources:
+            source_dir = os.path.join(self.path, s)
+            if not os.path.isdir(source_dir):
+                continue
+            for f in os.listdir(source_dir):
+                if f.endswith('.pkl'):
+                    key, created, _ = f.rsplit('.', 2)
+                    yield s, key, int(created), os.path.join(source_dir, f)
+
+    def get(self, source, key):
+        '''
+        Cached value of key if not expired
+
+        Returns
+        -------
+        hit : bool
+        value : object
+            None if not hit
+        '''
+        for s, k, created, path in self.entries(source):
+            if k != key:
+                continue
+            try:
+                if time.time() - created > self.ttl.get(source, 0):
+                    os.remove(path)
+                    continue
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                # mark as recently used
+                os.utime(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                continue
+            return True, value
+        return False, None
+
+    def set(self, source, key, value):
+        '''
+        Stores value of key and evicts least recently used entries over size limit
+        '''
+        source_dir = os.path.join(self.path, source)
+        os.makedirs(source_dir, exist_ok=True)
+        for s, k, created, path in list(self.entries(source)):
+            if k == key:
+                os.remove(path)
+        path = os.path.join(source_dir, '{}.{}.pkl'.format(key, int(time.time())))
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(path + '.tmp', path)
+        self.evict()
+
+    def evict(self):
+        '''
+        Removes expired entries, then least recently used entries until under size limit
+        '''
+        files = []
+        for s, k, created, path in list(self.entries()):
+            try:
+                if time.time() - created > self.ttl.get(s, 0):
+                    os.remove(path)
+                else:
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                # removed by a concurrent writer
+                continue
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self, source=None):
+        '''
+        Removes all entries of source (all sources if None)
+        '''
+        for s, k, created, path in list(self.entries(source)):
+            os.remove(path)
+
+    def cached(self, source, key):
+        '''
+        Decorator caching function results of a source
+
+        Parameters
+        ----------
+        source : string
+            cache source (determines TTL and what is cleared together)
+        key : function
+            function of the bound call arguments (dictionary) returning cache key
+
+        Returns
+        -------
+        decorator
+        '''
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                arguments = signature.bind(*args, **kwargs)
+                arguments.apply_defaults()
+                cache_key = key(arguments.arguments)
+                hit, value = self.get(source, cache_key)
+                if hit:
+                    print('Using cached {} results'.format(source))
+                    return value
+                value = func(*args, **kwargs)
+                self.set(source, cache_key, value)
+                return value
+            wrapper.clear = lambda: self.clear(source)
+            return wrapper
+        return decorator
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Headless scheduler of gulong.ph competitor scrape runs
+
+Runs the full scrape pipeline on a cron-like schedule (Asia/Manila time) and
+stores every completed run in the local price history, which the streamlit app
+reads. Runs requested from the app ('Manual update') are picked up on the
+next poll.
+
+Usage:
+    python scrape_daemon.py                      # daily at 03:00
+    python scrape_daemon.py --cron "0 */6 * * *"  # every 6 hours
+    python scrape_daemon.py --once               # single run now
+    python scrape_daemon.py --once --resume      # finish a run which crashed
+"""
+
+import os, sys, time, argparse, traceback
+from datetime import datetime, timedelta
+
+import gulong_price_scraper_lica as scraper
+from price_store import PriceStore
+from fingerprints import FingerprintStore
+
+
+def parse_cron_field(field, low, high):
+    '''
+    Parses one cron field (*, */n, a, a-b, a-b/n and comma lists)
+
+    Returns
+    -------
+    values : set
+        allowed values of field
+    '''
+    values = set()
+    for part in field.split(','):
+        value_range, _, step = part.partition('/')
+        if value_range == '*':
+            start, end = low, high
+        elif '-' in value_range:
+            start, end = map(int, value_range.split('-'))
+        else:
+            start = int(value_range)
+            end = high if step else start
+        if not (low <= start <= high and low <= end <= high):
+            raise ValueError('Cron field {} out of range {}-{}'.format(field, low, high))
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+
+def parse_cron(expr):
+    '''
+    Parses 5-field cron expression (minute hour day month weekday)
+
+    Returns
+    -------
+    fields : list
+        sets of allowed minutes, hours, days, months, weekdays (0 = Sunday)
+    restricted : tuple
+        whether day and weekday fields are restricted (not *)
+    '''
+    parts = expr.split()
+    if len(parts) != 5:
+        raise ValueError('Cron expression must have 5 fields: {}'.format(expr))
+    ranges = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    fields = [parse_cron_field(p, *r) for p, r in zip(parts, ranges)]
+    # 7 is also sunday
+    if 7 in fields[4]:
+        fields[4] = (fields[4] - {7}) | {0}
+    return fields, (parts[2] != '*', parts[4] != '*')
+
+
+def next_run(expr, after):
+    '''
+    Next time after given datetime matching cron expression
+
+    Parameters
+    ----------
+    expr : string
+        cron expression
+    after : datetime
+
+    Returns
+    -------
+    datetime
+    '''
+    (minutes, hours, days, months, weekdays), (day_set, weekday_set) = parse_cron(expr)
+    t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = t + timedelta(days=366*5)
+    while t < limit:
+        day_match = t.day in days
+        weekday_match = (t.weekday() + 1) % 7 in weekdays
+        # standard cron: if both day and weekday are restricted, either may match
+        if day_set and weekday_set:
+            date_match = day_match or weekday_match
+        else:
+            date_match = day_match and weekday_match
+        if t.month not in months or not date_match:
+            t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+        elif t.hour not in hours:
+            t = (t + timedelta(hours=1)).replace(minute=0)
+        elif t.minute not in minutes:
+            t += timedelta(minutes=1)
+        else:
+            return t
+    raise ValueError('Cron expression never matches: {}'.format(expr))
+
+
+def acquire_lock(path):
+    '''
+    Creates lock file so only one scrape run is active, stale locks are replaced
+
+    Returns
+    -------
+    bool
+        True if lock acquired
+    '''
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            with open(path) as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 0)
+            return False
+        except (ValueError, ProcessLookupError, PermissionError, FileNotFoundError):
+            # stale lock of dead process
+            os.remove(path)
+            return acquire_lock(path)
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def run_once(history, fingerprints, args, refresh=None):
+    '''
+    Runs scrape pipeline once while holding the run lock
+
+    Parameters
+    ----------
+    refresh : list, optional
+        sources scraped again regardless of cached results
+
+    Returns
+    -------
+    bool
+        True if run completed
+    '''
+    lock = os.path.join(history.runs_dir, 'lock')
+    if not acquire_lock(lock):
+        print('Another scrape run is active, skipping')
+        return False
+    try:
+        print('Scrape run started at {}'.format(datetime.now(scraper.phtime)))
+        run_ts = scraper.run_pipeline(history, fingerprints, n_workers=args.workers,
+                                      engine=args.engine, refresh=refresh, resume=args.resume,
+                                      gg_engine=args.gogulong_engine)
+        print('Scrape run {} completed'.format(run_ts))
+        return True
+    except Exception:
+        traceback.print_exc()
+        return False
+    finally:
+        os.remove(lock)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scheduler of gulong.ph competitor scrape runs')
+    parser.add_argument('--cron', default='0 3 * * *',
+                        help='cron schedule in Asia/Manila time (default: "0 3 * * *")')
+    parser.add_argument('--once', action='store_true', help='run pipeline once and exit')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip specs and pages already scraped by an interrupted run')
+    parser.add_argument('--refresh', nargs='*', default=[], choices=['gulong', 'gogulong', 'tiremanila'],
+                        help='sources scraped again with --once regardless of cached results')
+    parser.add_argument('--poll', type=int, default=30,
+                        help='seconds between checks for schedule and manual update requests')
+    parser.add_argument('--workers', type=int, default=scraper.gogulong_workers,
+                        help='number of gogulong Chrome drivers')
+    parser.add_argument('--engine', default=scraper.tiremanila_engine, choices=['selenium', 'http'],
+                        help='tiremanila scraper engine')
+    parser.add_argument('--gogulong-engine', default=scraper.gogulong_engine, choices=['selenium', 'capture'],
+                        help='gogulong scraper engine')
+    parser.add_argument('--history-dir', default=scraper.history_dir)
+    parser.add_argument('--fingerprints-dir', default=scraper.fingerprints_dir)
+    args = parser.parse_args(argv)
+
+    history = PriceStore(args.history_dir)
+    fingerprints = FingerprintStore(args.fingerprints_dir)
+    if args.once:
+        return 0 if run_once(history, fingerprints, args, args.refresh) else 1
+
+    def now():
+        return datetime.now(scraper.phtime).replace(tzinfo=None)
+    scheduled = next_run(args.cron, now())
+    print('Next scheduled run at {} (Asia/Manila)'.format(scheduled))
+    while True:
+        requested = history.pop_run_request()
+        if requested is not None or now() >= scheduled:
+            run_once(history, fingerprints, args, requested)
+            if now() >= scheduled:
+                scheduled = next_run(args.cron, now())
+            print('Next scheduled run at {} (Asia/Manila)'.format(scheduled))
+        time.sleep(args.poll)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Query planner of gogulong spec searches
+
+Specs are canonicalized so specs written differently (15 vs 15.0, 10.50 vs
+10.5, missing vs 'R' aspect ratio) become a single search. Searches which
+returned no products in past runs are skipped until they are due for a
+re-probe, and the rest are ordered by business priority so partial runs
+cover the most valuable SKUs first.
+"""
+
+import os, json
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+
+def canonical_number(x):
+    '''
+    Number text without trailing zeros ('15.0' -> '15', '10.50' -> '10.5')
+    '''
+    x = str(x).strip().upper()
+    try:
+        value = float(x)
+    except ValueError:
+        return x
+    return ('%f' % value).rstrip('0').rstrip('.')
+
+
+def canonical_spec(spec):
+    '''
+    Canonical width/aspect_ratio/diameter of a corrected spec
+
+    Missing or zero aspect ratios become 'R' and a leading R of the diameter
+    is dropped.
+
+    Returns
+    -------
+    string
+        canonical spec, None if spec cannot be parsed
+    '''
+    parts = str(spec).split('/')
+    if len(parts) != 3:
+        return None
+    width, ar, diameter = parts
+    ar = ar.strip().upper()
+    ar = 'R' if ar in ['', 'R', 'R1', '0', 'NAN', 'NONE'] else canonical_number(ar)
+    diameter = canonical_number(diameter.strip().upper().lstrip('R'))
+    return '/'.join([canonical_number(width), ar, diameter])
+
+
+def spec_priority(df_gulong, weight=None):
+    '''
+    Business priority of canonical specs from gulong.ph products
+
+    Parameters
+    ----------
+    df_gulong : dataframe
+        gulong.ph products with correct_specs
+    weight : string, optional
+        column of product value (e.g. sales), summed per spec. The default
+        counts products per spec.
+
+    Returns
+    -------
+    priority : series
+        priority per canonical spec
+    '''
+    specs = df_gulong['correct_specs'].map(canonical_spec)
+    values = df_gulong[weight] if weight is not None else pd.Series(1, index=df_gulong.index)
+    return values.groupby(specs).sum()
+
+
+class SearchPlanner:
+    '''
+    Plans spec searches from results of past runs
+
+    Parameters
+    ----------
+    path : string
+        json file of past search results
+    reprobe_days : int, optional
+        days after which a search known to be empty is tried again.
+        The default is 7.
+    '''
+
+    def __init__(self, path, reprobe_days=7):
+        self.path = path
+        self.reprobe_days = reprobe_days
+        try:
+            with open(path) as f:
+                self.searches = json.load(f)
+        except (OSError, ValueError):
+            self.searches = {}
+
+    def known_empty(self, spec, now=None):
+        '''
+        True if spec returned no products last time and is not due for re-probe
+        '''
+        entry = self.searches.get(spec)
+        if entry is None or not entry['empty']:
+            return False
+        now = now or datetime.now()
+        return now - datetime.fromisoformat(entry['probed']) < timedelta(days=self.reprobe_days)
+
+    def plan(self, specs, priority=None, now=None):
+        '''
+        Canonical searches to run, highest priority first
+
+        Parameters
+        ----------
+        specs : list
+            corrected specs
+        priority : series, optional
+            priority per canonical spec (see spec_priority). The default
+            keeps input order.
+        now : datetime, optional
+            The default is now.
+
+        Returns
+        -------
+        searches : list
+            unique canonical specs to search
+        skipped : list
+            canonical specs skipped as known to be empty
+        '''
+        canonical = list(dict.fromkeys(s for s in map(canonical_spec, specs) if s is not None))
+        skipped = [s for s in canonical if self.known_empty(s, now)]
+        searches = [s for s in canonical if s not in set(skipped)]
+        if priority is not None:
+            # stable sort keeps input order among equal priorities
+            searches = sorted(searches, key=lambda s: -priority.get(s, 0))
+        return searches, skipped
+
+    def update(self, specs_err_dict, now=None):
+        '''
+        Records results of searches (number of empty result messages, -1 if
+        scraping failed) and saves them
+        '''
+        now = (now or datetime.now()).isoformat()
+        for spec, err_message in specs_err_dict.items():
+            if err_message == -1:
+                # failed searches are not known to be empty
+                continue
+            entry = self.searches.setdefault(spec, {'n_empty': 0})
+            entry['empty'] = err_message > 0
+            entry['n_empty'] = entry['n_empty'] + 1 if entry['empty'] else 0
+            entry['probed'] = now
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.searches, f)
+        os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Server-side paging of large tables
+
+Only one sorted and filtered page of a table is sent to the browser. Sort
+orders are computed once per column and direction, filter results once per
+query, so moving between pages, sorts and filters does not sort or scan the
+whole table again.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class TablePager:
+    '''
+    Sorted and filtered pages of a dataframe
+
+    Parameters
+    ----------
+    df : dataframe
+        full table (not modified)
+    max_cached : int, optional
+        number of filter results and filtered sort orders kept. The default is 32.
+    '''
+
+    def __init__(self, df, max_cached=32):
+        self.df = df.reset_index(drop=True)
+        self.max_cached = max_cached
+        self.orders = {}
+        self.lowered = {}
+        self.masks = OrderedDict()
+        self.views = OrderedDict()
+        # pagers are shared by sessions of the app
+        self.lock = threading.Lock()
+
+    def order(self, column, ascending=True):
+        '''
+        Row positions sorted by column (stable, missing values last)
+        '''
+        key = (column, ascending)
+        if key not in self.orders:
+            values = pd.Series(self.df[column].values)
+            self.orders[key] = values.sort_values(ascending=ascending, kind='mergesort',
+                                                  na_position='last').index.values
+        return self.orders[key]
+
+    def text(self, column):
+        '''
+        Lowercase text of a column, categories only for categorical columns
+        '''
+        if column not in self.lowered:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                self.lowered[column] = (values.cat.codes.values,
+                                        values.cat.categories.astype(str).str.lower())
+            else:
+                # missing values are empty, not 'nan' or 'none'
+                self.lowered[column] = (None, values.fillna('').astype(str).str.lower())
+        return self.lowered[column]
+
+    def mask(self, query):
+        '''
+        Rows with any text column containing query (case insensitive)
+        '''
+        query = query.strip().lower()
+        if query not in self.masks:
+            mask = np.zeros(len(self.df), dtype=bool)
+            for c in self.df.columns:
+                if self.df[c].dtype != object and not isinstance(self.df[c].dtype, pd.CategoricalDtype):
+                    continue
+                codes, text = self.text(c)
+                found = np.asarray(text.str.contains(query, regex=False), dtype=bool)
+                if codes is None:
+                    mask |= found
+                else:
+                    # matched categories, code -1 (missing) never matches
+                    mask |= np.append(found, False)[codes]
+            self.masks[query] = mask
+            while len(self.masks) > self.max_cached:
+                self.masks.popitem(last=False)
+        return self.masks[query]
+
+    def view(self, sort=None, ascending=True, query=None):
+        '''
+        Row positions of the sorted and filtered table
+        '''
+        key = (sort, ascending, (query or '').strip().lower())
+        with self.lock:
+            if key not in self.views:
+                positions = self.order(sort, ascending) if sort else np.arange(len(self.df))
+                if key[2]:
+                    positions = positions[self.mask(key[2])[positions]]
+                self.views[key] = positions
+                while len(self.views) > self.max_cached:
+                    self.views.popitem(last=False)
+            else:
+                self.views.move_to_end(key)
+            return self.views[key]
+
+    def page(self, page, page_size=100, sort=None, ascending=True, query=None):
+        '''
+        One page of the sorted and filtered table
+
+        Parameters
+        ----------
+        page : int
+            page number, starting at 1 (clipped to the last page)
+        page_size : int, optional
+            rows per page. The default is 100.
+        sort : string, optional
+            column to sort by. The default keeps table order.
+        ascending : bool, optional
+            The default is True.
+        query : string, optional
+            text searched in text columns. The default shows all rows.
+
+        Returns
+        -------
+        df_page : dataframe
+            rows of the page
+        n_rows : int
+            number of rows of the sorted and filtered table
+        n_pages : int
+        '''
+        positions = self.view(sort, ascending, query)
+        n_pages = max(int(np.ceil(len(positions) / page_size)), 1)
+        page = min(max(int(page), 1), n_pages)
+        df_page = self.df.take(positions[(page - 1) * page_size: page * page_size])
+        return df_page, len(positions), n_pages
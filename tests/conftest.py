@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: local http servers standing in for scraped sites and the
+scraper module with run state (page waits, metrics) kept out of scraper_data
+"""
+
+import os, sys, threading, functools, http.server
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+pages_dir = os.path.join(root, 'tests', 'fixtures', 'pages')
+
+
+class PagesHandler(http.server.SimpleHTTPRequestHandler):
+    '''
+    Serves saved pages, tiremanila_<page>.html for /?page=<page>
+    '''
+
+    def translate_path(self, path):
+        if '?page=' in path:
+            path = '/tiremanila_{}.html'.format(path.split('=')[-1])
+        return super().translate_path(path)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    '''
+    Function starting a local server with a request handler class, returns its url
+    '''
+    servers = []
+    def start(handler):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def pages_url(serve):
+    '''
+    Url of a local server of the saved listing pages
+    '''
+    return serve(functools.partial(PagesHandler, directory=pages_dir))
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    '''
+    Scraper module with fresh page waits and metrics
+    '''
+    import gulong_price_scraper_lica as scraper
+    from waits import AdaptiveWaits
+    from metrics import Metrics
+    metrics = Metrics()
+    monkeypatch.setattr(scraper, 'run_metrics', metrics)
+    monkeypatch.setattr(scraper, 'page_waits', AdaptiveWaits(metrics=metrics))
+    return scraper
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+DriverPool borrowing, replacement and waiting with stand-in drivers
+"""
+
+import threading
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from driver_pool import DriverPool
+
+
+class FakeDriver:
+    '''
+    Stand-in for a selenium driver, dead once crashed
+    '''
+
+    def __init__(self):
+        self.dead = False
+
+    def execute_script(self, script):
+        if self.dead:
+            raise WebDriverException('chrome not reachable')
+        return 1
+
+    def quit(self):
+        self.dead = True
+
+
+class Factory:
+    '''
+    Starts fake drivers, the next n_failures starts raise
+    '''
+
+    def __init__(self):
+        self.drivers = []
+        self.n_failures = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            if self.n_failures:
+                self.n_failures -= 1
+                raise WebDriverException('cannot start chrome')
+            self.drivers.append(FakeDriver())
+            return self.drivers[-1]
+
+
+def borrow(pool, results):
+    try:
+        results.append(pool.acquire())
+    except Exception as e:
+        results.append(e)
+
+
+def test_reuses_idle_drivers_up_to_size():
+    factory = Factory()
+    pool = DriverPool(None, size=2, factory=factory)
+    with pool.driver() as first:
+        with pool.driver() as second:
+            assert first.driver is not second.driver
+    # most recently returned driver first
+    with pool.driver() as driver:
+        assert driver is first
+    assert len(factory.drivers) == pool.n_drivers == 2
+
+
+def test_waiter_starts_replacement_after_failed_restart():
+    factory = Factory()
+    pool = DriverPool(None, size=2, factory=factory, wait_timeout=10)
+    held, crashed = pool.acquire(), pool.acquire()
+    results = []
+    waiters = [threading.Thread(target=borrow, args=(pool, results)) for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+    # crashed browser fails health check and cannot be restarted once
+    crashed.driver.dead = True
+    factory.n_failures = 1
+    pool.release(crashed)
+    for waiter in waiters:
+        waiter.join(timeout=5)
+    assert not any(waiter.is_alive() for waiter in waiters)
+    assert isinstance(results[0], WebDriverException)
+    assert results[1].healthy() and results[1] is not held
+    assert pool.n_drivers == 2
+
+
+def test_waiter_uses_grown_pool():
+    pool = DriverPool(None, size=1, factory=Factory(), wait_timeout=10)
+    held = pool.acquire()
+    results = []
+    waiter = threading.Thread(target=borrow, args=(pool, results))
+    waiter.start()
+    pool.grow(2)
+    pool.grow(1)
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
+    assert results[0] is not held and pool.size == pool.n_drivers == 2
+
+
+def test_acquire_times_out():
+    pool = DriverPool(None, size=1, factory=Factory(), wait_timeout=0.2)
+    pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Exports of stored runs with differing column sets
+"""
+
+import gzip
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from exports import export_runs
+from price_store import PriceStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    '''
+    Price history of three merged runs, price_tiremanila added in the
+    second run and qty_tiremanila in the third
+    '''
+    store = PriceStore(str(tmp_path / 'history'))
+    runs = [pd.DataFrame({'sku_name': ['A', 'B'], 'price_gulong': [1.0, 2.0]}),
+            pd.DataFrame({'sku_name': ['A'], 'price_tiremanila': [3.0], 'price_gulong': [1.5]}),
+            pd.DataFrame({'sku_name': ['C'], 'qty_tiremanila': ['4'], 'price_gulong': [5.0],
+                          'price_tiremanila': [6.0]})]
+    for day, df in enumerate(runs):
+        store.start_run(datetime(2022, 8, day + 1, 3))
+        store.append('merged', df)
+        store.complete_run()
+    return store
+
+
+def read(path):
+    if path.endswith('.csv.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return pd.read_csv(f, dtype={'qty_tiremanila': str})
+    return pq.read_table(path).to_pandas()
+
+
+@pytest.mark.parametrize('fmt', ['csv.gz', 'parquet'])
+def test_export_runs_with_added_columns(store, tmp_path, fmt):
+    path = export_runs(store, 'merged', fmt, export_dir=str(tmp_path / 'exports'))
+    df = read(path)
+    # columns of the first run
+    assert list(df.columns) == ['sku_name', 'price_gulong', 'run_ts']
+    assert df['sku_name'].tolist() == ['A', 'B', 'A', 'C']
+    assert df['price_gulong'].tolist() == [1.0, 2.0, 1.5, 5.0]
+
+    columns = ['sku_name', 'price_tiremanila', 'qty_tiremanila']
+    df = read(export_runs(store, 'merged', fmt, columns=columns, export_dir=str(tmp_path / 'exports')))
+    assert list(df.columns) == columns + ['run_ts']
+    # blank in runs without the column (text in parquet as the first run has no values)
+    assert df['price_tiremanila'].isna().tolist() == [True, True, False, False]
+    assert pd.to_numeric(df['price_tiremanila']).tolist()[2:] == [3.0, 6.0]
+    assert df['qty_tiremanila'].isna().tolist() == [True, True, True, False]
+    assert df['qty_tiremanila'].iloc[3] == '4'
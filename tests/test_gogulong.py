@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Gogulong capture engine against recorded search responses replayed locally
+"""
+
+import os, re, json, http.server, urllib.request
+
+import lxml.html
+import pandas as pd
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from driver_pool import DriverPool
+from search_planner import SearchPlanner
+from waits import AdaptiveWaits
+
+recording_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'gogulong')
+with open(os.path.join(recording_dir, 'recording.json')) as f:
+    recording = json.load(f)
+
+
+class ReplayHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Replays recorded gogulong.ph responses by request path and query
+    '''
+
+    def do_GET(self):
+        if self.path not in recording:
+            self.send_error(404)
+            return
+        with open(os.path.join(recording_dir, recording[self.path]['file']), 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', recording[self.path]['content_type'])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayDriver:
+    '''
+    Stand-in for Chrome loading gogulong.ph from the replay server
+
+    Pages are rendered with lxml, fetch calls of page scripts are requested
+    and every response is logged as CDP network events in the performance log.
+    '''
+
+    def __init__(self, scraper, base_url):
+        self.scraper = scraper
+        self.base_url = base_url
+        self.tree = None
+        self.urls = []
+        self.log = []
+        self.bodies = {}
+        self.network = False
+
+    def request(self, url, resource_type):
+        with urllib.request.urlopen(url.replace('https://gogulong.ph', self.base_url)) as response:
+            body, mime_type = response.read().decode(), response.headers.get_content_type()
+        request_id = str(len(self.bodies))
+        # bodies are kept only while Network domain is enabled
+        self.bodies[request_id] = body if self.network else None
+        events = [('Network.responseReceived', {'requestId': request_id, 'type': resource_type,
+                                                'response': {'url': url, 'mimeType': mime_type}}),
+                  ('Network.loadingFinished', {'requestId': request_id, 'encodedDataLength': len(body)})]
+        self.log.extend({'message': json.dumps({'message': {'method': m, 'params': p}})} for m, p in events)
+        return body
+
+    def get(self, url):
+        self.urls.append(url)
+        self.tree = lxml.html.fromstring(self.request(url, 'Document'))
+        for script in self.tree.xpath('//script/text()'):
+            for path in re.findall(r'fetch\("([^"]+)"\)', script):
+                self.request('https://gogulong.ph' + path, 'Fetch')
+
+    def get_log(self, log_type):
+        entries, self.log = self.log, []
+        return entries
+
+    def execute_cdp_cmd(self, cmd, args):
+        if cmd == 'Network.enable':
+            self.network = True
+            return {}
+        if cmd == 'Network.getResponseBody':
+            if self.bodies.get(args['requestId']) is None:
+                raise WebDriverException('No resource with given identifier found')
+            return {'body': self.bodies[args['requestId']], 'base64Encoded': False}
+        raise NotImplementedError(cmd)
+
+    def find_elements(self, by, xpath):
+        return [type('Element', (), {'text': self.scraper.element_text(e)}) for e in self.tree.xpath(xpath)]
+
+    def execute_script(self, script, *args):
+        if script == 'return 1':
+            return 1
+        if script == self.scraper.tiles_signature_js:
+            return '\n'.join(e.text_content().strip() for e in self.tree.xpath(args[0]))
+        if script == self.scraper.extract_tiles_js:
+            return self.scraper.parse_tiles(self.tree, args[0])
+        # result pages are not clicked through
+        raise NotImplementedError(script)
+
+    def quit(self):
+        pass
+
+
+def recorded_products(spec):
+    '''
+    (sku_name, price_gogulong, correct_specs) of all recorded products of a spec
+    '''
+    w, ar, d = spec.split('/')
+    path = [p for p in recording if p.startswith('/api/v2/products/search?width={}&aspectRatio={}&'.format(w, ar))][0]
+    with open(os.path.join(recording_dir, recording[path]['file'])) as f:
+        items = json.load(f)['data']['products']
+    return {(' '.join([i['brand']['name'], i['name']]), float(i['price']), spec) for i in items}
+
+
+@pytest.fixture
+def replay(scraper, serve, tmp_path, monkeypatch):
+    '''
+    Pool of one replaying driver, short waits and a fresh search plan
+    '''
+    monkeypatch.setattr(scraper, 'page_waits', AdaptiveWaits(default=0.5, metrics=scraper.run_metrics))
+    monkeypatch.setattr(scraper, 'search_planner', SearchPlanner(str(tmp_path / 'search_plan.json')))
+    base_url = serve(ReplayHandler)
+    drivers = []
+    def factory():
+        drivers.append(ReplayDriver(scraper, base_url))
+        return drivers[-1]
+    pool = DriverPool(None, size=1, factory=factory)
+    pool.drivers = drivers
+    return pool
+
+
+def test_capture_engine(scraper, replay):
+    df_gulong = pd.DataFrame({'name': ['DUELER H/T 687 RBT', 'PROXES CF2', 'SPORT MAXX 050'],
+                              'correct_specs': ['205/55/16', '195/60/15', '185/65/14']})
+    with pytest.warns(UserWarning, match='195/60/15 with 3 products'):
+        df, err = scraper.gogulong_scraper.__wrapped__(replay, scraper.xpath_prod, df_gulong, engine='capture')
+    assert err == {'205/55/16': 0, '195/60/15': 0, '185/65/14': 1}
+    # one page load per spec, no result pages clicked
+    assert len(replay.drivers[0].urls) == 3
+    products = df.groupby('correct_specs').apply(
+        lambda g: set(zip(g['sku_name'], g['price_gogulong'], g['correct_specs'])))
+    # all 14 products captured although 12 are rendered
+    assert products['205/55/16'] == recorded_products('205/55/16')
+    assert len(products['205/55/16']) == 14 and len(df.attrs['rejects']) == 0
+    # response with 2 of 3 products, rendered results are scraped
+    assert len(products['195/60/15']) == 3
+    assert recorded_products('195/60/15') < products['195/60/15']
+
+
+def test_capture_checks_templates(scraper, replay):
+    spec, xpath_info = '205/55/16', scraper.xpath_prod['gogulong']
+    with replay.driver() as driver:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.get(scraper.gogulong_search_url(spec))
+        data_list = scraper.capture_gogulong_results(driver, spec, xpath_info, 14)
+        assert [len(l) for l in data_list] == [14, 14, 14]
+        assert data_list[2][4] == '205/55 R16 91H 8PR'
+        assert scraper.gogulong_products(data_list) == recorded_products(spec)
+        # captured text with a missing brand does not match the rendered tiles
+        templates = dict(scraper.gogulong_capture_templates, tires='{name}')
+        driver.get(scraper.gogulong_search_url(spec))
+        with pytest.warns(UserWarning, match='do not match rendered products'):
+            assert scraper.capture_gogulong_results(driver, spec, xpath_info, 14, templates) is None
+
+
+def test_capture_needs_network_enabled_before_load(scraper, replay):
+    spec = '205/55/16'
+    with replay.driver() as driver:
+        driver.get(scraper.gogulong_search_url(spec))
+        driver.execute_cdp_cmd('Network.enable', {})
+        with pytest.warns(UserWarning, match='No search response'):
+            assert scraper.capture_gogulong_results(driver, spec, scraper.xpath_prod['gogulong'], 14) is None
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Delta writes of SheetWriter against a local fake gspread client
+"""
+
+import gspread
+import pandas as pd
+import pytest
+from gspread.utils import a1_to_rowcol
+
+import gsheet_writer
+from gsheet_writer import SheetWriter, changed_ranges
+
+
+class Response:
+    '''
+    Error response of the sheets API
+    '''
+
+    def __init__(self, code):
+        self.code = code
+        self.text = 'error {}'.format(code)
+
+    def json(self):
+        return {'error': {'code': self.code, 'message': self.text, 'status': 'ERROR'}}
+
+
+class FakeWorksheet:
+    '''
+    In-memory worksheet, failures are raised by the next batch_update calls
+    '''
+
+    def __init__(self, title, rows, cols):
+        self.title = title
+        self.row_count, self.col_count = rows, cols
+        self.cells = {}
+        self.batches = []
+        self.failures = []
+
+    def resize(self, rows, cols):
+        self.row_count, self.col_count = rows, cols
+
+    def get_all_values(self):
+        if not self.cells:
+            return []
+        n_rows = max(i for i, _ in self.cells)
+        n_cols = max(j for _, j in self.cells)
+        return [[self.cells.get((i, j), '') for j in range(1, n_cols + 1)] for i in range(1, n_rows + 1)]
+
+    def batch_update(self, data):
+        if self.failures:
+            raise gspread.exceptions.APIError(Response(self.failures.pop(0)))
+        self.batches.append(data)
+        for r in data:
+            first, last = [a1_to_rowcol(a) for a in r['range'].split(':')]
+            assert len(r['values']) == last[0] - first[0] + 1
+            for i, row in enumerate(r['values']):
+                assert len(row) == last[1] - first[1] + 1
+                for j, value in enumerate(row):
+                    self.cells[(first[0] + i, first[1] + j)] = value
+
+    def values(self):
+        '''
+        Written values without trailing blank rows and columns
+        '''
+        values = [list(row) for row in self.get_all_values()]
+        while values and not any(values[-1]):
+            values.pop()
+        while values and not any(row[-1] for row in values):
+            values = [row[:-1] for row in values]
+        return values
+
+
+class FakeSpreadsheet:
+    id = 'spreadsheet'
+
+    def __init__(self):
+        self.worksheets = {}
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self.worksheets[title] = FakeWorksheet(title, rows, cols)
+        return self.worksheets[title]
+
+
+def apply(old, ranges):
+    worksheet = FakeWorksheet('sheet', 0, 0)
+    worksheet.cells = {(i + 1, j + 1): v for i, row in enumerate(old) for j, v in enumerate(row)}
+    worksheet.batch_update(ranges)
+    return worksheet.values()
+
+
+def test_changed_ranges_changed_cells():
+    old = [['a', 'b', 'c'], ['1', '2', '3'], ['4', '5', '6']]
+    new = [['a', 'b', 'c'], ['1', 'x', 'y'], ['4', 'z', '6']]
+    ranges = changed_ranges(old, new)
+    assert [r['range'] for r in ranges] == ['B2:C2', 'B3:B3']
+    assert apply(old, ranges) == new
+
+
+def test_changed_ranges_added_and_removed_cells():
+    old = [['a', 'b'], ['1', '2'], ['3', '4'], ['5', '6']]
+    added = [['a', 'b', 'c'], ['1', '2', '0'], ['3', '4', '0'], ['5', '6', '0'], ['7', '8', '0']]
+    ranges = changed_ranges(old, added)
+    assert sum(len(r['values']) * len(r['values'][0]) for r in ranges) == 7
+    assert apply(old, ranges) == added
+    # rows and columns missing from new values are blanked
+    removed = [['a'], ['1']]
+    ranges = changed_ranges(old, removed)
+    assert all(v == '' for r in ranges for row in r['values'] for v in row)
+    assert apply(old, ranges) == removed
+    assert changed_ranges(old, old) == []
+
+
+def test_write_sends_only_changed_cells(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    writer = SheetWriter(spreadsheet, str(tmp_path))
+    df = pd.DataFrame({'sku_name': ['A', 'B', 'C'], 'price': [1.0, 2.0, 3.0]})
+    assert writer.write('prices', df) == 8
+    worksheet = spreadsheet.worksheets['prices']
+    assert worksheet.values() == gsheet_writer.sheet_values(df)
+
+    df.loc[1, 'price'] = 2.5
+    assert writer.write('prices', df) == 1
+    assert worksheet.batches[-1] == [{'range': 'B3:B3', 'values': [[2.5]]}]
+    # without snapshot, the worksheet contents are compared
+    writer = SheetWriter(spreadsheet, str(tmp_path / 'other'))
+    assert writer.write('prices', df.iloc[:2]) == 2
+    assert worksheet.values() == gsheet_writer.sheet_values(df.iloc[:2])
+
+
+def test_write_chunks_batches(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    writer = SheetWriter(spreadsheet, str(tmp_path), max_cells=25)
+    df = pd.DataFrame({'a': range(40), 'b': range(40), 'c': range(40)})
+    assert writer.write('big', df) == 123
+    worksheet = spreadsheet.worksheets['big']
+    assert len(worksheet.batches) > 1
+    for batch in worksheet.batches:
+        assert sum(len(r['values']) * len(r['values'][0]) for r in batch) <= 25
+    assert worksheet.values() == gsheet_writer.sheet_values(df)
+
+
+def test_write_retries_rate_limit_and_server_errors(tmp_path, monkeypatch):
+    delays = []
+    monkeypatch.setattr(gsheet_writer.time, 'sleep', delays.append)
+    spreadsheet = FakeSpreadsheet()
+    writer = SheetWriter(spreadsheet, str(tmp_path), retries=3, backoff=0.5)
+    worksheet = spreadsheet.add_worksheet('prices', 10, 10)
+    worksheet.failures = [429, 503, 500]
+    df = pd.DataFrame({'sku_name': ['A'], 'price': [1.0]})
+    assert writer.write('prices', df) == 4
+    assert delays == [0.5, 1.0, 2.0]
+    assert worksheet.values() == gsheet_writer.sheet_values(df)
+
+
+def test_write_gives_up_on_client_errors_and_exhausted_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(gsheet_writer.time, 'sleep', lambda s: None)
+    spreadsheet = FakeSpreadsheet()
+    writer = SheetWriter(spreadsheet, str(tmp_path), retries=2)
+    worksheet = spreadsheet.add_worksheet('prices', 10, 10)
+    df = pd.DataFrame({'sku_name': ['A'], 'price': [1.0]})
+    worksheet.failures = [400]
+    with pytest.raises(gspread.exceptions.APIError):
+        writer.write('prices', df)
+    worksheet.failures = [429, 429, 429]
+    with pytest.raises(gspread.exceptions.APIError):
+        writer.write('prices', df)
+    # failed writes do not update the snapshot
+    assert writer.load_snapshot('prices') is None
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+CachedCSV and get_gulong_data against a local stand-in for Redash
+"""
+
+import json, http.server
+
+import pandas as pd
+import pytest
+
+from ingest import CachedCSV
+
+
+catalog_csv = '''model,pattern,make,section_width,aspect_ratio,rim_size,price,srp,sale_tag,is_model_active,vehicle_type
+BRIDGESTONE TURANZA T005 205/55 R16,TURANZA T005,BRIDGESTONE,205,55,R16,7000,7500,1,1,CAR
+BFGOODRICH ALL-TERRAIN T/A KO2 31X10.5 R15,ALL-TERRAIN T/A KO2,BFGOODRICH,31X10.5,R1,R15,12000,12500,0,1,SUV
+TOYO PROXES CF2 195/55 R15,PROXES CF2,TOYO,195,55,R15,5000,5200,1,0,CAR
+YOKOHAMA BLUEARTH ES32 185/65 R14,BLUEARTH ES32,YOKOHAMA,185,65,R14,4000,4100,1,1,CAR
+GOODYEAR ASSURANCE TRIPLEMAX 215/60 R16,ASSURANCE TRIPLEMAX,GOODYEAR,215,,R16,6000,6200,1,1,CAR
+'''
+
+
+class Redash:
+    '''
+    State of the stand-in: query version, csv body and validator, requests
+    '''
+
+    def __init__(self):
+        self.version = 1
+        self.csv = catalog_csv
+        self.etag = '"v1"'
+        self.offline = False
+        self.requests = []
+
+    def handler(self):
+        redash = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                redash.requests.append((path, self.headers.get('If-None-Match')))
+                if redash.offline:
+                    self.send_error(503)
+                elif path == '/api/queries/130':
+                    self.reply(json.dumps({'id': 130, 'latest_query_data_id': redash.version}).encode(),
+                               'application/json')
+                elif path == '/api/queries/130/results.csv':
+                    if self.headers.get('If-None-Match') == redash.etag:
+                        self.send_response(304)
+                        self.end_headers()
+                    else:
+                        self.reply(redash.csv.encode(), 'text/csv', {'ETag': redash.etag})
+                else:
+                    self.send_error(404)
+
+            def reply(self, body, content_type, headers=None):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def csv_requests(self):
+        return [r for r in self.requests if r[0].endswith('.csv')]
+
+
+dtypes = {'model': str, 'section_width': str, 'aspect_ratio': str, 'price': 'float64',
+          'is_model_active': 'float64'}
+
+
+@pytest.fixture
+def redash(serve):
+    redash = Redash()
+    redash.url = serve(redash.handler()) + '/api/queries/130/results.csv?api_key=key'
+    return redash
+
+
+def source(redash, path, **kwargs):
+    return CachedCSV(redash.url, str(path), dtype=dtypes, usecols=list(dtypes),
+                     row_filter=lambda df: df[df.is_model_active == 1],
+                     probe_url=redash.url.replace('/results.csv', ''), **kwargs)
+
+
+def test_probe_hit_skips_download(redash, tmp_path):
+    df = source(redash, tmp_path).read()
+    assert list(df.columns) == list(dtypes)
+    assert df['model'].str.split().str[0].tolist() == ['BRIDGESTONE', 'BFGOODRICH', 'YOKOHAMA', 'GOODYEAR']
+    assert df['aspect_ratio'].tolist()[:2] == ['55', 'R1'] and pd.isna(df['aspect_ratio'].iloc[3])
+    n_csv = len(redash.csv_requests())
+    pd.testing.assert_frame_equal(source(redash, tmp_path).read(), df)
+    assert len(redash.csv_requests()) == n_csv
+
+
+def test_not_modified_revalidation(redash, tmp_path):
+    df = source(redash, tmp_path).read()
+    # query refreshed with the same result
+    redash.version = 2
+    cached = source(redash, tmp_path)
+    pd.testing.assert_frame_equal(cached.read(), df)
+    assert redash.csv_requests()[-1] == ('/api/queries/130/results.csv', '"v1"')
+    assert cached.meta()['version'] == '2'
+    # changed result is downloaded again
+    redash.version, redash.etag = 3, '"v3"'
+    redash.csv = catalog_csv.replace('7000', '7100')
+    assert source(redash, tmp_path).read()['price'].iloc[0] == 7100
+
+
+def test_chunked_download(redash, tmp_path):
+    redash.csv = catalog_csv + ''.join(catalog_csv.split('\n', 1)[1] for _ in range(20))
+    whole = source(redash, tmp_path / 'whole').read()
+    chunked = source(redash, tmp_path / 'chunked', chunksize=7, chunk_bytes=100).read()
+    assert len(chunked) == 4 * 21
+    pd.testing.assert_frame_equal(chunked, whole)
+
+
+def test_offline_fallback(redash, tmp_path):
+    with pytest.raises(OSError):
+        redash.offline = True
+        source(redash, tmp_path / 'empty').read()
+    redash.offline = False
+    df = source(redash, tmp_path).read()
+    redash.offline = True
+    with pytest.warns(UserWarning, match='download failed'):
+        pd.testing.assert_frame_equal(source(redash, tmp_path).read(), df)
+
+
+def test_parse_error_fallback(redash, tmp_path):
+    df = source(redash, tmp_path).read()
+    redash.version, redash.etag = 2, '"v2"'
+    redash.csv = catalog_csv.replace('7000', 'seven thousand')
+    with pytest.warns(UserWarning, match='could not be parsed'):
+        pd.testing.assert_frame_equal(source(redash, tmp_path).read(), df)
+    # not marked current, parsed again once the result is fixed
+    redash.csv = catalog_csv.replace('7000', '7200')
+    assert source(redash, tmp_path).read()['price'].iloc[0] == 7200
+
+
+def test_get_gulong_data(scraper, redash, tmp_path, monkeypatch):
+    gulong_source = CachedCSV(redash.url, str(tmp_path), dtype=scraper.gulong_dtypes,
+                              usecols=list(scraper.gulong_dtypes),
+                              row_filter=lambda df: df[df.is_model_active == 1],
+                              probe_url=redash.url.replace('/results.csv', ''))
+    monkeypatch.setattr(scraper, 'gulong_source', gulong_source)
+    df = scraper.get_gulong_data.__wrapped__()
+    assert len(df) == 4
+    specs = dict(zip(df['name'].astype(str), df['correct_specs'].astype(str)))
+    assert specs['ALL-TERRAIN T/A KO2'] == '31/R/15'
+    assert specs['TURANZA T005'] == '205/55/16'
+    assert specs['ASSURANCE TRIPLEMAX'] == '215/R/16'
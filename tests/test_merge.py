@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+join_sources and encode_keys on a hand-built gulong, gogulong and tiremanila case
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def sources():
+    gulong = pd.DataFrame({'name': ['A', 'A', 'B', np.nan, 'C'],
+                           'correct_specs': ['1', '1', '2', '3', '4'],
+                           'sku_name': ['gA0', 'gA1', 'gB', 'gN', 'gC'],
+                           'price_gulong': [100.0, 101.0, 200.0, 300.0, 400.0]})
+    gogulong = pd.DataFrame({'name': ['D', 'A', 'B', np.nan],
+                             'correct_specs': ['5', '1', '2', '3'],
+                             'price_gogulong': [500.0, 90.0, 190.0, 290.0]})
+    tiremanila = pd.DataFrame({'name': ['A', 'E', 'A', 'D'],
+                               'correct_specs': ['1', '6', '1', '5'],
+                               'sku_name': ['tA0', 'tE', 'tA1', 'tD'],
+                               'price_tiremanila': [95.0, 600.0, 96.0, 510.0]})
+    return {'gulong': gulong, 'gogulong': gogulong, 'tiremanila': tiremanila}
+
+
+columns = {'gulong': ['sku_name', 'price_gulong'],
+           'gogulong': ['price_gogulong'],
+           'tiremanila': ['sku_name', 'price_tiremanila']}
+
+expected = pd.DataFrame({'sku_name': ['gA0', 'gA1', 'gB', 'gN', 'tD', 'tE'],
+                         'price_gulong': [100.0, 101.0, 200.0, 300.0, np.nan, np.nan],
+                         'price_gogulong': [90.0, np.nan, 190.0, 290.0, 500.0, np.nan],
+                         'price_tiremanila': [95.0, 96.0, np.nan, np.nan, 510.0, 600.0],
+                         'name': ['A', 'A', 'B', np.nan, 'D', 'E'],
+                         'correct_specs': ['1', '1', '2', '3', '5', '6']})
+
+
+def test_encode_keys(scraper):
+    frames = list(sources().values())
+    key_ids, df_keys = scraper.encode_keys(frames)
+    assert [len(ids) for ids in key_ids] == [5, 4, 4]
+    # n-th duplicate of a product shares its key with the n-th duplicate elsewhere
+    assert key_ids[0][0] == key_ids[1][1] == key_ids[2][0]
+    assert key_ids[0][1] == key_ids[2][2] != key_ids[0][0]
+    # missing names are one key across frames
+    assert key_ids[0][3] == key_ids[1][3]
+    assert key_ids[1][0] == key_ids[2][3]
+    assert len(df_keys) == len(set(np.concatenate(key_ids))) == 7
+    assert list(df_keys.columns) == ['name', 'name_count', 'correct_specs']
+    assert df_keys['name_count'].tolist() == [0, 1, 0, 0, 0, 0, 0]
+    assert df_keys['name'].tolist()[:2] == ['A', 'A'] and pd.isna(df_keys['name'].iloc[3])
+
+
+def test_join_sources(scraper):
+    df = scraper.join_sources(sources(), columns=columns)
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected)
+    # products only in gulong are dropped, competitor-only products listed once
+    assert 'C' not in df['name'].tolist()
+    assert df['name'].tolist().count('D') == 1
+
+
+def test_join_sources_categorical_keys(scraper):
+    frames = sources()
+    categories = {k: pd.concat([df[k] for df in frames.values()]).dropna().unique() for k in ['name', 'correct_specs']}
+    for df in frames.values():
+        for k, values in categories.items():
+            df[k] = pd.Categorical(df[k], categories=values[::-1] if df is frames['gogulong'] else values)
+    df = scraper.join_sources(frames, columns=columns)
+    pd.testing.assert_frame_equal(df.reset_index(drop=True).astype({'name': object, 'correct_specs': object}), expected)
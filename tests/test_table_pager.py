@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Sorted and filtered pages of TablePager
+"""
+
+import numpy as np
+import pandas as pd
+
+from table_pager import TablePager
+
+
+def table():
+    return pd.DataFrame({'sku_name': ['Nankang NS-2', None, 'Toyo Nano', np.nan, 'Falken'],
+                         'brand': pd.Categorical(['NANKANG', 'TOYO', None, 'FALKEN', 'FALKEN']),
+                         'price': [3.0, np.nan, 1.0, 2.0, 5.0]})
+
+
+def test_search_does_not_match_missing_values():
+    pager = TablePager(table())
+    for query in ['na', 'nan', 'non', 'none']:
+        df, n_rows, _ = pager.page(1, query=query)
+        text = df[['sku_name', 'brand']].astype(object).fillna('').astype(str).apply(lambda c: c.str.lower())
+        assert n_rows == len(df) and text.apply(lambda c: c.str.contains(query)).any(axis=1).all()
+    assert pager.page(1, query='na')[0]['sku_name'].tolist() == ['Nankang NS-2', 'Toyo Nano']
+
+
+def test_pages_match_pandas():
+    df = pd.concat([table()] * 7, ignore_index=True)
+    pager = TablePager(df)
+    expected = df.sort_values('price', ascending=False, kind='mergesort', na_position='last')
+    expected = expected[expected['brand'].astype(str).str.contains('FALKEN')]
+    pages = [pager.page(p, page_size=4, sort='price', ascending=False, query='falken') for p in [1, 2, 3, 4]]
+    assert [n_pages for _, _, n_pages in pages] == [4] * 4
+    pd.testing.assert_frame_equal(pd.concat([p[0] for p in pages]), expected)
+    # pages past the last page show the last page
+    pd.testing.assert_frame_equal(pager.page(9, page_size=4, sort='price', ascending=False, query='falken')[0],
+                                  pages[-1][0])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Tiremanila engines over saved listing pages served locally
+"""
+
+import urllib.request
+
+import lxml.html
+import pandas as pd
+
+from run_journal import RunJournal
+
+
+class PageDriver:
+    '''
+    Stand-in for a Chrome driver rendering pages with lxml
+    '''
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.tree = None
+        self.urls = []
+
+    def get(self, url):
+        with urllib.request.urlopen(url) as response:
+            self.tree = lxml.html.fromstring(response.read())
+        self.urls.append(url)
+
+    def find_elements(self, by, xpath):
+        return [type('Element', (), {'text': self.scraper.element_text(e)}) for e in self.tree.xpath(xpath)]
+
+    def execute_script(self, script, xpath_info):
+        if script == self.scraper.tiles_signature_js:
+            return '\n'.join(e.text_content().strip() for e in self.tree.xpath(xpath_info))
+        if script == self.scraper.extract_tiles_js:
+            return self.scraper.parse_tiles(self.tree, xpath_info)
+        raise NotImplementedError(script)
+
+
+def catalog():
+    return pd.DataFrame({'name': ['DUELER H/T 687 RBT', 'PROXES CF2', 'ALL-TERRAIN T/A KO2']})
+
+
+def test_http_engine_matches_selenium(scraper, pages_url):
+    scrape = scraper.tiremanila_scraper.__wrapped__
+    df_http = scrape(None, scraper.xpath_prod, catalog(), engine='http', base_url=pages_url)
+    driver = PageDriver(scraper)
+    df_selenium = scrape(driver, scraper.xpath_prod, catalog(), engine='selenium', base_url=pages_url)
+
+    assert len(driver.urls) == 6
+    assert list(df_http.columns) == ['sku_name', 'name', 'model', 'brand', 'price_tiremanila', 'qty_tiremanila',
+                                     'year', 'raw_specs', 'correct_specs']
+    # 5 pages of 24 tiles and 2 extra tiles on page 1 (price-less tile skipped)
+    assert len(df_http) == 122
+    pd.testing.assert_frame_equal(df_http, df_selenium)
+    pd.testing.assert_series_equal(df_http.dtypes, df_selenium.dtypes)
+    pd.testing.assert_frame_equal(df_http.attrs['rejects'], df_selenium.attrs['rejects'])
+    row = df_http[df_http.sku_name == '31X10.50R15 BFG ALL-TERRAIN T/A KO2'].iloc[0]
+    assert (row['price_tiremanila'], row['qty_tiremanila'], row['correct_specs']) == (12450.0, '4', '31/10.5/15')
+
+
+def partial_journal(path, journal, urls):
+    '''
+    Journal of an interrupted run keeping only the given pages of journal
+    '''
+    units = journal.read('tiremanila')[1]
+    resumed = RunJournal(path)
+    resumed.start('tiremanila')
+    for url in urls:
+        resumed.record('tiremanila', url, units[url])
+    return resumed
+
+
+def test_resume_with_other_engine(scraper, pages_url, tmp_path):
+    scrape = scraper.tiremanila_scraper.__wrapped__
+    url = pages_url + '/?page={}'
+    for first, second in [('selenium', 'http'), ('http', 'selenium')]:
+        journal = RunJournal(str(tmp_path / first))
+        journal.start('tiremanila')
+        driver = PageDriver(scraper)
+        df_full = scrape(driver, scraper.xpath_prod, catalog(), engine=first, base_url=pages_url, _journal=journal)
+        # pages 1 and 3 done, page 7 is past the last page of the listing
+        resumed = partial_journal(str(tmp_path / second), journal, [url.format(1), url.format(3)])
+        units = journal.read('tiremanila')[1]
+        resumed.record('tiremanila', url.format(7), units[url.format(2)])
+        driver = PageDriver(scraper)
+        df = scrape(driver, scraper.xpath_prod, catalog(), engine=second, base_url=pages_url, _journal=resumed)
+        if second == 'selenium':
+            # pagination of page 1 and the remaining pages
+            assert driver.urls == [url.format(p) for p in [1, 2, 4, 5]]
+        # journaled page 7 is dropped
+        pd.testing.assert_frame_equal(df, df_full)
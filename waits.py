@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Event-driven page waits with per-site timeout budgets
+
+Scrapers wait on concrete readiness conditions (results rendered, tiles of
+the next page replaced, empty-result message shown) instead of fixed sleeps
+or implicit waits. How long every wait took is recorded per site and event,
+and the timeout budget of each is learned from those latencies.
+"""
+
+import os, json, time, threading
+
+import numpy as np
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+
+class AdaptiveWaits:
+    '''
+    Waits on page conditions with timeouts learned from observed latencies
+
+    Parameters
+    ----------
+    path : string, optional
+        json file of recorded latencies, loaded if it exists. The default is None.
+    default : float, optional
+        timeout (seconds) until enough latencies are recorded. The default is 10.
+    min_budget, max_budget : float, optional
+        bounds of learned timeouts (seconds). The defaults are 1 and 30.
+    quantile : float, optional
+        latency quantile the timeout is based on. The default is 0.95.
+    margin : float, optional
+        factor applied to the latency quantile. The default is 2.
+    min_samples : int, optional
+        latencies needed before timeout is learned. The default is 5.
+    window : int, optional
+        number of most recent latencies kept per site and event. The default is 200.
+    metrics : Metrics, optional
+        If given, wait times and timeouts of the run are also recorded there.
+        The default is None.
+    '''
+
+    def __init__(self, path=None, default=10.0, min_budget=1.0, max_budget=30.0,
+                 quantile=0.95, margin=2.0, min_samples=5, window=200, metrics=None):
+        self.path = path
+        self.default = default
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.window = window
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.timeouts = {}
+        if path is not None:
+            try:
+                with open(path) as f:
+                    saved = json.load(f)
+                self.latencies = {tuple(k.split('/', 1)): v for k, v in saved['latencies'].items()}
+                self.timeouts = {tuple(k.split('/', 1)): v for k, v in saved['timeouts'].items()}
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def budget(self, site, event):
+        '''
+        Timeout in seconds of an event of a site
+        '''
+        with self.lock:
+            latencies = self.latencies.get((site, event), [])
+            if len(latencies) < self.min_samples:
+                return self.default
+            budget = self.margin * float(np.quantile(latencies, self.quantile))
+        return min(max(budget, self.min_budget), self.max_budget)
+
+    def record(self, site, event, seconds, timed_out=False):
+        '''
+        Records latency of a wait, a timed out wait counts as twice its budget
+        so the budget grows
+        '''
+        with self.lock:
+            latencies = self.latencies.setdefault((site, event), [])
+            latencies.append(round(min(seconds * 2 if timed_out else seconds, self.max_budget), 3))
+            del latencies[:-self.window]
+            if timed_out:
+                self.timeouts[(site, event)] = self.timeouts.get((site, event), 0) + 1
+        if self.metrics is not None:
+            self.metrics.observe('wait_seconds', seconds, site=site, event=event)
+            if timed_out:
+                self.metrics.count('wait_timeouts_total', site=site, event=event)
+
+    def wait(self, driver, site, event, condition, poll=0.1):
+        '''
+        Waits until condition(driver) is truthy or the event budget runs out
+
+        Parameters
+        ----------
+        driver : selenium
+            chrome driver
+        site : string
+            scraped site, e.g. 'gogulong'
+        event : string
+            waited event, e.g. 'search', 'next_page'
+        condition : function
+            function of driver, returns a truthy value when page is ready
+        poll : float, optional
+            seconds between checks. The default is 0.1.
+
+        Returns
+        -------
+        result
+            value returned by condition, None on timeout
+        '''
+        budget = self.budget(site, event)
+        start = time.time()
+        try:
+            result = WebDriverWait(driver, budget, poll_frequency=poll,
+                                   ignored_exceptions=[WebDriverException]).until(condition)
+        except TimeoutException:
+            self.record(site, event, time.time() - start, timed_out=True)
+            return None
+        self.record(site, event, time.time() - start)
+        return result
+
+    def stats(self):
+        '''
+        Latency summary per site and event
+
+        Returns
+        -------
+        dictionary
+            'site/event' -> n, median and p95 latency, timeouts and current budget
+        '''
+        with self.lock:
+            keys = sorted(self.latencies)
+        summary = {}
+        for site, event in keys:
+            latencies = self.latencies[(site, event)]
+            summary['{}/{}'.format(site, event)] = {
+                'n': len(latencies),
+                'median': round(float(np.median(latencies)), 3),
+                'p95': round(float(np.quantile(latencies, 0.95)), 3),
+                'timeouts': self.timeouts.get((site, event), 0),
+                'budget': round(self.budget(site, event), 2)}
+        return summary
+
+    def save(self):
+        '''
+        Writes recorded latencies to path
+        '''
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self.lock:
+            saved = {'latencies': {'/'.join(k): v for k, v in self.latencies.items()},
+                     'timeouts': {'/'.join(k): v for k, v in self.timeouts.items()}}
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(saved, f)
+        os.replace(self.path + '.tmp', self.path)